@@ -0,0 +1,104 @@
+"""Headless batch export of saved projects to .mfg, .gcode, Revit layout and BOM files.
+
+Usage:
+    python batch_export.py projects/*.json --output-dir out --jobs 8
+
+Each project is exported in a worker process. A line with the timing or the
+error is printed per file, and the exit status is 1 if any file failed.
+With --cache-dir, outputs of projects and floors exported before are copied
+from the export cache instead of being generated again.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from export_cache import DEFAULT_CACHE_BYTES, CacheStats, ExportCache
+from export_pipeline import ExportPipeline
+from project_io import load_project
+
+
+@dataclass
+class ExportResult:
+    path: str
+    seconds: float
+    outputs: Tuple[str, ...] = ()
+    error: Optional[str] = None
+    cache_stats: CacheStats = field(default_factory=CacheStats)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def export_project(path: str, output_dir: Optional[str], panel_size: int, subprograms: bool = False,
+                   cache_dir: Optional[str] = None, cache_bytes: int = DEFAULT_CACHE_BYTES) -> ExportResult:
+    """Export one project file; errors are captured in the result rather than raised"""
+    start = time.perf_counter()
+    cache = None
+    try:
+        cache = ExportCache(cache_dir, cache_bytes) if cache_dir else None
+        house = load_project(path)
+
+        stem = os.path.splitext(os.path.basename(path))[0]
+        base_filename = os.path.join(output_dir or os.path.dirname(path), stem)
+        outcomes = ExportPipeline(cache=cache).run(house, base_filename, panel_size, subprograms=subprograms)
+        return ExportResult(path, time.perf_counter() - start, tuple(outcome.path for outcome in outcomes.values()),
+                            cache_stats=cache.stats if cache else CacheStats())
+    except Exception as e:
+        return ExportResult(path, time.perf_counter() - start, error=f"{type(e).__name__}: {e}",
+                            cache_stats=cache.stats if cache else CacheStats())
+
+
+def run_batch(paths: List[str], output_dir: Optional[str], panel_size: int, jobs: Optional[int],
+              subprograms: bool = False, cache_dir: Optional[str] = None,
+              cache_bytes: int = DEFAULT_CACHE_BYTES) -> List[ExportResult]:
+    """Export every project across a process pool, printing each result as it finishes"""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(export_project, path, output_dir, panel_size, subprograms, cache_dir, cache_bytes)
+                   for path in paths]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.ok:
+                print(f"ok    {result.seconds:7.3f}s  {result.path}")
+            else:
+                print(f"FAIL  {result.seconds:7.3f}s  {result.path}: {result.error}")
+            results.append(result)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export House Builder projects to manufacturing files")
+    parser.add_argument('projects', nargs='+', help="project JSON files")
+    parser.add_argument('-o', '--output-dir', help="directory for the output files (default: next to each project)")
+    parser.add_argument('--panel-size', type=int, default=8, help="panel size in grid units (default: 8)")
+    parser.add_argument('-j', '--jobs', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--subprograms', action='store_true',
+                        help="write each distinct panel once as a G-code subprogram")
+    parser.add_argument('--cache-dir', help="reuse outputs of unchanged projects and floors from this directory")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="export cache size limit in MB; least recently used entries go first "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_batch(args.projects, args.output_dir, args.panel_size, args.jobs, args.subprograms,
+                        args.cache_dir, args.cache_size * 1024 * 1024)
+    failed = [result for result in results if not result.ok]
+
+    print(f"{len(results) - len(failed)} exported, {len(failed)} failed "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.cache_dir:
+        print(sum((result.cache_stats for result in results), CacheStats()).format())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""Bulk edits: rectangles, lines, flood fill, copy/paste and floor copies.
+
+Edits are collected in an EditTransaction and written when it commits, as
+one vectorized write per floor. Reads inside a transaction see its pending
+edits, so operations can build on each other. Works on a bare House for
+scripts; the app commits through its undo history and journal instead.
+
+    with EditTransaction(house) as edit:
+        edit.fill_rect(house.floors[0], 0, 0, 20, 12, ComponentType.WALL_PANEL, outline=True)
+        edit.flood_fill(house.floors[0], 5, 5, ComponentType.FLOOR_PANEL)
+        edit.copy_floor(house.floors[0], house.floors[1])
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from floor_grid import EMPTY_CODE, ChunkedGrid
+from house_model import TYPE_CODES, ComponentType, Floor, House, line_cells
+
+
+class Clipboard(NamedTuple):
+    """A copied rectangle of cells, empty ones included"""
+    type_codes: np.ndarray  # (height, width)
+    rotation_codes: np.ndarray
+
+    @property
+    def width(self) -> int:
+        return self.type_codes.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.type_codes.shape[0]
+
+
+class _Visited:
+    """Cells a flood fill has reached, by cell index; kept per chunk on chunked floors so the cost follows the region"""
+
+    def __init__(self, floor: Floor):
+        self.width = floor.width
+        self.chunk_size = floor.grid.chunk_size if isinstance(floor.grid, ChunkedGrid) else None
+        self.cells = np.zeros(floor.width * floor.height, dtype=bool) if self.chunk_size is None else None
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}  # (chunk_x, chunk_y) -> flat chunk_size**2 flags
+
+    def _by_chunk(self, keys: np.ndarray):
+        """(chunk, positions in keys, flat offsets in the chunk) for each chunk the keys fall in"""
+        xs, ys = keys % self.width, keys // self.width
+        size = self.chunk_size
+        chunk_keys = np.column_stack([xs // size, ys // size])
+        chunks, inverse = np.unique(chunk_keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        offsets = (ys % size) * size + xs % size
+        for index, chunk in enumerate(map(tuple, chunks.tolist())):
+            positions = np.flatnonzero(inverse == index)
+            yield chunk, positions, offsets[positions]
+
+    def seen(self, keys: np.ndarray) -> np.ndarray:
+        if self.cells is not None:
+            return self.cells[keys]
+        result = np.zeros(len(keys), dtype=bool)
+        for chunk, positions, offsets in self._by_chunk(keys):
+            if chunk in self.chunks:
+                result[positions] = self.chunks[chunk][offsets]
+        return result
+
+    def mark(self, keys: np.ndarray):
+        if self.cells is not None:
+            self.cells[keys] = True
+            return
+        for chunk, _, offsets in self._by_chunk(keys):
+            if chunk not in self.chunks:
+                self.chunks[chunk] = np.zeros(self.chunk_size * self.chunk_size, dtype=bool)
+            self.chunks[chunk][offsets] = True
+
+
+def _write_floor(floor: Floor, xs, ys, type_codes, rotation_codes):
+    floor.set_cells(xs, ys, type_codes, rotation_codes)
+
+
+class EditTransaction:
+    def __init__(self, house: House, write: Optional[Callable] = None):
+        self.house = house
+        # Called once per floor on commit with (floor, xs, ys, type_codes, rotation_codes)
+        self.write = write or _write_floor
+        # id(floor) -> (floor, [(cell indices, type codes, rotation codes), ...]) in edit order
+        self.pending: Dict[int, Tuple[Floor, List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]] = {}
+        self.merged: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def __enter__(self) -> 'EditTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def set_cells(self, floor: Floor, xs, ys, type_codes, rotation_codes=0):
+        """Queue a write of parallel cell coordinates; codes may be scalars"""
+        if not any(house_floor is floor for house_floor in self.house.floors):
+            raise ValueError(f"Floor {floor.floor_number} is not part of this house")
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        outside = (xs < 0) | (xs >= floor.width) | (ys < 0) | (ys >= floor.height)
+        if outside.any():
+            index = int(np.argmax(outside))
+            raise IndexError(f"Cell ({xs[index]}, {ys[index]}) is outside the {floor.width}x{floor.height} floor")
+        count = len(xs)
+        self.pending.setdefault(id(floor), (floor, []))[1].append(
+            (ys * floor.width + xs,
+             np.broadcast_to(np.asarray(type_codes, dtype=np.uint8), count),
+             np.broadcast_to(np.asarray(rotation_codes, dtype=np.uint8), count)))
+        self.merged.pop(id(floor), None)
+
+    def get_cells(self, floor: Floor, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+        """(type_codes, rotation_codes) as they will be once the transaction commits"""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        type_codes, rotation_codes = floor.get_cells(xs, ys)
+        keys, pending_types, pending_rotations = self._merged(floor)
+        if len(keys):
+            positions = np.minimum(np.searchsorted(keys, ys * floor.width + xs), len(keys) - 1)
+            found = keys[positions] == ys * floor.width + xs
+            type_codes = np.where(found, pending_types[positions], type_codes)
+            rotation_codes = np.where(found, pending_rotations[positions], rotation_codes)
+        return type_codes, rotation_codes
+
+    def _merged(self, floor: Floor) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sorted cell indices of the floor's pending writes, with the last value written to each"""
+        if id(floor) not in self.merged:
+            records = self.pending.get(id(floor), (floor, []))[1]
+            if not records:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint8)
+            keys = np.concatenate([record[0] for record in records])[::-1]
+            type_codes = np.concatenate([record[1] for record in records])[::-1]
+            rotation_codes = np.concatenate([record[2] for record in records])[::-1]
+            keys, last = np.unique(keys, return_index=True)
+            self.merged[id(floor)] = (keys, type_codes[last], rotation_codes[last])
+        return self.merged[id(floor)]
+
+    def commit(self) -> Dict[Floor, Tuple[np.ndarray, np.ndarray]]:
+        """Write every pending edit, one call per floor; returns the (xs, ys) written per floor"""
+        written = {}
+        for floor, _ in self.pending.values():
+            keys, type_codes, rotation_codes = self._merged(floor)
+            xs, ys = keys % floor.width, keys // floor.width
+            self.write(floor, xs, ys, type_codes, rotation_codes)
+            written[floor] = (xs, ys)
+        self.rollback()
+        return written
+
+    def rollback(self):
+        self.pending = {}
+        self.merged = {}
+
+    def fill_rect(self, floor: Floor, x0: int, y0: int, x1: int, y1: int, component_type: ComponentType,
+                  rotation: int = 0, outline: bool = False):
+        """Fill cells with x0 <= x < x1 and y0 <= y < y1, or only the rectangle's border"""
+        ys, xs = np.mgrid[y0:y1, x0:x1]
+        if outline:
+            border = (xs == x0) | (xs == x1 - 1) | (ys == y0) | (ys == y1 - 1)
+            xs, ys = xs[border], ys[border]
+        self.set_cells(floor, xs.ravel(), ys.ravel(), TYPE_CODES[component_type], rotation // 90 % 4)
+
+    def draw_line(self, floor: Floor, x0: int, y0: int, x1: int, y1: int, component_type: ComponentType,
+                  rotation: int = 0):
+        """Place components on the cells of a straight line, both ends included"""
+        xs, ys = zip(*line_cells(x0, y0, x1, y1))
+        self.set_cells(floor, xs, ys, TYPE_CODES[component_type], rotation // 90 % 4)
+
+    def flood_fill(self, floor: Floor, x: int, y: int, component_type: ComponentType, rotation: int = 0) -> int:
+        """Replace the 4-connected region of cells the same type as (x, y); returns the cells filled"""
+        fill_code = TYPE_CODES[component_type]
+        target = int(self.get_cells(floor, [x], [y])[0][0])
+        if target == fill_code:
+            return 0
+
+        width = floor.width
+        visited = _Visited(floor)
+        frontier = np.array([y * width + x], dtype=np.int64)
+        visited.mark(frontier)
+        region = [frontier]
+        while len(frontier):
+            xs, ys = frontier % width, frontier // width
+            next_xs = np.concatenate([xs - 1, xs + 1, xs, xs])
+            next_ys = np.concatenate([ys, ys, ys - 1, ys + 1])
+            inside = (next_xs >= 0) & (next_xs < width) & (next_ys >= 0) & (next_ys < floor.height)
+            keys = np.unique(next_ys[inside] * width + next_xs[inside])
+            keys = keys[~visited.seen(keys)]
+            type_codes, _ = self.get_cells(floor, keys % width, keys // width)
+            frontier = keys[type_codes == target]
+            visited.mark(frontier)
+            region.append(frontier)
+
+        keys = np.concatenate(region)
+        self.set_cells(floor, keys % width, keys // width, fill_code, rotation // 90 % 4)
+        return len(keys)
+
+    def copy_region(self, floor: Floor, x0: int, y0: int, x1: int, y1: int) -> Clipboard:
+        """Copy the cells with x0 <= x < x1 and y0 <= y < y1, clipped to the floor"""
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, floor.width), min(y1, floor.height)
+        ys, xs = np.mgrid[y0:max(y1, y0), x0:max(x1, x0)]
+        type_codes, rotation_codes = self.get_cells(floor, xs.ravel(), ys.ravel())
+        return Clipboard(type_codes.reshape(xs.shape), rotation_codes.reshape(xs.shape))
+
+    def paste(self, floor: Floor, clipboard: Clipboard, x: int, y: int, include_empty: bool = True):
+        """Place a clipboard with its top-left cell at (x, y); cells falling off the floor are dropped"""
+        ys, xs = np.mgrid[0:clipboard.height, 0:clipboard.width]
+        keep = ((xs + x >= 0) & (xs + x < floor.width) & (ys + y >= 0) & (ys + y < floor.height))
+        if not include_empty:
+            keep &= clipboard.type_codes != EMPTY_CODE
+        self.set_cells(floor, xs[keep] + x, ys[keep] + y, clipboard.type_codes[keep],
+                       clipboard.rotation_codes[keep])
+
+    def clear_floor(self, floor: Floor):
+        xs, ys, _, _ = floor.grid.occupied()
+        keys, _, _ = self._merged(floor)
+        self.set_cells(floor, np.concatenate([xs, keys % floor.width]), np.concatenate([ys, keys // floor.width]),
+                       EMPTY_CODE, 0)
+
+    def copy_floor(self, source: Floor, target: Floor):
+        """Make target a copy of source, cropped to target's size"""
+        clipboard = self.copy_region(source, 0, 0, source.width, source.height)
+        self.clear_floor(target)
+        self.paste(target, clipboard, 0, 0, include_empty=False)
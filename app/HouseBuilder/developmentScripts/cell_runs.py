@@ -0,0 +1,62 @@
+"""Merging straight runs of same-type cells into segments.
+
+Cells are run-length encoded along each row first; runs of two or more
+cells become horizontal segments. The cells left over are then encoded along
+each column, so a vertical wall becomes one segment too, and anything still
+on its own is a segment of length one. Every cell ends up in exactly one
+segment.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Runs(NamedTuple):
+    """Parallel arrays, one entry per segment"""
+    xs: np.ndarray  # First cell of the segment
+    ys: np.ndarray
+    lengths: np.ndarray  # Cells in the segment
+    horizontal: np.ndarray  # True when the segment runs along x, False along y
+    type_codes: np.ndarray
+
+    def widths(self) -> np.ndarray:
+        return np.where(self.horizontal, self.lengths, 1)
+
+    def depths(self) -> np.ndarray:
+        return np.where(self.horizontal, 1, self.lengths)
+
+
+def _runs_along(major: np.ndarray, minor: np.ndarray, type_codes: np.ndarray):
+    """Start index and length of each run of consecutive minor values in cells sorted by (major, minor)"""
+    starts = np.ones(len(major), dtype=bool)
+    starts[1:] = ((major[1:] != major[:-1]) | (minor[1:] != minor[:-1] + 1)
+                  | (type_codes[1:] != type_codes[:-1]))
+    start_indices = np.flatnonzero(starts)
+    lengths = np.diff(np.append(start_indices, len(major)))
+    return start_indices, lengths
+
+
+def find_runs(xs, ys, type_codes) -> Runs:
+    """Merge cells into horizontal runs, then the leftover cells into vertical runs"""
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    type_codes = np.asarray(type_codes)
+
+    order = np.lexsort((xs, ys))
+    xs, ys, type_codes = xs[order], ys[order], type_codes[order]
+    starts, lengths = _runs_along(ys, xs, type_codes)
+    merged = lengths > 1
+    row_starts, row_lengths = starts[merged], lengths[merged]
+
+    # Cells not in a horizontal run of two or more get a second chance along their column
+    single = np.repeat(~merged, lengths)
+    col_xs, col_ys, col_types = xs[single], ys[single], type_codes[single]
+    order = np.lexsort((col_ys, col_xs))
+    col_xs, col_ys, col_types = col_xs[order], col_ys[order], col_types[order]
+    col_starts, col_lengths = _runs_along(col_xs, col_ys, col_types)
+
+    return Runs(np.concatenate([xs[row_starts], col_xs[col_starts]]),
+                np.concatenate([ys[row_starts], col_ys[col_starts]]),
+                np.concatenate([row_lengths, col_lengths]),
+                np.concatenate([np.ones(len(row_starts), dtype=bool), np.zeros(len(col_starts), dtype=bool)]),
+                np.concatenate([type_codes[row_starts], col_types[col_starts]]))
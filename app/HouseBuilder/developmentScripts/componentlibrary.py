@@ -1,29 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, Canvas, Frame
 import tkinter.font as tkFont
-from dataclasses import dataclass
 from typing import List, Dict, Optional
 import json
 
-
-@dataclass
-class ComponentSpec:
-    """Specification for a Daylun component"""
-    sku: str
-    name: str
-    category: str
-    width: float  # in feet
-    height: float  # in feet
-    thickness: float  # in inches
-    material: str
-    weight: float  # in lbs
-    price: float
-    description: str
-    features: List[str]
-    applications: List[str]
-    fire_rating: str
-    insulation_r_value: float
-    color: str = "#8B4513"  # Default brown
+from component_specs import ComponentSpec, load_component_specs
 
 
 class ComponentLibraryApp:
@@ -77,70 +58,7 @@ class ComponentLibraryApp:
 
     def load_components(self) -> List[ComponentSpec]:
         """Load Daylun component specifications"""
-        components = [
-            # Hotfix
-            ComponentSpec(
-                sku="DLN-PNL-4X8-STD",
-                name="Daylun Standard Panel 4×8 ",
-                category="Wall Panel",
-                width=4.0,
-                height=8.0,
-                thickness=0,
-                material="",
-                weight=0,
-                price=0,
-                description="",
-                features=[
-                    # "Pre-fabricated with precision CNC cutting",
-                    # "Integrated electrical chase channels",
-                    # "Tongue-and-groove edge connections",
-                    # "Weather-resistant OSB facing",
-                    # "EPS foam core insulation",
-                    # "Ready for immediate installation"
-                ],
-                applications=[
-                    "Exterior walls",
-                    "Interior partitions",
-                    "Roof panels",
-                    "Floor systems"
-                ],
-                fire_rating="",
-                insulation_r_value=0,
-                color="#A0522D"
-            ),
-            ComponentSpec(
-                sku="DLN-PNL-8X8-PRO",
-                name="Daylun Professional Panel 8×8",
-                category="Wall Panel",
-                width=8.0,
-                height=8.0,
-                thickness=0,
-                material="",
-                weight=0,
-                price=0,
-                description="Large-format 8×8 panel.",
-                features=[
-                    # "Heavy-duty construction for commercial use",
-                    # "Reinforced corner connections",
-                    # "Dual electrical/plumbing chase system",
-                    # "Premium weather barrier coating",
-                    # "High-density polyurethane foam core",
-                    # "Integrated lifting points for crane installation",
-                    # "Factory-applied primer coating"
-                ],
-                applications=[
-                    "Commercial buildings",
-                    "Warehouse construction",
-                    "Multi-family residential",
-                    "Institutional facilities",
-                    "Agricultural buildings"
-                ],
-                fire_rating="",
-                insulation_r_value=0,
-                color="#8B4513"
-            )
-        ]
-        return components
+        return load_component_specs()
 
     def setup_ui(self):
         # Main container
@@ -0,0 +1,104 @@
+"""On-disk, content-addressed cache of export artefacts.
+
+Entries are named by a hash of everything they depend on (see cache_key),
+so an entry never goes stale: a changed floor or setting simply asks for a
+different key. Each entry is one file holding a JSON line of metadata
+followed by the raw output bytes. Reading an entry refreshes its mtime and
+the least recently used entries are deleted once the cache grows past its
+size limit. Several processes may share a directory: entries are written
+atomically and an entry evicted by another process just counts as a miss.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+_ENTRY_SUFFIX = '.entry'
+
+
+def cache_key(*parts) -> str:
+    """Key for an entry depending on parts (strings, numbers and tuples of them)"""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=20).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __add__(self, other: 'CacheStats') -> 'CacheStats':
+        return CacheStats(self.hits + other.hits, self.misses + other.misses, self.evictions + other.evictions)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def format(self) -> str:
+        return (f"cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), "
+                f"{self.evictions} evicted")
+
+
+class ExportCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def _entries(self):
+        """(path, mtime, size) of every entry"""
+        with os.scandir(self.directory) as found:
+            for entry in found:
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, key: str) -> Optional[Tuple[object, bytes]]:
+        """(metadata, data) stored under key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                data = f.read()
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return meta, data
+
+    def put(self, key: str, meta: object = None, data: bytes = b''):
+        path = self._path(key)
+        entry = json.dumps(meta).encode('utf-8') + b'\n' + data
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(entry)
+        os.replace(temp_path, path)
+        self.size += len(entry)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache is back under its limit"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self.size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.stats.evictions += 1
+            except FileNotFoundError:
+                pass
+            self.size -= size
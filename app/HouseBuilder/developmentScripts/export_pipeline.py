@@ -0,0 +1,289 @@
+"""Exporting a House to several formats from one read of its floors.
+
+``HouseExport`` reads every floor once, on the calling thread, into a
+snapshot of cells, component counts and the cut list; the manufacturing data
+and nesting plan are built from that snapshot, also on the calling thread,
+when a writer needs them. The exporters (.mfg, .gcode, the Revit layout JSON
+of utils/revitPayload.ts and a BOM CSV) only read the snapshot, so
+``ExportPipeline.run`` writes them in parallel on a thread pool. The
+pipeline remembers each exporter's inputs from its last run and skips
+exporters whose inputs and output file are unchanged.
+
+Inputs are keyed by content (a hash of each floor's cells, see
+FloorSummary.content_hash), so with an ExportCache the outputs of an
+unchanged project, and the cut panels of unchanged floors, are also reused
+across runs and processes.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from export_cache import ExportCache, cache_key
+from house_model import CODE_TYPES, ComponentType, House
+from manufacturing import (FloorSummaries, OneShotSummaries, build_cut_list, manufacturing_data,
+                           write_manufacturing_data, write_sample_gcode)
+from nesting import stock_sheets
+
+EXPORT_FORMAT_VERSION = 2  # Bump when any exporter's output changes, so cached outputs are not reused
+
+# The ComponentType values of types.ts. Door and window panels have no member there yet, so the payload
+# extends the schema with "door_panel" and "window_panel"
+REVIT_COMPONENT_TYPES = ("panel_4x8", "corner_panel", "floor_panel", "empty")
+REVIT_TYPES = {
+    ComponentType.WALL_PANEL: "panel_4x8",
+    ComponentType.DOOR_PANEL: "door_panel",
+    ComponentType.WINDOW_PANEL: "window_panel",
+    ComponentType.FLOOR_PANEL: "floor_panel",
+    ComponentType.EMPTY: "empty"
+}
+# Revit families per component type, as FAMILY_MAP in revitPayload.ts
+REVIT_FAMILIES = {
+    ComponentType.WALL_PANEL: "Daylun_Panel_4x8_Placeholder",
+    ComponentType.DOOR_PANEL: "Daylun_DoorPanel_Placeholder",
+    ComponentType.WINDOW_PANEL: "Daylun_WindowPanel_Placeholder",
+    ComponentType.FLOOR_PANEL: "Daylun_FloorPanel_Placeholder",
+    ComponentType.EMPTY: "Daylun_EmptySlot"
+}
+
+
+class HouseExport:
+    """What the exporters need from a house, read from its floors once before any writer starts"""
+    def __init__(self, house: House, panel_size: int, summaries: Optional[FloorSummaries] = None,
+                 subprograms: bool = False, cache: Optional[ExportCache] = None):
+        self.house = house
+        self.panel_size = panel_size
+        self.subprograms = subprograms
+        self.summaries = summaries or OneShotSummaries(house)
+        self.floors = [self.summaries.summary(floor) for floor in house.floors]
+        self.floor_hashes = tuple(summary.content_hash for summary in self.floors)
+        self.footprint = (house.floors[0].width, house.floors[0].height)
+        self.stocks = tuple(stock_sheets())
+        if cache is not None:
+            self._cached_panels(cache)
+        self.cut_list = build_cut_list(house, panel_size, self.summaries)
+        self.component_counts: Dict[ComponentType, int] = {}
+        for summary in self.floors:
+            for comp_type, count in summary.component_counts.items():
+                self.component_counts[comp_type] = self.component_counts.get(comp_type, 0) + count
+        self.mfg_data: Optional[dict] = None  # See build_mfg_data
+
+    def _cached_panels(self, cache: ExportCache):
+        """Take each floor's cut panels from the cache, counting and storing those it lacks"""
+        for summary in {summary.content_hash: summary for summary in self.floors}.values():
+            if summary.has_panels:
+                continue
+            key = cache_key('floor_panels', EXPORT_FORMAT_VERSION, summary.content_hash)
+            entry = cache.get(key)
+            if entry is not None:
+                summary.panels = {(type_code, length): count for type_code, length, count in entry[0]}
+            else:
+                cache.put(key, [[type_code, length, count] for (type_code, length), count in summary.panels.items()])
+
+    def build_mfg_data(self):
+        """Manufacturing data including the nesting plan, from the snapshot rather than the house"""
+        if self.mfg_data is None:
+            self.mfg_data = manufacturing_data(self.floors, self.panel_size, self.cut_list, self.footprint)
+
+    def cut_list_key(self) -> tuple:
+        return tuple((panel['type'], panel['length'], panel['quantity']) for panel in self.cut_list)
+
+
+class Exporter:
+    """One output format: the inputs it depends on and how to write it"""
+    name = ''
+    suffix = ''
+    uses_mfg_data = False  # Whether write reads HouseExport.mfg_data
+
+    def input_key(self, export: HouseExport) -> tuple:
+        """Everything the output depends on; the output is rewritten only when this changes"""
+        raise NotImplementedError
+
+    def write(self, export: HouseExport, path: str):
+        """Write the output, returning anything worth reporting"""
+        raise NotImplementedError
+
+
+class ManufacturingExporter(Exporter):
+    name = 'mfg'
+    suffix = '.mfg'
+    uses_mfg_data = True
+
+    def input_key(self, export: HouseExport) -> tuple:
+        return export.panel_size, export.floor_hashes, export.footprint, export.stocks
+
+    def write(self, export: HouseExport, path: str) -> dict:
+        write_manufacturing_data(path, export.mfg_data)
+        return export.mfg_data
+
+
+class GcodeExporter(Exporter):
+    name = 'gcode'
+    suffix = '.gcode'
+    uses_mfg_data = True  # Panels are cut where the nesting plan placed them
+
+    def __init__(self, time_budget: float = 1.0):
+        self.time_budget = time_budget
+
+    def input_key(self, export: HouseExport) -> tuple:
+        # Only the cut list is nested and cut, so edits that keep the same panels keep the same program
+        return export.panel_size, export.subprograms, export.stocks, export.cut_list_key()
+
+    def write(self, export: HouseExport, path: str) -> dict:
+        return write_sample_gcode(path, export.mfg_data, export.panel_size, self.time_budget, export.subprograms)
+
+
+class RevitExporter(Exporter):
+    """The layout in the RevitExportPayload schema of utils/revitPayload.ts, plus door and window panels"""
+    name = 'revit'
+    suffix = '.revit.json'
+
+    def __init__(self, cell_size_feet: float = 8, story_height_feet: float = 10):
+        self.cell_size_feet = cell_size_feet
+        self.story_height_feet = story_height_feet
+
+    def input_key(self, export: HouseExport) -> tuple:
+        return self.cell_size_feet, self.story_height_feet, export.floor_hashes
+
+    def write(self, export: HouseExport, path: str):
+        component_counts = dict.fromkeys(REVIT_COMPONENT_TYPES, 0)
+        for comp_type, count in export.component_counts.items():
+            component_counts[REVIT_TYPES[comp_type]] = component_counts.get(REVIT_TYPES[comp_type], 0) + count
+        metadata = {
+            'generatedAt': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'cellSizeFeet': self.cell_size_feet,
+            'storyHeightFeet': self.story_height_feet,
+            'totalFloors': len(export.floors),
+            'totalPanels': sum(component_counts.values()),
+            'componentCounts': component_counts
+        }
+        # Written a story at a time, like project JSON, rather than as one document
+        with open(path, 'w') as f:
+            f.write(f'{{\n  "metadata": {json.dumps(metadata)},\n  "stories": [')
+            for story_index, summary in enumerate(export.floors):
+                f.write(',' if story_index else '')
+                f.write(f'\n    {{"storyNumber": {story_index + 1}, '
+                        f'"elevationFeet": {json.dumps(story_index * self.story_height_feet)}, "components": [')
+                f.write(','.join('\n      ' + json.dumps(component)
+                                 for component in self.story_components(summary.cells, story_index)))
+                f.write(']}')
+            f.write('\n  ]\n}\n')
+
+    def story_components(self, cells, story_index: int):
+        cell = self.cell_size_feet
+        elevation = story_index * self.story_height_feet
+        xs, ys, type_codes, rotation_codes = cells
+        for x, y, type_code, rotation_code in zip(xs.tolist(), ys.tolist(), type_codes.tolist(),
+                                                  rotation_codes.tolist()):
+            comp_type = CODE_TYPES[type_code]
+            yield {
+                'id': f"{REVIT_TYPES[comp_type]}_S{story_index + 1}_{x}_{y}",
+                'type': REVIT_TYPES[comp_type],
+                'family': REVIT_FAMILIES[comp_type],
+                'story': story_index + 1,
+                'position': {'x': x * cell, 'y': y * cell, 'elevation': elevation},
+                'rotationDeg': rotation_code * 90,
+                'footprintCenter': {'x': x * cell + cell / 2, 'y': y * cell + cell / 2}
+            }
+
+
+class BomExporter(Exporter):
+    """Bill of materials: placed components, panels to cut and stock sheets to buy"""
+    name = 'bom'
+    suffix = '.bom.csv'
+    uses_mfg_data = True
+
+    def input_key(self, export: HouseExport) -> tuple:
+        return export.panel_size, export.stocks, export.cut_list_key(), tuple(sorted(
+            (comp_type.value, count) for comp_type, count in export.component_counts.items()))
+
+    def write(self, export: HouseExport, path: str):
+        size = export.panel_size
+        nesting = export.mfg_data['nesting']
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['category', 'item', 'dimensions', 'quantity'])
+            writer.writerows(['component', comp_type.value, f"{size}x{size}", count]
+                             for comp_type, count in sorted(export.component_counts.items(),
+                                                            key=lambda item: item[0].value))
+            writer.writerows(['cut_panel', f"{panel['type']} x{panel['length']}", panel['dimensions'],
+                              panel['quantity']] for panel in export.cut_list)
+            dimensions = {sheet['sku']: sheet['dimensions'] for sheet in nesting['sheets']}
+            writer.writerows(['stock_sheet', sku, dimensions[sku], count]
+                             for sku, count in sorted(nesting['sheets_by_sku'].items()))
+
+
+def default_exporters() -> List[Exporter]:
+    return [ManufacturingExporter(), GcodeExporter(), RevitExporter(), BomExporter()]
+
+
+class ExportOutcome(NamedTuple):
+    path: str
+    ran: bool  # False when the file from an earlier run was still up to date
+    seconds: float
+    result: object  # What the exporter returned, from the earlier run when skipped or cached
+    cached: bool = False  # Written from the export cache rather than by the exporter
+
+
+class ExportPipeline:
+    """Runs exporters over one HouseExport, rewriting only the outputs whose inputs changed"""
+    def __init__(self, exporters: Optional[Sequence[Exporter]] = None, max_workers: Optional[int] = None,
+                 cache: Optional[ExportCache] = None):
+        self.exporters = list(exporters) if exporters is not None else default_exporters()
+        self.max_workers = max_workers
+        self.cache = cache
+        self.last_runs: Dict[str, tuple] = {}  # Exporter name -> (path, input key, result)
+
+    def run(self, house: House, base_filename: str, panel_size: int, summaries: Optional[FloorSummaries] = None,
+            subprograms: bool = False, force: bool = False) -> Dict[str, ExportOutcome]:
+        """Write base_filename plus each exporter's suffix; returns the outcome per exporter name.
+
+        Waits for every writer, so the house is not edited while they read it.
+        """
+        export = HouseExport(house, panel_size, summaries, subprograms, self.cache)
+        outcomes = {}
+        stale = []
+        for exporter in self.exporters:
+            path = base_filename + exporter.suffix
+            key = exporter.input_key(export)
+            last = self.last_runs.get(exporter.name)
+            if not force and last is not None and last[:2] == (path, key) and os.path.exists(path):
+                outcomes[exporter.name] = ExportOutcome(path, False, 0.0, last[2])
+                continue
+            start = time.perf_counter()
+            entry = self.cache.get(self._cache_key(exporter, key)) if self.cache is not None and not force else None
+            if entry is None:
+                stale.append((exporter, path, key))
+                continue
+            result, data = entry
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.last_runs[exporter.name] = (path, key, result)
+            outcomes[exporter.name] = ExportOutcome(path, True, time.perf_counter() - start, result, cached=True)
+
+        if stale:
+            if any(exporter.uses_mfg_data for exporter, _, _ in stale):
+                export.build_mfg_data()
+            with ThreadPoolExecutor(max_workers=self.max_workers or len(stale)) as pool:
+                futures = [pool.submit(_timed_write, exporter, export, path) for exporter, path, _ in stale]
+                for (exporter, path, key), future in zip(stale, futures):
+                    result, seconds = future.result()
+                    self.last_runs[exporter.name] = (path, key, result)
+                    outcomes[exporter.name] = ExportOutcome(path, True, seconds, result)
+                    if self.cache is not None:
+                        with open(path, 'rb') as f:
+                            self.cache.put(self._cache_key(exporter, key), result, f.read())
+        return {exporter.name: outcomes[exporter.name] for exporter in self.exporters}
+
+    @staticmethod
+    def _cache_key(exporter: Exporter, key: tuple) -> str:
+        return cache_key(exporter.name, EXPORT_FORMAT_VERSION, key)
+
+
+def _timed_write(exporter: Exporter, export: HouseExport, path: str):
+    start = time.perf_counter()
+    result = exporter.write(export, path)
+    return result, time.perf_counter() - start
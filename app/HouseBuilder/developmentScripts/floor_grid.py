@@ -0,0 +1,308 @@
+"""Array-backed cell storage for house floors.
+
+Each cell is stored as two bytes: a component type code (0 means empty) and a
+rotation code (rotation in degrees // 90). The grid knows nothing about
+component types; ``house_model.Floor`` maps them to and from codes.
+
+Grids are copy-on-write: ``share()`` returns a grid over the same storage,
+and whichever side is written first copies what it writes to -- the whole
+planes of a dense grid, single chunks of a chunked one. ``revision`` is
+replaced on every write, so grids with the same revision hold the same cells.
+"""
+import struct
+from typing import Dict, Optional, Set, Tuple, Union
+
+import numpy as np
+
+EMPTY_CODE = 0
+
+# Floors with more cells than this default to chunked storage
+CHUNKED_STORAGE_THRESHOLD = 1_000_000
+DEFAULT_CHUNK_SIZE = 64
+
+
+class DenseGrid:
+    """Type and rotation planes covering a whole floor, one uint8 per cell each"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.types = np.zeros((height, width), dtype=np.uint8)
+        self.rotations = np.zeros((height, width), dtype=np.uint8)
+        self.shared = False  # The planes may be referenced by another grid
+        self.revision = object()
+
+    def share(self) -> 'DenseGrid':
+        """A grid over the same planes; each side copies them on its first write"""
+        grid = DenseGrid.__new__(DenseGrid)
+        grid.__dict__.update(self.__dict__)
+        self.shared = grid.shared = True
+        return grid
+
+    def _writable(self):
+        if self.shared:
+            self.types = self.types.copy()
+            self.rotations = self.rotations.copy()
+            self.shared = False
+        self.revision = object()
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x: int, y: int) -> Tuple[int, int]:
+        return int(self.types[y, x]), int(self.rotations[y, x])
+
+    def set(self, x: int, y: int, type_code: int, rotation_code: int = 0):
+        self._writable()
+        self.types[y, x] = type_code
+        self.rotations[y, x] = rotation_code if type_code != EMPTY_CODE else 0
+
+    def get_many(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(type_codes, rotation_codes) of many in-bounds cells"""
+        return self.types[ys, xs], self.rotations[ys, xs]
+
+    def set_many(self, xs: np.ndarray, ys: np.ndarray, type_codes: np.ndarray, rotation_codes: np.ndarray):
+        """Set many cells at once; the arrays are parallel and already in bounds"""
+        self._writable()
+        self.types[ys, xs] = type_codes
+        self.rotations[ys, xs] = np.where(type_codes != EMPTY_CODE, rotation_codes, 0)
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, type_code: int, rotation_code: int = 0):
+        """Set every cell with x0 <= x < x1 and y0 <= y < y1"""
+        self._writable()
+        self.types[y0:y1, x0:x1] = type_code
+        self.rotations[y0:y1, x0:x1] = rotation_code if type_code != EMPTY_CODE else 0
+
+    def clear(self):
+        self.types = np.zeros_like(self.types)
+        self.rotations = np.zeros_like(self.rotations)
+        self.shared = False
+        self.revision = object()
+
+    def occupied(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(xs, ys, type_codes, rotation_codes) of all non-empty cells in row-major order"""
+        return self.occupied_in_rect(0, 0, self.width, self.height)
+
+    def occupied_in_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """Like occupied(), limited to cells with x0 <= x < x1 and y0 <= y < y1"""
+        types = self.types[y0:y1, x0:x1]
+        ys, xs = np.nonzero(types)
+        return xs + x0, ys + y0, types[ys, xs], self.rotations[y0:y1, x0:x1][ys, xs]
+
+    def counts(self) -> np.ndarray:
+        """Number of cells per type code, indexed by code"""
+        return np.bincount(self.types.ravel())
+
+    @property
+    def nbytes(self) -> int:
+        return self.types.nbytes + self.rotations.nbytes
+
+    def planes(self):
+        """Every array holding cells, for counting memory shared between grids"""
+        return [self.types, self.rotations]
+
+
+class ChunkedGrid:
+    """Sparse storage for very large floors: square chunks allocated on first write"""
+
+    def __init__(self, width: int, height: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        # (chunk_x, chunk_y) -> (types, rotations), each chunk_size x chunk_size
+        self.chunks: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+        self.shared_chunks: Set[Tuple[int, int]] = set()  # Chunks that may be referenced by another grid
+        self.revision = object()
+
+    def share(self) -> 'ChunkedGrid':
+        """A grid over the same chunks; each side copies a chunk on its first write to it"""
+        grid = ChunkedGrid(self.width, self.height, self.chunk_size)
+        grid.chunks = dict(self.chunks)
+        self.shared_chunks = set(self.chunks)
+        grid.shared_chunks = set(self.chunks)
+        grid.revision = self.revision
+        return grid
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def _chunk(self, chunk_x: int, chunk_y: int, create: bool) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """A chunk to write to, or None if it is empty and create is False"""
+        self.revision = object()
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is not None and (chunk_x, chunk_y) in self.shared_chunks:
+            chunk = (chunk[0].copy(), chunk[1].copy())
+            self.chunks[(chunk_x, chunk_y)] = chunk
+            self.shared_chunks.discard((chunk_x, chunk_y))
+        if chunk is None and create:
+            shape = (self.chunk_size, self.chunk_size)
+            chunk = (np.zeros(shape, dtype=np.uint8), np.zeros(shape, dtype=np.uint8))
+            self.chunks[(chunk_x, chunk_y)] = chunk
+        return chunk
+
+    def get(self, x: int, y: int) -> Tuple[int, int]:
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        if chunk is None:
+            return EMPTY_CODE, 0
+        local_x, local_y = x % self.chunk_size, y % self.chunk_size
+        return int(chunk[0][local_y, local_x]), int(chunk[1][local_y, local_x])
+
+    def set(self, x: int, y: int, type_code: int, rotation_code: int = 0):
+        self.fill_rect(x, y, x + 1, y + 1, type_code, rotation_code)
+
+    def _chunk_groups(self, xs: np.ndarray, ys: np.ndarray):
+        """Yield (chunk_x, chunk_y, selection mask) for each chunk the cells fall in"""
+        size = self.chunk_size
+        chunk_keys = (ys // size) * ((self.width + size - 1) // size) + xs // size
+        for key in np.unique(chunk_keys).tolist():
+            selected = chunk_keys == key
+            yield int(xs[selected][0]) // size, int(ys[selected][0]) // size, selected
+
+    def get_many(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(type_codes, rotation_codes) of many in-bounds cells"""
+        type_codes = np.zeros(len(xs), dtype=np.uint8)
+        rotation_codes = np.zeros(len(xs), dtype=np.uint8)
+        for chunk_x, chunk_y, selected in self._chunk_groups(xs, ys):
+            chunk = self.chunks.get((chunk_x, chunk_y))
+            if chunk is not None:
+                local_xs, local_ys = xs[selected] % self.chunk_size, ys[selected] % self.chunk_size
+                type_codes[selected] = chunk[0][local_ys, local_xs]
+                rotation_codes[selected] = chunk[1][local_ys, local_xs]
+        return type_codes, rotation_codes
+
+    def set_many(self, xs: np.ndarray, ys: np.ndarray, type_codes: np.ndarray, rotation_codes: np.ndarray):
+        """Set many cells at once; the arrays are parallel and already in bounds"""
+        size = self.chunk_size
+        rotation_codes = np.where(type_codes != EMPTY_CODE, rotation_codes, 0)
+        for chunk_x, chunk_y, selected in self._chunk_groups(xs, ys):
+            chunk = self._chunk(chunk_x, chunk_y, create=bool(type_codes[selected].any()))
+            if chunk is None:
+                continue
+            types, rotations = chunk
+            local_xs, local_ys = xs[selected] % size, ys[selected] % size
+            types[local_ys, local_xs] = type_codes[selected]
+            rotations[local_ys, local_xs] = rotation_codes[selected]
+            if not types.any():
+                del self.chunks[(chunk_x, chunk_y)]
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, type_code: int, rotation_code: int = 0):
+        """Set every cell with x0 <= x < x1 and y0 <= y < y1"""
+        size = self.chunk_size
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        if type_code == EMPTY_CODE:
+            rotation_code = 0
+
+        for chunk_y in range(y0 // size, (y1 - 1) // size + 1):
+            for chunk_x in range(x0 // size, (x1 - 1) // size + 1):
+                chunk = self._chunk(chunk_x, chunk_y, create=type_code != EMPTY_CODE)
+                if chunk is None:
+                    continue
+                types, rotations = chunk
+                local = (slice(max(y0 - chunk_y * size, 0), min(y1 - chunk_y * size, size)),
+                         slice(max(x0 - chunk_x * size, 0), min(x1 - chunk_x * size, size)))
+                types[local] = type_code
+                rotations[local] = rotation_code
+                if type_code == EMPTY_CODE and not types.any():
+                    del self.chunks[(chunk_x, chunk_y)]
+
+    def clear(self):
+        self.chunks = {}
+        self.shared_chunks = set()
+        self.revision = object()
+
+    def occupied(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(xs, ys, type_codes, rotation_codes) of all non-empty cells in row-major order"""
+        return self.occupied_in_rect(0, 0, self.width, self.height)
+
+    def occupied_in_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """Like occupied(), limited to cells with x0 <= x < x1 and y0 <= y < y1"""
+        size = self.chunk_size
+        parts = []
+        for (chunk_x, chunk_y), (types, rotations) in self.chunks.items():
+            origin_x, origin_y = chunk_x * size, chunk_y * size
+            if origin_x >= x1 or origin_y >= y1 or origin_x + size <= x0 or origin_y + size <= y0:
+                continue
+            local_types = types[max(y0 - origin_y, 0):max(y1 - origin_y, 0),
+                                max(x0 - origin_x, 0):max(x1 - origin_x, 0)]
+            ys, xs = np.nonzero(local_types)
+            xs += max(x0 - origin_x, 0)
+            ys += max(y0 - origin_y, 0)
+            parts.append((xs + origin_x, ys + origin_y, types[ys, xs], rotations[ys, xs]))
+
+        if not parts:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, empty.astype(np.uint8), empty.astype(np.uint8)
+        xs, ys, type_codes, rotation_codes = (np.concatenate(column) for column in zip(*parts))
+        order = np.lexsort((xs, ys))
+        return xs[order], ys[order], type_codes[order], rotation_codes[order]
+
+    def counts(self) -> np.ndarray:
+        """Number of cells per type code, indexed by code"""
+        counts = np.zeros(1, dtype=np.int64)
+        for types, _ in self.chunks.values():
+            chunk_counts = np.bincount(types.ravel())
+            if len(chunk_counts) > len(counts):
+                chunk_counts[:len(counts)] += counts
+                counts = chunk_counts
+            else:
+                counts[:len(chunk_counts)] += chunk_counts
+        # Cells outside allocated chunks (and chunk padding past the floor edge) are empty
+        counts[EMPTY_CODE] = self.width * self.height - counts[1:].sum()
+        return counts
+
+    @property
+    def nbytes(self) -> int:
+        return sum(types.nbytes + rotations.nbytes for types, rotations in self.chunks.values())
+
+    def planes(self):
+        """Every array holding cells, for counting memory shared between grids"""
+        return [plane for chunk in self.chunks.values() for plane in chunk]
+
+
+def make_grid(width: int, height: int, storage: Optional[str] = None):
+    """Create the grid storage for a floor: "dense", "chunked", or None to pick by size"""
+    if storage is None:
+        storage = "chunked" if width * height > CHUNKED_STORAGE_THRESHOLD else "dense"
+    if storage == "dense":
+        return DenseGrid(width, height)
+    if storage == "chunked":
+        return ChunkedGrid(width, height)
+    raise ValueError(f"Unknown floor storage: {storage}")
+
+
+def pack_grid(grid) -> Tuple[str, bytes]:
+    """Serialize a grid's cells; returns (encoding, data) for unpack_grid"""
+    if isinstance(grid, ChunkedGrid):
+        keys = sorted(grid.chunks)
+        parts = [struct.pack('<II', grid.chunk_size, len(keys)),
+                 np.array(keys, dtype='<u4').tobytes()]
+        for key in keys:
+            types, rotations = grid.chunks[key]
+            parts.append(types.tobytes())
+            parts.append(rotations.tobytes())
+        return "chunked", b"".join(parts)
+    return "dense", grid.types.tobytes() + grid.rotations.tobytes()
+
+
+def unpack_grid(encoding: str, width: int, height: int, data) -> Union[DenseGrid, ChunkedGrid]:
+    """Rebuild a grid from pack_grid output; data may be any bytes-like object"""
+    if encoding == "dense":
+        grid = DenseGrid(width, height)
+        planes = np.frombuffer(data, dtype=np.uint8, count=2 * width * height)
+        grid.types[:] = planes[:width * height].reshape(height, width)
+        grid.rotations[:] = planes[width * height:].reshape(height, width)
+        return grid
+
+    if encoding == "chunked":
+        chunk_size, count = struct.unpack_from('<II', data)
+        grid = ChunkedGrid(width, height, chunk_size)
+        keys = np.frombuffer(data, dtype='<u4', count=2 * count, offset=8).reshape(count, 2)
+        cells = chunk_size * chunk_size
+        planes = np.frombuffer(data, dtype=np.uint8, count=2 * cells * count, offset=8 + keys.nbytes)
+        for index, (chunk_x, chunk_y) in enumerate(keys.tolist()):
+            chunk = planes[2 * cells * index:2 * cells * (index + 1)].reshape(2, chunk_size, chunk_size)
+            grid.chunks[(chunk_x, chunk_y)] = (chunk[0].copy(), chunk[1].copy())
+        return grid
+
+    raise ValueError(f"Unknown grid encoding: {encoding}")
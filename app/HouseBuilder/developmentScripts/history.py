@@ -0,0 +1,164 @@
+"""Undo/redo history for floor edits.
+
+Each step stores only the cells it changed: a flat cell index plus the old
+and new cell value packed into one byte (type code | rotation code << 4).
+Edits made between begin_step() and end_step() -- a drag stroke, a perimeter
+fill -- become a single step. The oldest steps are evicted once the history
+grows past its memory cap.
+"""
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from house_model import Floor, House
+
+# Rough per-step bookkeeping cost on top of the delta arrays
+_STEP_OVERHEAD_BYTES = 256
+
+
+def pack_cells(type_codes: np.ndarray, rotation_codes: np.ndarray) -> np.ndarray:
+    return np.asarray(type_codes, dtype=np.uint8) | (np.asarray(rotation_codes, dtype=np.uint8) << 4)
+
+
+def unpack_cells(values: np.ndarray):
+    """(type_codes, rotation_codes) from packed cell values"""
+    return values & 0x0F, values >> 4
+
+
+class FloorDelta:
+    """Cells of one floor changed by a step, with their values before and after"""
+
+    __slots__ = ('floor', 'indices', 'old', 'new')
+
+    def __init__(self, floor: Floor, indices: np.ndarray, old: np.ndarray, new: np.ndarray):
+        self.floor = floor
+        self.indices = indices  # y * width + x, int32
+        self.old = old
+        self.new = new
+
+    def cells(self):
+        """(xs, ys) of the changed cells"""
+        return self.indices % self.floor.width, self.indices // self.floor.width
+
+    def apply(self, values: np.ndarray):
+        xs, ys = self.cells()
+        self.floor.set_cells(xs, ys, *unpack_cells(values))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.old.nbytes + self.new.nbytes
+
+
+class EditStep:
+    def __init__(self, label: str, deltas: List[FloorDelta]):
+        self.label = label
+        self.deltas = deltas
+
+    @property
+    def nbytes(self) -> int:
+        return _STEP_OVERHEAD_BYTES + sum(delta.nbytes for delta in self.deltas)
+
+
+class EditHistory:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.undo_steps = deque()
+        self.redo_steps: List[EditStep] = []
+        self.nbytes = 0
+        self.open_label: Optional[str] = None
+        self.open_depth = 0
+        # id(floor) -> (floor, [(indices, old, new), ...]) recorded in the open step
+        self.pending = {}
+
+    def begin_step(self, label: str):
+        """Group every change until the matching end_step() into one undo step"""
+        if self.open_depth == 0:
+            self.open_label = label
+        self.open_depth += 1
+
+    def end_step(self):
+        if self.open_depth == 0:
+            return
+        self.open_depth -= 1
+        if self.open_depth > 0:
+            return
+
+        deltas = [self._merge(floor, records) for floor, records in self.pending.values()]
+        deltas = [delta for delta in deltas if len(delta.indices)]
+        self.pending = {}
+        if deltas:
+            self._push(EditStep(self.open_label, deltas))
+        self.open_label = None
+
+    def set_cells(self, floor: Floor, xs, ys, type_codes, rotation_codes):
+        """Write cells to a floor, recording their previous values in the history"""
+        xs = np.asarray(xs, dtype=np.int32)
+        ys = np.asarray(ys, dtype=np.int32)
+        old = pack_cells(*floor.get_cells(xs, ys))
+        floor.set_cells(xs, ys, type_codes, rotation_codes)
+        new = pack_cells(*floor.get_cells(xs, ys))
+
+        self.begin_step("Edit")
+        self.pending.setdefault(id(floor), (floor, []))[1].append((ys * floor.width + xs, old, new))
+        self.end_step()
+
+    def _merge(self, floor: Floor, records) -> FloorDelta:
+        indices = np.concatenate([record[0] for record in records])
+        old = np.concatenate([record[1] for record in records])
+        new = np.concatenate([record[2] for record in records])
+
+        # A cell touched several times keeps its first old value and its last new value
+        unique, first = np.unique(indices, return_index=True)
+        _, last_reversed = np.unique(indices[::-1], return_index=True)
+        last = len(indices) - 1 - last_reversed
+        old, new = old[first], new[last]
+
+        changed = old != new
+        return FloorDelta(floor, unique[changed].astype(np.int32), old[changed], new[changed])
+
+    def _push(self, step: EditStep):
+        for redo_step in self.redo_steps:
+            self.nbytes -= redo_step.nbytes
+        self.redo_steps.clear()
+        self.undo_steps.append(step)
+        self.nbytes += step.nbytes
+
+        # Evict the oldest steps, but always keep the newest one
+        while self.nbytes > self.max_bytes and len(self.undo_steps) > 1:
+            self.nbytes -= self.undo_steps.popleft().nbytes
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_steps)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_steps)
+
+    def undo(self, house: House) -> Optional[EditStep]:
+        """Revert the newest step; returns it so callers can redraw its cells"""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        for delta in reversed(step.deltas):
+            if any(floor is delta.floor for floor in house.floors):
+                delta.apply(delta.old)
+        self.redo_steps.append(step)
+        return step
+
+    def redo(self, house: House) -> Optional[EditStep]:
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        for delta in step.deltas:
+            if any(floor is delta.floor for floor in house.floors):
+                delta.apply(delta.new)
+        self.undo_steps.append(step)
+        return step
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.nbytes = 0
+        self.pending = {}
+        self.open_label = None
+        self.open_depth = 0
@@ -0,0 +1,429 @@
+"""Cell-by-cell differences between two revisions of a House, and the panels they affect.
+
+Floors are compared by index. Each floor is cut into square tiles (the chunk
+size of chunked floors) and each non-empty tile is hashed; only tiles whose
+hashes differ are compared cell by cell. Floors that still share their cells
+(Floor.copy, or an unedited floor of the same House) and chunks shared
+between chunked floors are skipped without hashing, and a grid's tile hashes
+are kept until it is next edited, so diffing many revisions against one base
+hashes the base once.
+
+Usage:
+    python house_diff.py old.json new.hbp [--json diff.json]
+
+Exits with status 0 when the houses have the same floors, floor sizes and
+cells, and 1 when they differ.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cell_runs import Runs, find_runs
+from floor_grid import DEFAULT_CHUNK_SIZE, EMPTY_CODE, ChunkedGrid
+from house_model import CODE_TYPES, ComponentType, Floor, House
+from manufacturing import split_panels
+from nesting import max_piece_cells, stock_sheets
+
+# grid -> (revision, tile size, {(tile_x, tile_y): digest}) for grids not edited since
+_tile_hash_cache = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class FloorDiff:
+    """Cells that differ on one floor, as parallel arrays in row-major order; empty cells have type code 0"""
+    floor_number: int
+    xs: np.ndarray
+    ys: np.ndarray
+    old_types: np.ndarray
+    old_rotations: np.ndarray
+    new_types: np.ndarray
+    new_rotations: np.ndarray
+    tiles: int = 0  # Non-empty tiles on either side, not counting chunks both floors share
+    tiles_compared: int = 0  # Tiles whose hashes differed, compared cell by cell
+
+    @property
+    def added(self) -> np.ndarray:
+        return self.old_types == EMPTY_CODE
+
+    @property
+    def removed(self) -> np.ndarray:
+        return self.new_types == EMPTY_CODE
+
+    @property
+    def changed(self) -> np.ndarray:
+        """A component replaced by another type, or turned"""
+        return (self.old_types != EMPTY_CODE) & (self.new_types != EMPTY_CODE)
+
+    def counts(self) -> Dict[str, int]:
+        return {'added': int(self.added.sum()), 'removed': int(self.removed.sum()),
+                'changed': int(self.changed.sum())}
+
+    def to_dict(self) -> dict:
+        def cell(type_code, rotation_code):
+            return {'type': CODE_TYPES[type_code].value, 'rotation': rotation_code * 90} if type_code else None
+        rows = zip(self.xs.tolist(), self.ys.tolist(), self.old_types.tolist(), self.old_rotations.tolist(),
+                   self.new_types.tolist(), self.new_rotations.tolist())
+        return {
+            'floor_number': self.floor_number,
+            **self.counts(),
+            'cells': [{'x': x, 'y': y, 'old': cell(old_type, old_rotation), 'new': cell(new_type, new_rotation)}
+                      for x, y, old_type, old_rotation, new_type, new_rotation in rows]
+        }
+
+
+@dataclass
+class HouseDiff:
+    floors: List[FloorDiff]  # Only floors with differences
+    old_floor_count: int
+    new_floor_count: int
+    bom: dict  # See delta_bom
+    seconds: float
+    # Floor number -> ((old width, old height), (new width, new height)) of floors on both sides that changed size
+    resized: Dict[int, Tuple[Tuple[int, int], Tuple[int, int]]] = field(default_factory=dict)
+
+    @property
+    def identical(self) -> bool:
+        return not self.floors and not self.resized and self.old_floor_count == self.new_floor_count
+
+    def counts(self) -> Dict[str, int]:
+        totals = {'added': 0, 'removed': 0, 'changed': 0}
+        for floor in self.floors:
+            for kind, count in floor.counts().items():
+                totals[kind] += count
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            'old_floors': self.old_floor_count,
+            'new_floors': self.new_floor_count,
+            'resized': [{'floor_number': number, 'old_size': list(old_size), 'new_size': list(new_size)}
+                        for number, (old_size, new_size) in sorted(self.resized.items())],
+            **self.counts(),
+            'floors': [floor.to_dict() for floor in self.floors],
+            'bom': self.bom
+        }
+
+
+def _tile(grid, tile_x: int, tile_y: int, size: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """(types, rotations) of one tile, clipped to the floor, or None when it has no components"""
+    x0, y0 = tile_x * size, tile_y * size
+    x1, y1 = min(x0 + size, grid.width), min(y0 + size, grid.height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    if isinstance(grid, ChunkedGrid):
+        if grid.chunk_size == size:
+            chunk = grid.chunks.get((tile_x, tile_y))
+            if chunk is None:
+                return None
+            types, rotations = chunk[0][:y1 - y0, :x1 - x0], chunk[1][:y1 - y0, :x1 - x0]
+        else:
+            xs, ys, type_codes, rotation_codes = grid.occupied_in_rect(x0, y0, x1, y1)
+            types = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            rotations = np.zeros_like(types)
+            types[ys - y0, xs - x0] = type_codes
+            rotations[ys - y0, xs - x0] = rotation_codes
+    else:
+        types, rotations = grid.types[y0:y1, x0:x1], grid.rotations[y0:y1, x0:x1]
+    return (types, rotations) if types.any() else None
+
+
+def _candidate_tiles(grid, size: int):
+    """Tiles that may hold components"""
+    if isinstance(grid, ChunkedGrid):
+        chunk = grid.chunk_size
+        return {(tile_x, tile_y) for chunk_x, chunk_y in grid.chunks
+                for tile_y in range(chunk_y * chunk // size, ((chunk_y + 1) * chunk - 1) // size + 1)
+                for tile_x in range(chunk_x * chunk // size, ((chunk_x + 1) * chunk - 1) // size + 1)}
+    return {(tile_x, tile_y) for tile_y in range(-(-grid.height // size)) for tile_x in range(-(-grid.width // size))}
+
+
+def tile_hashes(grid, size: int = DEFAULT_CHUNK_SIZE, skip=frozenset()) -> Dict[Tuple[int, int], bytes]:
+    """Digest of every non-empty tile of a grid but those in skip, reused until the grid is edited"""
+    cached = _tile_hash_cache.get(grid)
+    if cached is not None and cached[0] is grid.revision and cached[1] == size:
+        return cached[2]
+    hashes = {}
+    for key in _candidate_tiles(grid, size) - skip:
+        tile = _tile(grid, *key, size)
+        if tile is not None:
+            types, rotations = tile
+            digest = hashlib.blake2b(np.array(types.shape, dtype='<u4').tobytes(), digest_size=16)
+            digest.update(np.ascontiguousarray(types).tobytes())
+            digest.update(np.ascontiguousarray(rotations).tobytes())
+            hashes[key] = digest.digest()
+    if not skip:
+        _tile_hash_cache[grid] = (grid.revision, size, hashes)
+    return hashes
+
+
+def _tile_size(*grids) -> int:
+    """The chunk size of a chunked grid, so its chunks are tiles as they are"""
+    return next((grid.chunk_size for grid in grids if isinstance(grid, ChunkedGrid)), DEFAULT_CHUNK_SIZE)
+
+
+def _empty_cells():
+    empty = np.zeros(0, dtype=np.intp)
+    return [empty, empty, empty.astype(np.uint8), empty.astype(np.uint8), empty.astype(np.uint8),
+            empty.astype(np.uint8)]
+
+
+def diff_floors(old: Optional[Floor], new: Optional[Floor], floor_number: int) -> FloorDiff:
+    """Cells that differ between two floors; a missing floor counts as empty"""
+    if old is not None and new is not None and old.revision is new.revision:
+        return FloorDiff(floor_number, *_empty_cells())
+    grids = [floor.grid for floor in (old, new) if floor is not None]
+    size = _tile_size(*grids)
+    shared = frozenset()
+    if len(grids) == 2 and all(isinstance(grid, ChunkedGrid) and grid.chunk_size == size for grid in grids):
+        # Chunks still shared since one floor was copied from the other are equal without looking
+        shared = frozenset(key for key, chunk in grids[0].chunks.items() if grids[1].chunks.get(key) is chunk)
+    old_hashes = tile_hashes(old.grid, size, shared) if old is not None else {}
+    new_hashes = tile_hashes(new.grid, size, shared) if new is not None else {}
+    keys = (old_hashes.keys() | new_hashes.keys()) - shared
+
+    parts = []
+    compared = 0
+    for key in keys:
+        if old_hashes.get(key) == new_hashes.get(key):
+            continue
+        compared += 1
+        tile_x, tile_y = key
+        old_tile = _tile(old.grid, tile_x, tile_y, size) if key in old_hashes else None
+        new_tile = _tile(new.grid, tile_x, tile_y, size) if key in new_hashes else None
+        # Pad both sides to the same shape; floors of different sizes clip edge tiles differently
+        height = max(tile[0].shape[0] for tile in (old_tile, new_tile) if tile is not None)
+        width = max(tile[0].shape[1] for tile in (old_tile, new_tile) if tile is not None)
+        planes = []
+        for tile in (old_tile, new_tile):
+            types, rotations = np.zeros((height, width), dtype=np.uint8), np.zeros((height, width), dtype=np.uint8)
+            if tile is not None:
+                types[:tile[0].shape[0], :tile[0].shape[1]] = tile[0]
+                rotations[:tile[1].shape[0], :tile[1].shape[1]] = tile[1]
+            planes += [types, rotations]
+        old_types, old_rotations, new_types, new_rotations = planes
+        ys, xs = np.nonzero((old_types != new_types) | (old_rotations != new_rotations))
+        parts.append((xs + tile_x * size, ys + tile_y * size, old_types[ys, xs], old_rotations[ys, xs],
+                      new_types[ys, xs], new_rotations[ys, xs]))
+
+    columns = [np.concatenate(column) for column in zip(*parts)] if parts else _empty_cells()
+    order = np.lexsort((columns[0], columns[1]))
+    return FloorDiff(floor_number, *(column[order] for column in columns), tiles=len(keys), tiles_compared=compared)
+
+
+def _band(floor: Optional[Floor], x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+    """Type codes of a rectangle, empty where it runs past the floor"""
+    types = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    if floor is not None:
+        xs, ys, type_codes, _ = floor.grid.occupied_in_rect(max(x0, 0), max(y0, 0), x1, y1)
+        types[ys - y0, xs - x0] = type_codes
+    return types
+
+
+def _leftover(types: np.ndarray) -> np.ndarray:
+    """Cells not in a horizontal run of two or more, which cell_runs puts in vertical runs"""
+    same_as_next = types[:, 1:] == types[:, :-1]
+    same = np.zeros(types.shape, dtype=bool)
+    same[:, 1:] = same_as_next
+    same[:, :-1] |= same_as_next
+    return (types != EMPTY_CODE) & ~same
+
+
+def _ranges(values: np.ndarray) -> List[Tuple[int, int]]:
+    """Sorted unique integers as (start, stop) ranges of consecutive values"""
+    breaks = np.flatnonzero(np.diff(values) != 1) + 1
+    return [(int(part[0]), int(part[-1]) + 1) for part in np.split(values, breaks)] if len(values) else []
+
+
+def _join_runs(parts: List[Runs]) -> Runs:
+    return Runs(*(np.concatenate(column) for column in zip(*parts))) if parts else find_runs([], [], [])
+
+
+def _local_runs(floor: Optional[Floor], rows, columns, width: int, height: int) -> Runs:
+    """Horizontal runs in the row ranges and vertical runs in the column ranges, as find_runs makes them.
+
+    A cell's row run only depends on its row, and whether it is left over for
+    a column run only on its row neighbours, so these are exactly the runs of
+    the whole floor that lie in those rows and columns.
+    """
+    parts = []
+    for y0, y1 in rows:
+        types = _band(floor, 0, y0, width, y1)
+        ys, xs = np.nonzero(types)
+        runs = find_runs(xs, ys + y0, types[ys, xs])
+        parts.append(Runs(*(column[runs.horizontal] for column in runs)))
+    for x0, x1 in columns:
+        # One column either side decides which cells are left over
+        types = _band(floor, x0 - 1, 0, x1 + 1, height)
+        ys, xs = np.nonzero(_leftover(types)[:, 1:-1])
+        # Left-over cells next to each other in a row differ in type, so these all come back vertical
+        parts.append(find_runs(xs + x0, ys, types[:, 1:-1][ys, xs]))
+    return _join_runs(parts)
+
+
+def _floor_runs(floor: Optional[Floor]) -> Runs:
+    if floor is None:
+        return find_runs([], [], [])
+    xs, ys, type_codes, _ = floor.grid.occupied()
+    return find_runs(xs, ys, type_codes)
+
+
+def _panel_counts(runs: Runs, selected=None) -> Dict[Tuple[int, int], int]:
+    """(type code, length) -> number of runs, optionally only the selected runs"""
+    type_codes, lengths = (runs.type_codes, runs.lengths) if selected is None else \
+        (runs.type_codes[selected], runs.lengths[selected])
+    if not len(lengths):
+        return {}
+    panels, counts = np.unique(np.column_stack([type_codes, lengths]), axis=0, return_counts=True)
+    return {(type_code, length): count for (type_code, length), count in zip(panels.tolist(), counts.tolist())}
+
+
+def _run_keys(runs: Runs, width: int, height: int) -> np.ndarray:
+    """One integer per run from its start, direction, length and type"""
+    keys = (runs.ys.astype(np.int64) * width + runs.xs) * 2 + runs.horizontal
+    keys = keys * (max(width, height) + 1) + runs.lengths
+    return keys * len(CODE_TYPES) + runs.type_codes
+
+
+def _new_runs(old_runs: Runs, new_runs: Runs, width: int, height: int) -> np.ndarray:
+    """Indices of the new runs the old floor does not have unchanged: new, split, joined or shortened panels"""
+    return np.flatnonzero(~np.isin(_run_keys(new_runs, width, height), _run_keys(old_runs, width, height)))
+
+
+def _changed_runs(old: Optional[Floor], new: Optional[Floor], diff: FloorDiff) -> Tuple[Runs, Runs]:
+    """Runs of the old and new floor that may differ: those in rows or columns the diff can affect"""
+    width = max(floor.width for floor in (old, new) if floor is not None)
+    height = max(floor.height for floor in (old, new) if floor is not None)
+    rows = _ranges(np.unique(diff.ys))
+    # Columns where a cell of a changed row is left over on one side only, or changed type
+    columns = set()
+    for y0, y1 in rows:
+        old_types, new_types = _band(old, 0, y0, width, y1), _band(new, 0, y0, width, y1)
+        differs = (old_types != new_types) | (_leftover(old_types) != _leftover(new_types))
+        columns.update(np.flatnonzero(differs.any(axis=0)).tolist())
+    columns = _ranges(np.array(sorted(columns), dtype=np.int64))
+
+    cells_read = sum(y1 - y0 for y0, y1 in rows) * width + sum(x1 - x0 + 2 for x0, x1 in columns) * height
+    if old is None or new is None or cells_read > width * height // 2:
+        return _floor_runs(old), _floor_runs(new)
+    return _local_runs(old, rows, columns, width, height), _local_runs(new, rows, columns, width, height)
+
+
+def _cut_entries(panels: Dict[Tuple[int, int], int], panel_size: int) -> List[dict]:
+    return [{
+        'type': CODE_TYPES[type_code].value,
+        'length': length,
+        'quantity': quantity,
+        'dimensions': f"{length * panel_size}x{panel_size}"
+    } for (type_code, length), quantity in sorted(panels.items())]
+
+
+def delta_bom(old: House, new: House, floors: List[FloorDiff], panel_size: int = 8) -> dict:
+    """Components and cut panels gained or lost, and the new panels the old house did not have.
+
+    Only the runs in rows and columns near the differences are counted again;
+    'reissue' lists the panels of the new house to send to the factory: every
+    run without an unchanged run (same start, direction, length and type) in
+    the old house, so shortened and split runs are reissued too.
+    """
+    max_cells = max_piece_cells(panel_size, stock_sheets())
+    component_delta = {}
+    old_panels, new_panels, reissue = {}, {}, {}
+    for diff in floors:
+        for type_codes, sign in ((diff.new_types, 1), (diff.old_types, -1)):
+            for code, count in enumerate(np.bincount(type_codes, minlength=len(CODE_TYPES)).tolist()):
+                if code != EMPTY_CODE and count:
+                    key = CODE_TYPES[code].value
+                    component_delta[key] = component_delta.get(key, 0) + sign * count
+        index = diff.floor_number
+        old_floor = old.floors[index] if index < len(old.floors) else None
+        new_floor = new.floors[index] if index < len(new.floors) else None
+        old_runs, new_runs = _changed_runs(old_floor, new_floor, diff)
+        width = max(floor.width for floor in (old_floor, new_floor) if floor is not None)
+        height = max(floor.height for floor in (old_floor, new_floor) if floor is not None)
+        for counts, panels in ((old_panels, _panel_counts(old_runs)), (new_panels, _panel_counts(new_runs)),
+                               (reissue, _panel_counts(new_runs, _new_runs(old_runs, new_runs, width, height)))):
+            for panel, count in panels.items():
+                counts[panel] = counts.get(panel, 0) + count
+
+    # Cut long runs into the pieces the cut list has
+    old_panels, new_panels, reissue = (split_panels(panels, max_cells) for panels in (old_panels, new_panels, reissue))
+    cut_list = []
+    for type_code, length in sorted(old_panels.keys() | new_panels.keys()):
+        before, after = old_panels.get((type_code, length), 0), new_panels.get((type_code, length), 0)
+        if before != after:
+            cut_list.append({'type': CODE_TYPES[type_code].value, 'length': length, 'delta': after - before,
+                             'dimensions': f"{length * panel_size}x{panel_size}"})
+    return {
+        'components': {comp_type.value: component_delta[comp_type.value] for comp_type in ComponentType
+                       if component_delta.get(comp_type.value)},
+        'cut_list': cut_list,
+        'reissue': _cut_entries(reissue, panel_size)
+    }
+
+
+def diff_houses(old: House, new: House, panel_size: int = 8) -> HouseDiff:
+    """Differences between two houses, floor by floor, with the delta BOM"""
+    start = time.perf_counter()
+    floors = []
+    for index in range(max(len(old.floors), len(new.floors))):
+        diff = diff_floors(old.floors[index] if index < len(old.floors) else None,
+                           new.floors[index] if index < len(new.floors) else None, index)
+        if len(diff.xs):
+            floors.append(diff)
+    resized = {index: ((old_floor.width, old_floor.height), (new_floor.width, new_floor.height))
+               for index, (old_floor, new_floor) in enumerate(zip(old.floors, new.floors))
+               if (old_floor.width, old_floor.height) != (new_floor.width, new_floor.height)}
+    bom = delta_bom(old, new, floors, panel_size)
+    return HouseDiff(floors, len(old.floors), len(new.floors), bom, time.perf_counter() - start, resized)
+
+
+def format_diff(diff: HouseDiff) -> List[str]:
+    """Human-readable summary lines"""
+    if diff.identical:
+        return [f"No differences ({diff.seconds:.3f}s)"]
+    lines = []
+    if diff.old_floor_count != diff.new_floor_count:
+        lines.append(f"Floors: {diff.old_floor_count} -> {diff.new_floor_count}")
+    for number, ((old_width, old_height), (new_width, new_height)) in sorted(diff.resized.items()):
+        lines.append(f"Floor {number}: resized {old_width}x{old_height} -> {new_width}x{new_height}")
+    for floor in diff.floors:
+        counts = floor.counts()
+        lines.append(f"Floor {floor.floor_number}: {counts['added']} added, {counts['removed']} removed, "
+                     f"{counts['changed']} changed ({floor.tiles_compared} of {floor.tiles} tiles compared)")
+    for comp_type, delta in diff.bom['components'].items():
+        lines.append(f"  {comp_type}: {delta:+d}")
+    for panel in diff.bom['cut_list']:
+        lines.append(f"  cut {panel['type']} x{panel['length']} ({panel['dimensions']}): {panel['delta']:+d}")
+    reissued = sum(panel['quantity'] for panel in diff.bom['reissue'])
+    lines.append(f"Panels to reissue: {reissued}")
+    lines.append(f"Compared in {diff.seconds:.3f}s")
+    return lines
+
+
+def main(argv=None) -> int:
+    from project_io import load_project
+
+    parser = argparse.ArgumentParser(description="Show what changed between two House Builder projects")
+    parser.add_argument('old', help="earlier project file (.json or .hbp)")
+    parser.add_argument('new', help="later project file")
+    parser.add_argument('--panel-size', type=int, default=8, help="panel size in grid units (default: 8)")
+    parser.add_argument('--json', help="also write the full diff, every changed cell included, to this file")
+    args = parser.parse_args(argv)
+
+    diff = diff_houses(load_project(args.old), load_project(args.new), args.panel_size)
+    print("\n".join(format_diff(diff)))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(diff.to_dict(), f, indent=2)
+    return 0 if diff.identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""House data model: component types, floors and the house itself.
+
+Kept free of tkinter so scripts and worker processes can load and export
+projects without a display. Changes are announced on House.events (see
+model_events).
+"""
+import warnings
+from enum import Enum
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Tuple, Optional, Iterator
+
+import numpy as np
+
+from floor_grid import make_grid, EMPTY_CODE
+from model_events import (CellsChanged, ChangeBus, FloorAdded, FloorRemoved, FloorsRenumbered,
+                          FloorsReplaced)
+
+
+# Component types
+class ComponentType(Enum):
+    WALL_PANEL = "wall_panel"
+    DOOR_PANEL = "door_panel"
+    WINDOW_PANEL = "window_panel"
+    FLOOR_PANEL = "floor_panel"
+    EMPTY = "empty"
+
+
+# Component colors for visualization
+COMPONENT_COLORS = {
+    ComponentType.WALL_PANEL: "#8B4513",
+    ComponentType.DOOR_PANEL: "#654321",
+    ComponentType.WINDOW_PANEL: "#87CEEB",
+    ComponentType.FLOOR_PANEL: "#D2691E",
+    ComponentType.EMPTY: "#F0F0F0"
+}
+
+# Compact type codes used by the floor grid storage (0 is an empty cell)
+TYPE_CODES = {
+    ComponentType.EMPTY: EMPTY_CODE,
+    ComponentType.WALL_PANEL: 1,
+    ComponentType.DOOR_PANEL: 2,
+    ComponentType.WINDOW_PANEL: 3,
+    ComponentType.FLOOR_PANEL: 4
+}
+CODE_TYPES = {code: comp_type for comp_type, code in TYPE_CODES.items()}
+
+
+@dataclass
+class Component:
+    type: ComponentType
+    x: int
+    y: int
+    rotation: int = 0  # 0, 90, 180, 270 degrees
+
+    def to_dict(self):
+        return {
+            'type': self.type.value,
+            'x': self.x,
+            'y': self.y,
+            'rotation': self.rotation
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            type=ComponentType(data['type']),
+            x=data['x'],
+            y=data['y'],
+            rotation=data.get('rotation', 0)
+        )
+
+
+class Floor:
+    def __init__(self, floor_number: int, width: int = 10, height: int = 10, storage: Optional[str] = None,
+                 grid_loader: Optional[Callable] = None):
+        self.floor_number = floor_number
+        self.width = width
+        self.height = height
+        # Dense planes for normal floors, sparse chunks for very large sites.
+        # With a grid_loader the grid is only built the first time it is used.
+        self._grid = None if grid_loader else make_grid(width, height, storage)
+        self._grid_loader = grid_loader
+        self.events: Optional[ChangeBus] = None  # The owning house's bus, set when the floor is added to it
+
+    @property
+    def grid(self):
+        if self._grid is None:
+            self._grid = self._grid_loader()
+            self._grid_loader = None
+        return self._grid
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._grid is not None
+
+    @property
+    def revision(self):
+        """Opaque token replaced on every edit; floors with the same revision have the same cells"""
+        return self.grid.revision
+
+    def copy(self, floor_number: int) -> 'Floor':
+        """A floor with the same cells, sharing storage until either floor is edited"""
+        grid = self.grid.share()
+        return Floor(floor_number, self.width, self.height, grid_loader=lambda: grid)
+
+    def add_component(self, component: Component):
+        """Place a component, replacing whatever occupies its cell (EMPTY clears the cell)"""
+        if not self.grid.in_bounds(component.x, component.y):
+            raise IndexError(f"Cell ({component.x}, {component.y}) is outside the "
+                             f"{self.width}x{self.height} floor")
+        self.grid.set(component.x, component.y, TYPE_CODES[component.type], component.rotation // 90 % 4)
+        self._cells_changed([component.x], [component.y])
+
+    def _cells_changed(self, xs, ys):
+        if self.events is not None:
+            self.events.emit(CellsChanged(self, np.asarray(xs), np.asarray(ys)))
+
+    def _checked_cells(self, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        outside = (xs < 0) | (xs >= self.width) | (ys < 0) | (ys >= self.height)
+        if outside.any():
+            index = int(np.argmax(outside))
+            raise IndexError(f"Cell ({xs[index]}, {ys[index]}) is outside the {self.width}x{self.height} floor")
+        return xs, ys
+
+    def get_cells(self, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+        """(type_codes, rotation_codes) for parallel sequences of cell coordinates"""
+        xs, ys = self._checked_cells(xs, ys)
+        return self.grid.get_many(xs, ys)
+
+    def set_cells(self, xs, ys, type_codes, rotation_codes):
+        """Set many cells from parallel sequences of coordinates, type codes and rotation codes"""
+        xs, ys = self._checked_cells(xs, ys)
+        self.grid.set_many(xs, ys, np.asarray(type_codes, dtype=np.uint8), np.asarray(rotation_codes, dtype=np.uint8))
+        self._cells_changed(xs, ys)
+
+    def load_cells(self, xs, ys, type_codes, rotation_codes):
+        """set_cells for loaders: cells outside the floor are skipped with a warning instead of raising"""
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if not inside.all():
+            index = int(np.argmin(inside))
+            warnings.warn(f"Skipped {int((~inside).sum())} component(s) outside the {self.width}x{self.height} "
+                          f"floor {self.floor_number}, first at ({xs[index]}, {ys[index]})")
+        self.set_cells(xs[inside], ys[inside], np.asarray(type_codes, dtype=np.uint8)[inside],
+                       np.asarray(rotation_codes, dtype=np.uint8)[inside])
+
+    def remove_component(self, x: int, y: int):
+        if self.grid.in_bounds(x, y):
+            self.grid.set(x, y, EMPTY_CODE)
+            self._cells_changed([x], [y])
+
+    def get_component(self, x: int, y: int) -> Optional[Component]:
+        if not self.grid.in_bounds(x, y):
+            return None
+        type_code, rotation_code = self.grid.get(x, y)
+        if type_code == EMPTY_CODE:
+            return None
+        return Component(CODE_TYPES[type_code], x, y, rotation_code * 90)
+
+    def iter_components(self, region: Optional[Tuple[int, int, int, int]] = None) -> Iterator[Component]:
+        """Yield the placed components in row-major order, optionally only those in (x0, y0, x1, y1)"""
+        if region is None:
+            xs, ys, type_codes, rotation_codes = self.grid.occupied()
+        else:
+            xs, ys, type_codes, rotation_codes = self.grid.occupied_in_rect(*region)
+        for x, y, type_code, rotation_code in zip(xs.tolist(), ys.tolist(), type_codes.tolist(),
+                                                  rotation_codes.tolist()):
+            yield Component(CODE_TYPES[type_code], x, y, rotation_code * 90)
+
+    def component_counts(self) -> Dict[ComponentType, int]:
+        """Number of placed components per type"""
+        counts = self.grid.counts()
+        return {CODE_TYPES[code]: int(count) for code, count in enumerate(counts)
+                if code != EMPTY_CODE and count}
+
+    def clear(self):
+        xs, ys, _, _ = self.grid.occupied()
+        self.grid.clear()
+        self._cells_changed(xs, ys)
+
+    def to_dict(self):
+        return {
+            'floor_number': self.floor_number,
+            'width': self.width,
+            'height': self.height,
+            'components': [comp.to_dict() for comp in self.iter_components()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        floor = cls(data['floor_number'], data['width'], data['height'])
+        components = [Component.from_dict(comp_data) for comp_data in data['components']]
+        floor.load_cells([comp.x for comp in components],
+                         [comp.y for comp in components],
+                         [TYPE_CODES[comp.type] for comp in components],
+                         [comp.rotation // 90 % 4 for comp in components])
+        return floor
+
+
+class House:
+    def __init__(self):
+        self.events = ChangeBus()
+        self._floors: List[Floor] = []
+        self.floors = [Floor(0)]  # Start with ground floor
+        self.current_floor_index = 0
+
+    @property
+    def floors(self) -> List[Floor]:
+        """The floors, bottom first; add and remove them through House methods so changes are announced"""
+        return self._floors
+
+    @floors.setter
+    def floors(self, floors: List[Floor]):
+        for floor in self._floors:
+            floor.events = None
+        self._floors = list(floors)
+        for floor in self._floors:
+            floor.events = self.events
+        self.events.emit(FloorsReplaced())
+
+    def add_floor(self, copy_of: Optional[int] = None):
+        """Add an empty floor on top, or a copy of floor copy_of that shares its cells until edited"""
+        new_floor_number = len(self.floors)
+        if copy_of is None:
+            self.append_floor(Floor(new_floor_number))
+        else:
+            self.append_floor(self.floors[copy_of].copy(new_floor_number))
+
+    def append_floor(self, floor: Floor):
+        floor.events = self.events
+        self._floors.append(floor)
+        self.events.emit(FloorAdded(floor, len(self._floors) - 1))
+
+    def remove_floor(self, index: int):
+        if len(self.floors) > 1 and 0 <= index < len(self.floors):
+            floor = self._floors.pop(index)
+            floor.events = None
+            self.current_floor_index = min(self.current_floor_index, len(self._floors) - 1)
+            self.events.emit(FloorRemoved(floor, index))
+            # Renumber floors
+            for i, floor in enumerate(self.floors):
+                floor.floor_number = i
+            if index < len(self._floors):
+                self.events.emit(FloorsRenumbered())
+
+    def get_current_floor(self) -> Floor:
+        return self.floors[self.current_floor_index]
+
+    def cell_bytes(self) -> int:
+        """Memory held by the floors' cells, counting storage shared between floors once"""
+        planes = {id(plane): plane for floor in self.floors if floor.is_loaded for plane in floor.grid.planes()}
+        return sum(plane.nbytes for plane in planes.values())
+
+    def to_dict(self):
+        return {
+            'floors': [floor.to_dict() for floor in self.floors],
+            'current_floor_index': self.current_floor_index
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        house = cls()
+        house.floors = [Floor.from_dict(floor_data) for floor_data in data['floors']]
+        house.current_floor_index = data['current_floor_index']
+        return house
+
+
+def line_cells(x0: int, y0: int, x1: int, y1: int) -> List[Tuple[int, int]]:
+    """Grid cells on the line from (x0, y0) to (x1, y1), inclusive (Bresenham)"""
+    cells = []
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    error = dx + dy
+    while True:
+        cells.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            return cells
+        doubled = 2 * error
+        if doubled >= dy:
+            error += dy
+            x0 += step_x
+        if doubled <= dx:
+            error += dx
+            y0 += step_y
@@ -0,0 +1,241 @@
+"""Offscreen isometric renderer: the preview scene as a NumPy pixel buffer.
+
+For large houses one canvas item per face is too slow to create and too heavy
+for Tk to redraw, so this renderer paints the scene into an (h, w, 3) array
+instead. Each face of each CELL_SHAPES entry is rasterized once into a sprite
+at the cell origin; every cell is then a stamp of those sprites at its
+projected position, written with a few vectorized assignments per batch of
+cells. Projection, colours and hidden-face culling are the ones the canvas
+preview uses, so both renderers show the same scene.
+"""
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from house_model import CODE_TYPES, TYPE_CODES, Floor
+from isometric import (CEILING_COLOR, CELL_SHAPES, DETAIL_FULL, FACE_COLORS, GROUND_COLOR, ISO_X, ISO_Y, IsoView,
+                       depth_order, floor_detail, reduced_faces, visible_sides)
+
+BACKGROUND_COLOR = '#E0E0E0'
+OUTLINE_COLOR = '#000000'
+# Pixels written per vectorized batch, bounding the memory a large floor needs
+_BATCH_PIXELS = 1 << 22
+
+
+class Sprite(NamedTuple):
+    """Pixels of one face relative to the rounded screen position of its cell's origin"""
+    xs: np.ndarray
+    ys: np.ndarray
+    outline: np.ndarray  # True for outline pixels, drawn black over the fill
+
+
+def hex_rgb(color: str) -> Tuple[int, int, int]:
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+def _pixel_centers(points: np.ndarray, pad: int, clip: Optional[Tuple[int, int]] = None
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+    x0, y0 = np.floor(points.min(axis=0)).astype(int) - pad
+    x1, y1 = np.ceil(points.max(axis=0)).astype(int) + pad
+    if clip is not None:
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = max(min(x1, clip[0]), x0), max(min(y1, clip[1]), y0)
+    ys, xs = np.mgrid[y0:y1, x0:x1]
+    return xs.ravel(), ys.ravel()
+
+
+def rasterize_polygon(points: np.ndarray, clip: Optional[Tuple[int, int]] = None) -> Sprite:
+    """Pixels of a convex polygon given as (m, 2) screen points, with a one pixel outline.
+
+    clip limits the pixels to a (width, height) image.
+    """
+    xs, ys = _pixel_centers(points, 1, clip)
+    cx, cy = xs + 0.5, ys + 0.5
+    x, y = points[:, 0], points[:, 1]
+    orientation = 1.0 if np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y) >= 0 else -1.0
+
+    # Signed distance of each pixel centre inside the polygon, from its nearest edge
+    distance = np.full(len(xs), np.inf)
+    for (ax, ay), (bx, by) in zip(points, np.roll(points, -1, axis=0)):
+        length = np.hypot(bx - ax, by - ay)
+        if length == 0:
+            continue
+        edge = ((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) * orientation / length
+        distance = np.minimum(distance, edge)
+    inside = distance >= -0.5
+    return Sprite(xs[inside], ys[inside], distance[inside] < 0.5)
+
+
+def rasterize_line(points: np.ndarray) -> Sprite:
+    """Pixels of a one pixel wide line between two (2, 2) screen points"""
+    xs, ys = _pixel_centers(points, 1)
+    cx, cy = xs + 0.5, ys + 0.5
+    (ax, ay), (bx, by) = points
+    length_sq = (bx - ax) ** 2 + (by - ay) ** 2
+    t = np.clip(((cx - ax) * (bx - ax) + (cy - ay) * (by - ay)) / length_sq, 0, 1) if length_sq else 0
+    on_line = np.hypot(cx - ax - t * (bx - ax), cy - ay - t * (by - ay)) <= 0.5
+    return Sprite(xs[on_line], ys[on_line], np.zeros(int(on_line.sum()), dtype=bool))
+
+
+@lru_cache(maxsize=8)
+def cell_sprites(scale: float) -> Dict[int, List[Sprite]]:
+    """Sprites for every face of every cell shape, by type code, in drawing order"""
+    sprites = {}
+    for comp_type, shape in CELL_SHAPES.items():
+        corners = shape.corners
+        screen = np.column_stack([(corners[:, 0] - corners[:, 1]) * ISO_X * scale,
+                                  -(corners[:, 0] + corners[:, 1]) * ISO_Y * scale - corners[:, 2] * scale])
+        sprites[TYPE_CODES[comp_type]] = [
+            rasterize_line(screen[list(indices)]) if kind == 'line' else rasterize_polygon(screen[list(indices)])
+            for kind, indices, _, _ in shape.faces
+        ]
+    return sprites
+
+
+class _Canvas:
+    """An RGB image with a palette, written through flat pixel indices"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels[:] = hex_rgb(BACKGROUND_COLOR)
+        self.palette: List[Tuple[int, int, int]] = []
+        self.palette_index: Dict[str, int] = {}
+
+    def color(self, color: str) -> int:
+        if color not in self.palette_index:
+            self.palette_index[color] = len(self.palette)
+            self.palette.append(hex_rgb(color))
+        return self.palette_index[color]
+
+    def paint(self, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray, stipples: np.ndarray):
+        """Write pixels in order, later ones over earlier ones; stippled ones only on the stipple pattern"""
+        keep = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        # gray25 is every other pixel of every other row, gray50 a checkerboard
+        keep &= (stipples == 0) | ((stipples == 25) & (xs % 2 == 0) & (ys % 2 == 0)) | \
+                ((stipples == 50) & ((xs + ys) % 2 == 0))
+        indices = (ys[keep] * self.width + xs[keep])[::-1]
+        # NumPy does not say which write wins at a repeated index, so keep only the last write per pixel
+        indices, last = np.unique(indices, return_index=True)
+        flat = self.pixels.reshape(-1, 3)
+        flat[indices] = np.array(self.palette, dtype=np.uint8)[colors[keep][::-1][last]]
+
+    def polygon(self, points: np.ndarray, color: str, stipple: int = 0):
+        sprite = rasterize_polygon(points, (self.width, self.height))
+        colors = np.where(sprite.outline, self.color(OUTLINE_COLOR), self.color(color))
+        stipples = np.where(sprite.outline, 0, stipple)
+        self.paint(sprite.xs, sprite.ys, colors, stipples)
+
+
+def _plate(view: IsoView, floor: Floor, z: float) -> np.ndarray:
+    return np.array(view.project_rect(0, 0, floor.width, floor.height, z)).reshape(4, 2)
+
+
+def render_house(view: IsoView, floors: List[Floor], current_floor_index: int, width: int, height: int,
+                 lod_policy: str = DETAIL_FULL) -> np.ndarray:
+    """Rasterize the isometric preview of floors into a (height, width, 3) uint8 array"""
+    canvas = _Canvas(width, height)
+    sprites = cell_sprites(view.scale)
+    for floor_idx, floor in enumerate(floors):
+        if floor_idx == 0:
+            canvas.polygon(_plate(view, floor, view.floor_z(0)), GROUND_COLOR)
+        detail = floor_detail(lod_policy, floor_idx, current_floor_index)
+        if detail == DETAIL_FULL:
+            _render_floor(canvas, view, floors, floor_idx, floor_idx == current_floor_index, sprites)
+        else:
+            # Reduced floors are a handful of large faces, rasterized one by one
+            faces = reduced_faces(view, floor, floor_idx, detail)
+            for (_, role), coords in zip(faces.styles, faces.coords):
+                canvas.polygon(np.array(coords).reshape(-1, 2), FACE_COLORS[role][1])
+        if floor_idx < len(floors) - 1:
+            canvas.polygon(_plate(view, floor, view.floor_z(floor_idx + 1)), CEILING_COLOR, stipple=50)
+    return canvas.pixels
+
+
+def _render_floor(canvas: _Canvas, view: IsoView, floors: List[Floor], floor_idx: int, is_current_floor: bool,
+                  sprites: Dict[int, List[Sprite]]):
+    xs, ys, type_codes, _ = floors[floor_idx].grid.occupied()
+    xs = xs.astype(np.int64)
+    ys = ys.astype(np.int64)
+    anchor_xs = np.rint(view.offset_x + (xs - ys) * (ISO_X * view.scale)).astype(np.int64)
+    anchor_ys = np.rint(view.offset_y - (xs + ys) * (ISO_Y * view.scale) - view.floor_z(floor_idx)).astype(np.int64)
+
+    # Drop cells whose sprites cannot reach the image
+    all_sprites = [sprite for face_sprites in sprites.values() for sprite in face_sprites]
+    min_x = min(int(sprite.xs.min()) for sprite in all_sprites if len(sprite.xs))
+    max_x = max(int(sprite.xs.max()) for sprite in all_sprites if len(sprite.xs))
+    min_y = min(int(sprite.ys.min()) for sprite in all_sprites if len(sprite.ys))
+    max_y = max(int(sprite.ys.max()) for sprite in all_sprites if len(sprite.ys))
+    on_screen = ((anchor_xs + max_x >= 0) & (anchor_xs + min_x < canvas.width)
+                 & (anchor_ys + max_y >= 0) & (anchor_ys + min_y < canvas.height))
+    on_screen &= np.isin(type_codes, list(sprites))
+    xs, ys, type_codes = xs[on_screen], ys[on_screen], type_codes[on_screen]
+    anchor_xs, anchor_ys = anchor_xs[on_screen], anchor_ys[on_screen]
+    if not len(xs):
+        return
+
+    order = depth_order(xs, ys)
+    xs, ys, type_codes = xs[order], ys[order], type_codes[order]
+    anchor_xs, anchor_ys = anchor_xs[order], anchor_ys[order]
+    sides = visible_sides(view, floors, floor_idx, xs, ys)
+
+    # One group per (type, face, fill or outline): its pixel offsets, colour and stipple
+    groups = []
+    group_keys = {}
+    for type_code, face_sprites in sprites.items():
+        shape = CELL_SHAPES[CODE_TYPES[type_code]]
+        for face_number, (sprite, (_, _, role, _)) in enumerate(zip(face_sprites, shape.faces)):
+            color = canvas.color(FACE_COLORS[role][0 if is_current_floor else 1])
+            stipple = 25 if role == 'window_glass' else 0
+            fill = ~sprite.outline
+            group_keys[(type_code, face_number)] = len(groups)
+            groups.append((sprite.xs[fill], sprite.ys[fill], color, stipple))
+            groups.append((sprite.xs[sprite.outline], sprite.ys[sprite.outline], canvas.color(OUTLINE_COLOR), 0))
+    group_lengths = np.array([len(group[0]) for group in groups], dtype=np.int64)
+    group_starts = np.concatenate([[0], np.cumsum(group_lengths)])
+    group_xs = np.concatenate([group[0] for group in groups]).astype(np.int64)
+    group_ys = np.concatenate([group[1] for group in groups]).astype(np.int64)
+    group_colors = np.array([group[2] for group in groups], dtype=np.int64)
+    group_stipples = np.array([group[3] for group in groups], dtype=np.int64)
+
+    # Stamps in drawing order: cells back to front, each cell's faces in turn, fill before outline
+    stamp_cells = []
+    stamp_groups = []
+    for type_code, face_sprites in sprites.items():
+        cells = np.flatnonzero(type_codes == type_code)
+        for face_number, (_, _, _, side) in enumerate(CELL_SHAPES[CODE_TYPES[type_code]].faces):
+            shown = cells[(sides[cells] & side) != 0]
+            group = group_keys[(type_code, face_number)]
+            stamp_cells.extend([shown, shown])
+            stamp_groups.extend([np.full(len(shown), group), np.full(len(shown), group + 1)])
+    stamp_cells = np.concatenate(stamp_cells)
+    stamp_groups = np.concatenate(stamp_groups)
+    order = np.lexsort((stamp_groups, stamp_cells))
+    stamp_cells, stamp_groups = stamp_cells[order], stamp_groups[order]
+    stamp_lengths = group_lengths[stamp_groups]
+    keep = stamp_lengths > 0
+    stamp_cells, stamp_groups, stamp_lengths = stamp_cells[keep], stamp_groups[keep], stamp_lengths[keep]
+
+    stamp_ends = np.cumsum(stamp_lengths)
+    start = 0
+    while start < len(stamp_cells):
+        # Batch boundaries fall between stamps, so drawing order is kept across batches
+        pixels_before = stamp_ends[start - 1] if start else 0
+        end = max(int(np.searchsorted(stamp_ends, pixels_before + _BATCH_PIXELS, side='right')), start + 1)
+        cells, batch_groups, lengths = stamp_cells[start:end], stamp_groups[start:end], stamp_lengths[start:end]
+        # Position of each pixel within its stamp's sprite
+        offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        sprite_pixels = np.repeat(group_starts[batch_groups], lengths) + offsets
+        canvas.paint(np.repeat(anchor_xs[cells], lengths) + group_xs[sprite_pixels],
+                     np.repeat(anchor_ys[cells], lengths) + group_ys[sprite_pixels],
+                     np.repeat(group_colors[batch_groups], lengths),
+                     np.repeat(group_stipples[batch_groups], lengths))
+        start = end
+
+
+def to_ppm(pixels: np.ndarray) -> bytes:
+    """Encode an (h, w, 3) uint8 image as binary PPM, which Tk's PhotoImage reads directly"""
+    height, width, _ = pixels.shape
+    return f"P6 {width} {height} 255\n".encode('ascii') + np.ascontiguousarray(pixels).tobytes()
@@ -0,0 +1,326 @@
+"""Isometric projection and per-cell geometry for the 3D preview.
+
+Each component type is a fixed set of corners and faces (CELL_SHAPES), so a
+whole floor is projected with a few NumPy operations per type instead of one
+Python call per corner. Faces carry a colour role rather than a colour, so a
+renderer can recolour a floor without re-projecting it.
+
+Cells are drawn back to front (depth_order, or row_order to keep runs
+together), and visible_sides works out which faces can be seen at all from
+the fixed viewpoint, so faces shared between walls and cells hidden behind
+upper floors are never drawn. run_faces draws each run of same-type cells in
+a row as one piece, so a canvas needs a few items per run instead of a few
+per cell.
+
+Floors away from the current one can be drawn at reduced detail
+(floor_detail, reduced_faces): merged wall-run prisms or one footprint block.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from cell_runs import find_runs
+from house_model import CODE_TYPES, COMPONENT_COLORS, TYPE_CODES, ComponentType, Floor
+
+ISO_X = 0.866  # cos(30°)
+ISO_Y = 0.5  # sin(30°)
+
+# Fill colour per face role: (current floor, other floors)
+FACE_COLORS = {
+    'wall': (COMPONENT_COLORS[ComponentType.WALL_PANEL], '#A0826D'),
+    'wall_top': ('#6B3410', '#6B3410'),
+    'door': (COMPONENT_COLORS[ComponentType.DOOR_PANEL], '#806040'),
+    'window_glass': (COMPONENT_COLORS[ComponentType.WINDOW_PANEL], COMPONENT_COLORS[ComponentType.WINDOW_PANEL]),
+    'floor_tile': (COMPONENT_COLORS[ComponentType.FLOOR_PANEL], '#C8B88B'),
+    'tile_line': ('#8B6914', '#8B6914')
+}
+FACE_STIPPLES = {'window_glass': 'gray25'}
+GROUND_COLOR = '#C0C0C0'
+CEILING_COLOR = '#E0E0E0'  # Drawn with a gray50 stipple
+
+
+@dataclass
+class IsoView:
+    scale: float = 20
+    offset_x: float = 200
+    offset_y: float = 400
+    floor_height: float = 3  # Height of each floor in grid units
+
+    def project(self, x, y, z) -> Tuple[float, float]:
+        """Convert 3D coordinates (z in pixels) to 2D isometric projection"""
+        screen_x = self.offset_x + (x - y) * ISO_X * self.scale
+        screen_y = self.offset_y - (x + y) * ISO_Y * self.scale - z
+        return screen_x, screen_y
+
+    def project_rect(self, x, y, width, height, z) -> List[float]:
+        """Project a rectangle in 3D space"""
+        p1 = self.project(x, y, z)
+        p2 = self.project(x + width, y, z)
+        p3 = self.project(x + width, y + height, z)
+        p4 = self.project(x, y + height, z)
+        return [p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]]
+
+    def floor_z(self, floor_index: int) -> float:
+        return floor_index * self.floor_height * self.scale
+
+
+# Sides of a cell a face lies on, as bits of a visibility mask. The camera
+# looks towards +x, +y and down, so only the -x, -y and top sides face it.
+SIDE_FRONT = 1  # The y plane, facing -y
+SIDE_LEFT = 2  # The x plane, facing -x
+SIDE_TOP = 4  # The top of a full-height wall
+SIDE_OTHER = 8  # Faces inside the cell, never shared with a neighbour
+ALL_SIDES = SIDE_FRONT | SIDE_LEFT | SIDE_TOP | SIDE_OTHER
+
+WALL_HEIGHT = 3  # Grid units; walls are solid boxes this tall
+WALL_CODE = TYPE_CODES[ComponentType.WALL_PANEL]
+FLOOR_CODE = TYPE_CODES[ComponentType.FLOOR_PANEL]
+
+
+class CellShape(NamedTuple):
+    corners: np.ndarray  # (m, 3): dx, dy from the cell origin and height in grid units
+    faces: Tuple[Tuple[str, Tuple[int, ...], str, int], ...]  # (kind, corner indices, role, side) in drawing order
+
+
+def _shape(corners, faces) -> CellShape:
+    return CellShape(np.array(corners, dtype=np.float64), tuple(faces))
+
+
+CELL_SHAPES = {
+    ComponentType.WALL_PANEL: _shape(
+        [(0, 0, 0), (1, 0, 0), (1, 0, 3), (0, 0, 3), (0, 1, 0), (1, 1, 3), (0, 1, 3)],
+        [('polygon', (0, 1, 2, 3), 'wall', SIDE_FRONT),  # Front face
+         ('polygon', (4, 0, 3, 6), 'wall', SIDE_LEFT),  # Left face
+         ('polygon', (3, 2, 5, 6), 'wall_top', SIDE_TOP)]),  # Top face
+    # Similar to wall but shorter
+    ComponentType.DOOR_PANEL: _shape(
+        [(0, 0, 0), (1, 0, 0), (1, 0, 2.5), (0, 0, 2.5)],
+        [('polygon', (0, 1, 2, 3), 'door', SIDE_FRONT)]),
+    # Wall with a window hole
+    ComponentType.WINDOW_PANEL: _shape(
+        [(0, 0, 0), (1, 0, 0), (1, 0, 3), (0, 0, 3), (0, 0, 1), (1, 0, 1), (0, 0, 2.5), (1, 0, 2.5)],
+        [('polygon', (0, 1, 5, 4), 'wall', SIDE_FRONT),  # Bottom part
+         ('polygon', (6, 7, 2, 3), 'wall', SIDE_FRONT),  # Top part
+         ('polygon', (4, 5, 7, 6), 'window_glass', SIDE_FRONT)]),
+    ComponentType.FLOOR_PANEL: _shape(
+        [(0, 0, 0.2), (1, 0, 0.2), (1, 1, 0.2), (0, 1, 0.2)],
+        [('polygon', (0, 1, 2, 3), 'floor_tile', SIDE_OTHER),  # Top surface
+         ('line', (0, 2), 'tile_line', SIDE_OTHER),  # Tile pattern
+         ('line', (1, 3), 'tile_line', SIDE_OTHER)])
+}
+
+
+def depth_order(xs, ys) -> np.ndarray:
+    """Indices that sort cells of one floor back to front.
+
+    Cells on the same diagonal (equal x + y) never overlap on screen, so
+    descending x + y is a valid painter's order within a floor; floors are
+    drawn bottom to top.
+    """
+    return np.argsort(-(np.asarray(xs, dtype=np.int64) + np.asarray(ys, dtype=np.int64)), kind='stable')
+
+
+def row_order(xs, ys) -> np.ndarray:
+    """Indices that sort cells of one floor back to front, a row at a time.
+
+    Two cells can only overlap on screen when one is behind the other in both
+    x and y, so descending y and then descending x is a valid painter's order
+    too, and it keeps the cells of each run in a row next to each other.
+    """
+    return np.lexsort((-np.asarray(xs, dtype=np.int64), -np.asarray(ys, dtype=np.int64)))
+
+
+def _is_wall(floor: Floor, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    inside = (xs >= 0) & (xs < floor.width) & (ys >= 0) & (ys < floor.height)
+    walls = np.zeros(len(xs), dtype=bool)
+    if inside.any():
+        type_codes, _ = floor.get_cells(xs[inside], ys[inside])
+        walls[inside] = type_codes == WALL_CODE
+    return walls
+
+
+def visible_sides(view: IsoView, floors: List[Floor], floor_index: int, xs, ys) -> np.ndarray:
+    """SIDE_* mask of the sides of each cell that can be seen; 0 for cells hidden entirely.
+
+    A side is hidden when a wall shares it: the wall in front (y - 1), to the
+    left (x - 1) or directly above. A whole cell is hidden behind a wall k
+    floors up at (x - k * floor_height, y - k * floor_height), whose outline
+    projects exactly onto the cell's when walls are one storey tall.
+    """
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    floor = floors[floor_index]
+    sides = np.full(len(xs), ALL_SIDES, dtype=np.uint8)
+    sides[_is_wall(floor, xs, ys - 1)] &= ALL_SIDES & ~SIDE_FRONT
+    sides[_is_wall(floor, xs - 1, ys)] &= ALL_SIDES & ~SIDE_LEFT
+    if floor_index + 1 < len(floors):
+        sides[_is_wall(floors[floor_index + 1], xs, ys)] &= ALL_SIDES & ~SIDE_TOP
+
+    if view.floor_height == WALL_HEIGHT:
+        for k in range(1, len(floors) - floor_index):
+            offset = k * WALL_HEIGHT
+            sides[_is_wall(floors[floor_index + k], xs - offset, ys - offset)] = 0
+    return sides
+
+
+def affected_cells(view: IsoView, floor_count: int, floor_index: int,
+                   xs, ys) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Cells, by floor index, whose visible sides can change when the given cells change"""
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    cells = {floor_index: (np.concatenate([xs, xs + 1, xs]), np.concatenate([ys, ys, ys + 1]))}
+    if floor_index > 0:
+        cells[floor_index - 1] = (xs, ys)
+    if view.floor_height == WALL_HEIGHT:
+        for k in range(1, floor_index + 1):
+            below_xs, below_ys = cells.get(floor_index - k, (xs[:0], ys[:0]))
+            offset = k * WALL_HEIGHT
+            cells[floor_index - k] = (np.concatenate([below_xs, xs + offset]), np.concatenate([below_ys, ys + offset]))
+    return cells
+
+
+def project_points(view: IsoView, xs, ys, heights, z_base: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Screen x and y of many points in one NumPy pass; heights in grid units above z_base (pixels)"""
+    screen_x = view.offset_x + (xs - ys) * (ISO_X * view.scale)
+    screen_y = view.offset_y - (xs + ys) * (ISO_Y * view.scale) - z_base - heights * view.scale
+    return screen_x, screen_y
+
+
+class FloorFaces(NamedTuple):
+    """Faces of many cells in drawing order, as parallel sequences"""
+    cells: np.ndarray  # Input index of the cell each face belongs to
+    styles: List[Tuple[str, str]]  # (kind, role) of each face
+    coords: List[List[float]]
+
+
+def run_faces(view: IsoView, floor_index: int, xs, ys, type_codes, sides=None) -> FloorFaces:
+    """Faces of cells in row_order, with the cells of each run in a row drawn as one piece.
+
+    A face that spans the cell along x (the front and top of a wall, a window's
+    parts, a floor tile) is drawn once across the run if it shows on any of its
+    cells, and the tile lines of a run become two zigzag lines. Faces across
+    the cell (the left side of a wall) are still one per cell where they show.
+    Faces come back in drawing order; cells gives the first cell of each face.
+    """
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    type_codes = np.asarray(type_codes)
+    if sides is None:
+        sides = np.full(len(type_codes), ALL_SIDES, dtype=np.uint8)
+    z_base = view.floor_z(floor_index)
+    # Whether each cell continues the run of the cell drawn before it
+    follows = np.zeros(len(xs), dtype=bool)
+    follows[1:] = (ys[1:] == ys[:-1]) & (xs[1:] == xs[:-1] - 1) & (type_codes[1:] == type_codes[:-1])
+
+    keys = []  # First cell index * 8 + face number, giving the drawing order
+    styles = []
+    coords = []
+    for type_code in np.unique(type_codes).tolist():
+        shape = CELL_SHAPES.get(CODE_TYPES[type_code])
+        if shape is None:
+            continue
+        cells = np.flatnonzero(type_codes == type_code)
+        run_starts = np.flatnonzero(~follows[cells])
+        first, last = cells[run_starts], cells[np.append(run_starts[1:], len(cells)) - 1]
+        for face_number, (kind, corner_indices, role, side) in enumerate(shape.faces):
+            corners = shape.corners[list(corner_indices)]
+            shown = (sides[cells] & side) != 0
+            along = set(corners[:, 0].tolist()) == {0.0, 1.0}
+            if along:
+                # The face is drawn across the whole run if any of it shows: where it is culled,
+                # whatever hides it is drawn later anyway
+                runs = np.flatnonzero(np.logical_or.reduceat(shown, run_starts)) if len(cells) else run_starts
+                starts, ends = first[runs], last[runs]
+            else:
+                starts = ends = cells[shown]
+            x0 = xs[ends].astype(np.float64)  # Cells run right to left
+            lengths = xs[starts] - xs[ends] + 1
+
+            if kind == 'line' and along:
+                # Cell k of a run takes this line when k is even and its mirror image when odd
+                counts = lengths + 1
+                run = np.repeat(np.arange(len(starts)), counts)
+                ks = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                at_left, at_right = corners[corners[:, 0] == 0][0], corners[corners[:, 0] == 1][0]
+                points = np.empty((len(ks), 2))
+                points[:, 0], points[:, 1] = project_points(
+                    view, x0[run] + ks, ys[starts][run] + np.where(ks % 2 == 0, at_left[1], at_right[1]),
+                    np.where(ks % 2 == 0, at_left[2], at_right[2]), z_base)
+                face_coords = [part.ravel().tolist() for part in np.split(points, np.cumsum(counts)[:-1])]
+            else:
+                face = np.empty((len(starts), 2 * len(corners)))
+                face[:, 0::2], face[:, 1::2] = project_points(
+                    view, x0[:, None] + corners[:, 0] * lengths[:, None], ys[starts][:, None] + corners[:, 1],
+                    corners[:, 2], z_base)
+                face_coords = face.tolist()
+            keys.append(starts * 8 + face_number)
+            styles.extend([(kind, role)] * len(starts))
+            coords.extend(face_coords)
+
+    if not coords:
+        return FloorFaces(np.empty(0, dtype=np.int64), [], [])
+    keys = np.concatenate(keys)
+    order = np.argsort(keys, kind='stable')
+    order_list = order.tolist()
+    return FloorFaces(keys[order] // 8, [styles[i] for i in order_list], [coords[i] for i in order_list])
+
+
+# Level-of-detail policies for floors more than one storey from the current floor
+DETAIL_FULL = 'full'  # Every cell as it is
+DETAIL_RUNS = 'runs'  # Walls, doors and windows merged into solid wall-run prisms, floor tiles left out
+DETAIL_FOOTPRINT = 'footprint'  # One block over the floor's occupied area
+DETAIL_POLICIES = (DETAIL_FULL, DETAIL_RUNS, DETAIL_FOOTPRINT)
+
+
+def floor_detail(policy: str, floor_index: int, current_floor_index: int) -> str:
+    """Detail to draw a floor at: full next to the current floor, the policy's elsewhere"""
+    if abs(floor_index - current_floor_index) <= 1:
+        return DETAIL_FULL
+    return policy
+
+
+def box_faces(view: IsoView, floor_index: int, xs, ys, widths, depths) -> FloorFaces:
+    """Front, left and top faces of wall-height boxes, in drawing order.
+
+    Boxes are drawn by descending x + y of their far corner, which for one
+    cell boxes is the same order as depth_order.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    far_xs = xs + np.asarray(widths)
+    far_ys = ys + np.asarray(depths)
+    order = np.argsort(-(far_xs + far_ys), kind='stable')
+    xs, ys, far_xs, far_ys = xs[order], ys[order], far_xs[order], far_ys[order]
+    bottom = np.zeros(len(xs))
+    top = np.full(len(xs), WALL_HEIGHT, dtype=np.float64)
+
+    faces = [
+        ((xs, ys, bottom), (far_xs, ys, bottom), (far_xs, ys, top), (xs, ys, top)),  # Front
+        ((xs, far_ys, bottom), (xs, ys, bottom), (xs, ys, top), (xs, far_ys, top)),  # Left
+        ((xs, ys, top), (far_xs, ys, top), (far_xs, far_ys, top), (xs, far_ys, top))  # Top
+    ]
+    z_base = view.floor_z(floor_index)
+    coords = np.empty((len(xs), len(faces), 8))
+    for face_number, corners in enumerate(faces):
+        for corner_number, (corner_xs, corner_ys, corner_zs) in enumerate(corners):
+            coords[:, face_number, 2 * corner_number] = view.offset_x + (corner_xs - corner_ys) * (ISO_X * view.scale)
+            coords[:, face_number, 2 * corner_number + 1] = (view.offset_y - z_base - corner_zs * view.scale
+                                                              - (corner_xs + corner_ys) * (ISO_Y * view.scale))
+    styles = [('polygon', 'wall'), ('polygon', 'wall'), ('polygon', 'wall_top')] * len(xs)
+    return FloorFaces(np.repeat(order, len(faces)), styles, coords.reshape(-1, 8).tolist())
+
+
+def reduced_faces(view: IsoView, floor: Floor, floor_index: int, detail: str) -> FloorFaces:
+    """Faces of a floor drawn at DETAIL_RUNS or DETAIL_FOOTPRINT"""
+    xs, ys, type_codes, _ = floor.grid.occupied()
+    if detail == DETAIL_FOOTPRINT:
+        if not len(xs):
+            return FloorFaces(np.empty(0, dtype=np.int64), [], [])
+        return box_faces(view, floor_index, [xs.min()], [ys.min()], [xs.max() - xs.min() + 1],
+                         [ys.max() - ys.min() + 1])
+
+    # Doors and windows merge with the walls around them into one solid run
+    structural = type_codes != FLOOR_CODE
+    runs = find_runs(xs[structural], ys[structural], np.zeros(int(structural.sum()), dtype=np.uint8))
+    return box_faces(view, floor_index, runs.xs, runs.ys, runs.widths(), runs.depths())
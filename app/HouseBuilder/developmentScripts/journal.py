@@ -0,0 +1,235 @@
+"""Crash-safe autosave: an append-only edit journal plus periodic snapshots.
+
+Every edit is appended as one JSON line to ``<project>.journal``. After
+``compact_every`` entries the current house is packed on the calling thread
+and written to ``<project>.autosave.hbp`` on a background thread; entries the
+snapshot covers are then dropped from the journal. Recovery loads the newest
+snapshot (or the saved project, or an empty house) and replays the journal
+entries written after it. A torn last line from a crash is ignored.
+
+Untitled sessions journal to ``~/.house_builder/untitled``. Each session
+holds an OS lock on ``<base>.lock`` while it journals; a second session on
+the same project or untitled base journals to ``<base>-2`` (and so on)
+instead of overwriting the first one's entries.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+import project_io
+from house_model import Floor, House
+
+UNTITLED_BASE = os.path.join(os.path.expanduser("~"), ".house_builder", "untitled")
+
+
+class ProjectJournal:
+    def __init__(self, project_path: Optional[str] = None, compact_every: int = 500, sync_interval: float = 1.0):
+        self.project_path = project_path
+        base, self.lock_file = _claim_base(project_path or UNTITLED_BASE)
+        self.lock_path = base + ".lock"
+        self.journal_path = base + ".journal"
+        self.snapshot_path = base + ".autosave.hbp"
+        self.compact_every = compact_every
+        self.sync_interval = sync_interval  # Seconds between fsyncs of the journal
+
+        self.house: Optional[House] = None
+        self.file = None
+        self.seq = 0  # Sequence number of the last entry written
+        self.entries_since_snapshot = 0
+        self.last_sync = 0.0
+        self.lock = threading.Lock()
+        self.compaction: Optional[threading.Thread] = None
+
+    def has_unsaved_changes(self) -> bool:
+        """Whether a previous session left journal entries or an autosave snapshot behind"""
+        # Right after a compaction the journal is empty and the edits are only in the snapshot
+        return os.path.exists(self.snapshot_path) or (os.path.exists(self.journal_path)
+                                                       and os.path.getsize(self.journal_path) > 0)
+
+    def _snapshot_seq(self) -> int:
+        """Sequence number of the last entry the autosave snapshot covers"""
+        return project_io.read_binary_header(self.snapshot_path).get('metadata', {}).get('journal_seq', 0)
+
+    def recover(self) -> House:
+        """Rebuild the house from the last snapshot (or saved project) plus the journal tail"""
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            house = project_io.load_project(self.snapshot_path)
+            snapshot_seq = self._snapshot_seq()
+        elif self.project_path and os.path.exists(self.project_path):
+            house = project_io.load_project(self.project_path)
+        else:
+            house = House()
+
+        for entry in self._read_entries():
+            if entry['seq'] > snapshot_seq:
+                _replay(house, entry)
+        house.current_floor_index = min(house.current_floor_index, len(house.floors) - 1)
+        return house
+
+    def start(self, house: House, resume: bool = False):
+        """Begin journaling edits to house; resume keeps the existing journal (after recover())"""
+        self._close_file()
+        self.house = house
+        self.seq = 0
+        if resume:
+            entries = self._read_entries()
+            self.seq = entries[-1]['seq'] if entries else 0
+            if os.path.exists(self.snapshot_path):
+                # Continue after the snapshot even when the journal is empty, or recovery would skip new entries
+                self.seq = max(self.seq, self._snapshot_seq())
+        else:
+            self.discard()
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+        self.file = open(self.journal_path, 'a')
+        self.entries_since_snapshot = 0
+
+    def discard(self):
+        """Delete the journal and autosave snapshot"""
+        with self.lock:
+            for path in (self.journal_path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        """Stop journaling and let other sessions use this journal"""
+        self._close_file()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass  # Another session has it open
+
+    def _close_file(self):
+        if self.compaction is not None:
+            self.compaction.join()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def record_cells(self, floor_index: int, xs, ys, type_codes, rotation_codes):
+        count = len(xs)
+        self._append({
+            'op': 'cells',
+            'floor': floor_index,
+            'x': np.asarray(xs).tolist(),
+            'y': np.asarray(ys).tolist(),
+            'type': np.broadcast_to(type_codes, count).tolist(),
+            'rotation': np.broadcast_to(rotation_codes, count).tolist()
+        })
+
+    def record_floor_added(self, floor: Floor, copy_of: Optional[int] = None):
+        entry = {'op': 'add_floor', 'width': floor.width, 'height': floor.height}
+        if copy_of is not None:
+            entry['copy_of'] = copy_of
+        self._append(entry)
+
+    def record_floor_removed(self, floor_index: int):
+        self._append({'op': 'remove_floor', 'floor': floor_index})
+
+    def _append(self, entry: dict):
+        if self.file is None:
+            return
+        self.seq += 1
+        entry['seq'] = self.seq
+        with self.lock:
+            self.file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+            self.file.flush()
+            if time.monotonic() - self.last_sync >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.last_sync = time.monotonic()
+
+        self.entries_since_snapshot += 1
+        if self.entries_since_snapshot >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Snapshot the house in the background and drop the journal entries it covers"""
+        if self.house is None or (self.compaction is not None and self.compaction.is_alive()):
+            return
+        # Packing copies the cells, so editing can continue while the snapshot is written
+        header, blobs = project_io.pack_house(self.house, {'journal_seq': self.seq})
+        self.entries_since_snapshot = 0
+        self.compaction = threading.Thread(target=self._write_snapshot, args=(header, blobs, self.seq),
+                                           daemon=True)
+        self.compaction.start()
+
+    def _write_snapshot(self, header: dict, blobs, snapshot_seq: int):
+        project_io.write_packed(self.snapshot_path, header, blobs)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            tail = [entry for entry in self._read_entries() if entry['seq'] > snapshot_seq]
+            temp_path = self.journal_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                for entry in tail:
+                    f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.journal_path)
+            self.file = open(self.journal_path, 'a')
+
+    def _read_entries(self):
+        entries = []
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Torn write at the end of the journal
+        return entries
+
+
+def _lock(path: str) -> Optional[IO]:
+    """The lock file at path, open and locked by this process, or None if another session holds it"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    f = open(path, 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _claim_base(base: str):
+    """(base path, held lock file) of the first of base, base-2, base-3, ... no other session is journaling to"""
+    for number in itertools.count(1):
+        candidate = base if number == 1 else f"{base}-{number}"
+        lock_file = _lock(candidate + ".lock")
+        if lock_file is not None:
+            return candidate, lock_file
+
+
+def _replay(house: House, entry: dict):
+    op = entry['op']
+    if op == 'cells':
+        house.floors[entry['floor']].set_cells(entry['x'], entry['y'], entry['type'], entry['rotation'])
+    elif op == 'add_floor' and 'copy_of' in entry:
+        house.add_floor(copy_of=entry['copy_of'])
+    elif op == 'add_floor':
+        house.append_floor(Floor(len(house.floors), entry['width'], entry['height']))
+    elif op == 'remove_floor':
+        house.remove_floor(entry['floor'])
+    else:
+        raise ValueError(f"Unknown journal entry: {op}")
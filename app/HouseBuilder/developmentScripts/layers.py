@@ -1,121 +1,111 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import json
-import math
-from enum import Enum
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Tuple, Optional
-
-
-# Component types
-class ComponentType(Enum):
-    WALL_PANEL = "wall_panel"
-    DOOR_PANEL = "door_panel"
-    WINDOW_PANEL = "window_panel"
-    FLOOR_PANEL = "floor_panel"
-    EMPTY = "empty"
-
-
-# Component colors for visualization
-COMPONENT_COLORS = {
-    ComponentType.WALL_PANEL: "#8B4513",
-    ComponentType.DOOR_PANEL: "#654321",
-    ComponentType.WINDOW_PANEL: "#87CEEB",
-    ComponentType.FLOOR_PANEL: "#D2691E",
-    ComponentType.EMPTY: "#F0F0F0"
-}
-
-
-@dataclass
-class Component:
-    type: ComponentType
-    x: int
-    y: int
-    rotation: int = 0  # 0, 90, 180, 270 degrees
-
-    def to_dict(self):
-        return {
-            'type': self.type.value,
-            'x': self.x,
-            'y': self.y,
-            'rotation': self.rotation
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            type=ComponentType(data['type']),
-            x=data['x'],
-            y=data['y'],
-            rotation=data.get('rotation', 0)
-        )
-
-
-class Floor:
-    def __init__(self, floor_number: int, width: int = 10, height: int = 10):
-        self.floor_number = floor_number
-        self.width = width
-        self.height = height
-        self.components: Dict[Tuple[int, int], Component] = {}
-
-    def add_component(self, component: Component):
-        self.components[(component.x, component.y)] = component
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bulk_edit import Clipboard, EditTransaction
+from cell_runs import find_runs
+from export_pipeline import ExportPipeline
+from history import EditHistory, EditStep, unpack_cells
+from journal import ProjectJournal
+from house_model import ComponentType, COMPONENT_COLORS, TYPE_CODES, Component, Floor, House, line_cells
+from iso_raster import render_house, to_ppm
+from isometric import (CEILING_COLOR, DETAIL_FULL, DETAIL_POLICIES, DETAIL_RUNS, FACE_COLORS, FACE_STIPPLES,
+                       GROUND_COLOR, IsoView, affected_cells, floor_detail, reduced_faces, row_order, run_faces,
+                       visible_sides)
+from manufacturing import FloorSummaries
+from model_events import CellsChanged
+from toolpath import format_report
+import project_io
+
+
+class RenderScheduler:
+    """Coalesces grid edits into at most one 2D and one 3D update per frame"""
+
+    def __init__(self, widget, flush_cells, flush_preview, frame_ms: int = 16):
+        self.widget = widget
+        self.flush_cells = flush_cells  # Called with the set of dirty (x, y) cells
+        self.flush_preview = flush_preview  # Called with {floor: dirty cells}
+        self.frame_ms = frame_ms
+        self.dirty_cells = set()
+        self.preview_cells = {}
+        self.preview_dirty = False
+        self.pending = None
+        self.last_flush = 0.0
+
+    def mark_cells(self, floor: Floor, cells):
+        """Cells of the floor shown in the plan changed"""
+        cells = list(cells)
+        self.dirty_cells.update(cells)
+        self.mark_preview(floor, cells)
+
+    def mark_preview(self, floor: Optional[Floor] = None, cells=None):
+        """Re-project cells of a floor in the preview; with no cells, just re-sync its floors"""
+        if floor is not None and cells is not None:
+            self.preview_cells.setdefault(floor, set()).update(cells)
+        self.preview_dirty = True
+        self.schedule()
+
+    def schedule(self):
+        if self.pending is not None:
+            return
+        elapsed_ms = (time.perf_counter() - self.last_flush) * 1000
+        if elapsed_ms >= self.frame_ms:
+            self.pending = self.widget.after_idle(self.flush)
+        else:
+            # Too soon after the last frame, wait out the rest of the budget
+            self.pending = self.widget.after(int(self.frame_ms - elapsed_ms) + 1, self.flush)
 
-    def remove_component(self, x: int, y: int):
-        if (x, y) in self.components:
-            del self.components[(x, y)]
+    def flush(self):
+        self.pending = None
+        self.last_flush = time.perf_counter()
+        cells, self.dirty_cells = self.dirty_cells, set()
+        if cells:
+            self.flush_cells(cells)
+        if self.preview_dirty:
+            self.preview_dirty = False
+            preview_cells, self.preview_cells = self.preview_cells, {}
+            self.flush_preview(preview_cells)
 
-    def get_component(self, x: int, y: int) -> Optional[Component]:
-        return self.components.get((x, y))
 
-    def to_dict(self):
-        return {
-            'floor_number': self.floor_number,
-            'width': self.width,
-            'height': self.height,
-            'components': [comp.to_dict() for comp in self.components.values()]
-        }
+def _find_sorted(sorted_keys: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(positions, found) of keys in a sorted array"""
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), max(len(sorted_keys) - 1, 0))
+    found = sorted_keys[positions] == keys if len(sorted_keys) else np.zeros(len(keys), dtype=bool)
+    return positions, found
 
-    @classmethod
-    def from_dict(cls, data):
-        floor = cls(data['floor_number'], data['width'], data['height'])
-        for comp_data in data['components']:
-            comp = Component.from_dict(comp_data)
-            floor.add_component(comp)
-        return floor
 
+class LevelItems:
+    """Canvas items of one preview level, by row"""
 
-class House:
     def __init__(self):
-        self.floors: List[Floor] = [Floor(0)]  # Start with ground floor
-        self.current_floor_index = 0
-
-    def add_floor(self):
-        new_floor_number = len(self.floors)
-        self.floors.append(Floor(new_floor_number))
-
-    def remove_floor(self, index: int):
-        if len(self.floors) > 1 and 0 <= index < len(self.floors):
-            self.floors.pop(index)
-            # Renumber floors
-            for i, floor in enumerate(self.floors):
-                floor.floor_number = i
-
-    def get_current_floor(self) -> Floor:
-        return self.floors[self.current_floor_index]
-
-    def to_dict(self):
-        return {
-            'floors': [floor.to_dict() for floor in self.floors],
-            'current_floor_index': self.current_floor_index
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        house = cls()
-        house.floors = [Floor.from_dict(floor_data) for floor_data in data['floors']]
-        house.current_floor_index = data['current_floor_index']
-        return house
+        self.rows: Dict[int, Tuple[List[int], np.ndarray, np.ndarray]] = {}  # y -> (item ids, xs, sides)
+
+    def replace(self, y: int, item_ids: List[int], xs: np.ndarray, sides: np.ndarray) -> List[int]:
+        """Record a row's new items and the cells (ascending x) and visible sides they were drawn with.
+
+        Returns the items they replace.
+        """
+        old = self.rows.pop(y, None)
+        if len(xs):
+            self.rows[y] = (item_ids, xs, sides)
+        return old[0] if old is not None else []
+
+    def drawn_sides(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """The visible-sides mask each cell is currently drawn with (0 if not drawn)"""
+        result = np.zeros(len(xs), dtype=np.uint8)
+        order = np.argsort(ys, kind='stable')
+        row_ys, row_starts = np.unique(ys[order], return_index=True)
+        for y, cells in zip(row_ys.tolist(), np.split(order, row_starts[1:])):
+            if y in self.rows:
+                _, row_xs, row_sides = self.rows[y]
+                positions, found = _find_sorted(row_xs, xs[cells])
+                result[cells[found]] = row_sides[positions[found]]
+        return result
 
 
 class HouseBuilderApp:
@@ -129,15 +119,43 @@ class HouseBuilderApp:
 
         # Initialize house
         self.house = House()
+        self.floor_summaries = FloorSummaries(self.house)  # Per-floor counts for the status bar and exports
+        self.export_pipeline = ExportPipeline()  # Remembers what was exported, to skip unchanged files
         self.selected_component_type = ComponentType.WALL_PANEL
         self.grid_size = 40  # Pixels per grid unit
         self.panel_size = 8  # 8x8 panels
+        self.grid_lines_size = None  # (width, height) the grid lines were drawn for
+        self.view_chunk_size = 32  # Cells per side of a viewport culling chunk
+        self.drawn_chunks = set()  # Chunks of the floor plan currently on the canvas
+        self.viewport_pending = None
+        self.stroke_cell = None  # Last cell visited by the current drag stroke
+        self.tool_anchor = None  # Cell where a rectangle, line or selection drag started
+        self.selection: Optional[Tuple[int, int, int, int]] = None  # (x0, y0, x1, y1) of the selected cells
+        self.clipboard: Optional[Clipboard] = None
+        self.iso_view = IsoView()
+        self.preview_floors: List[Tuple[Floor, int, int]] = []  # (floor, width, height) per drawn preview level
+        self.preview_details: List[str] = []  # Level of detail (DETAIL_*) each preview level was drawn at
+        self.iso_items: List[Optional[LevelItems]] = []  # Canvas items per row, per full-detail level
+        self.iso_row_markers: List[List[int]] = []  # Hidden item closing each row, per drawn level
+        self.preview_highlight = None  # Floor index drawn in the current-floor colours
+        # Above this many components the preview is rasterized into one image instead of canvas items
+        self.raster_preview_threshold = 20000
+        self.raster_image: Optional[tk.PhotoImage] = None
+        self.history = EditHistory(max_bytes=64 * 1024 * 1024)
+        self.journal = ProjectJournal()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Create UI
         self.setup_ui()
+        # After the UI, so the recovery prompt has a main window to sit over
+        self.open_journal()
         self.update_floor_view()
         self.update_3d_preview()
 
+        # From here on the views follow the house through its change events
+        self.house.events.subscribe(self.on_house_changed)
+        self.update_house_stats()
+
     def setup_theme(self):
         """Configure ttk theme to use native desktop style"""
         style = ttk.Style()
@@ -193,6 +211,8 @@ class HouseBuilderApp:
 
         ttk.Button(floor_btn_frame, text="Add Floor", command=self.add_floor).pack(side=tk.LEFT, padx=2)
         ttk.Button(floor_btn_frame, text="Remove Floor", command=self.remove_floor).pack(side=tk.LEFT, padx=2)
+        ttk.Button(floor_frame, text="Duplicate Floor", command=self.duplicate_floor).pack(fill=tk.X, padx=5,
+                                                                                          pady=(0, 5))
 
         # Component palette
         component_frame = ttk.LabelFrame(left_panel, text="Components")
@@ -214,8 +234,17 @@ class HouseBuilderApp:
         tools_frame = ttk.LabelFrame(left_panel, text="Tools")
         tools_frame.pack(fill=tk.X, pady=(0, 10))
 
+        self.tool_var = tk.StringVar(value="paint")
+        for tool, label in (("paint", "Paint"), ("rectangle", "Rectangle"), ("line", "Line"),
+                            ("flood_fill", "Flood Fill"), ("select", "Select Region"), ("paste", "Paste")):
+            ttk.Radiobutton(tools_frame, text=label, value=tool, variable=self.tool_var).pack(anchor=tk.W, padx=5,
+                                                                                             pady=2)
+        ttk.Button(tools_frame, text="Copy Selection", command=self.copy_selection).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(tools_frame, text="Copy Floor To...", command=self.copy_floor_to).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(tools_frame, text="Clear Floor", command=self.clear_floor).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(tools_frame, text="Fill Walls", command=self.fill_walls).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(tools_frame, text="Undo", command=self.undo).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(tools_frame, text="Redo", command=self.redo).pack(fill=tk.X, padx=5, pady=2)
 
         # File operations
         file_frame = ttk.LabelFrame(left_panel, text="File Operations")
@@ -226,6 +255,9 @@ class HouseBuilderApp:
         ttk.Button(file_frame, text="Export to Manufacturing", command=self.export_to_manufacturing).pack(fill=tk.X,
                                                                                                           padx=5,
                                                                                                           pady=2)
+        self.gcode_subprograms_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="G-code subprograms for repeated panels",
+                        variable=self.gcode_subprograms_var).pack(anchor=tk.W, padx=5, pady=2)
 
         # Middle panel - 2D Grid View
         middle_panel = ttk.Frame(main_container)
@@ -242,17 +274,23 @@ class HouseBuilderApp:
         self.grid_canvas.pack(fill=tk.BOTH, expand=True)
 
         # Scrollbars
-        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.grid_canvas.xview)
+        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.on_xscroll)
         h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
-        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.grid_canvas.yview)
+        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.on_yscroll)
         v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         self.grid_canvas.configure(xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
+        self.render_scheduler = RenderScheduler(self.grid_canvas, self.update_floor_cells, self.update_3d_preview)
 
         # Bind mouse events
         self.grid_canvas.bind("<Button-1>", self.on_grid_click)
         self.grid_canvas.bind("<B1-Motion>", self.on_grid_drag)
+        self.grid_canvas.bind("<ButtonRelease-1>", self.on_grid_release)
         self.grid_canvas.bind("<Button-3>", self.on_grid_right_click)
+        self.grid_canvas.bind("<Configure>", self.schedule_viewport_refresh)
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
+        self.root.bind("<Control-Z>", lambda event: self.redo())
 
         # Right panel - 3D Preview
         right_panel = ttk.Frame(main_container, width=400)
@@ -265,11 +303,26 @@ class HouseBuilderApp:
         self.preview_canvas = tk.Canvas(right_panel, bg='#E0E0E0', width=380, height=600)
         self.preview_canvas.pack(padx=10, pady=10)
 
+        # Level of detail for floors more than one storey from the current floor
+        lod_frame = ttk.Frame(right_panel)
+        lod_frame.pack(fill=tk.X, padx=10)
+        ttk.Label(lod_frame, text="Other floors:").pack(side=tk.LEFT)
+        self.preview_lod_var = tk.StringVar(value=DETAIL_RUNS)
+        lod_combo = ttk.Combobox(lod_frame, textvariable=self.preview_lod_var, values=DETAIL_POLICIES,
+                                 state="readonly")
+        lod_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        lod_combo.bind("<<ComboboxSelected>>", self.on_preview_lod_changed)
+
         # Status bar
         
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.stats_var = tk.StringVar()
+        stats_label = ttk.Label(status_frame, textvariable=self.stats_var, relief=tk.SUNKEN)
+        stats_label.pack(side=tk.RIGHT)
         self.status_var = tk.StringVar(value="Ready")
-        status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
     def select_component(self, component_type: ComponentType):
         self.selected_component_type = component_type
@@ -280,6 +333,38 @@ class HouseBuilderApp:
         self.floor_combo['values'] = floor_names
         self.floor_var.set(f"Floor {self.house.current_floor_index}")
 
+    def on_house_changed(self, events):
+        """Update the plan, the preview and the status bar for what an edit actually changed"""
+        current_floor = self.house.get_current_floor()
+        structural = any(not isinstance(event, CellsChanged) for event in events)
+        for event in events:
+            if not isinstance(event, CellsChanged) or not any(floor is event.floor for floor in self.house.floors):
+                continue
+            if event.floor is not current_floor or structural:
+                self.render_scheduler.mark_preview(event.floor, zip(event.xs.tolist(), event.ys.tolist()))
+            elif len(event.xs) > self.view_chunk_size ** 2:
+                # Cheaper to redraw the chunks on screen than to update cell by cell
+                self.update_floor_view()
+                self.render_scheduler.mark_preview(event.floor, zip(event.xs.tolist(), event.ys.tolist()))
+            else:
+                self.render_scheduler.mark_cells(event.floor, zip(event.xs.tolist(), event.ys.tolist()))
+
+        if structural:
+            # Floors were added, removed or replaced: the floor list and plan start over
+            self.update_floor_list()
+            self.update_floor_view()
+            self.update_3d_preview()
+        self.update_house_stats()
+
+    def update_house_stats(self):
+        self.stats_var.set(f"{len(self.house.floors)} floors, {self.floor_summaries.component_total()} components")
+
+    def replace_house(self, house: House):
+        """Take over the floors of a loaded or recovered house, keeping self.house and its subscribers"""
+        with self.house.events.batch():
+            self.house.current_floor_index = house.current_floor_index
+            self.house.floors = house.floors
+
     def on_floor_changed(self, event):
         index = self.floor_combo.current()
         self.house.current_floor_index = index
@@ -287,64 +372,213 @@ class HouseBuilderApp:
         self.update_3d_preview()
 
     def add_floor(self):
-        self.house.add_floor()
-        self.update_floor_list()
-        self.house.current_floor_index = len(self.house.floors) - 1
-        self.floor_combo.current(self.house.current_floor_index)
-        self.update_floor_view()
-        self.update_3d_preview()
+        with self.house.events.batch():
+            self.house.add_floor()
+            self.house.current_floor_index = len(self.house.floors) - 1
+        self.journal.record_floor_added(self.house.floors[-1])
         self.status_var.set(f"Added Floor {self.house.current_floor_index}")
 
+    def duplicate_floor(self):
+        """Add a copy of the current floor on top; it shares the current floor's cells until either is edited"""
+        source = self.house.current_floor_index
+        with self.house.events.batch():
+            self.house.add_floor(copy_of=source)
+            self.house.current_floor_index = len(self.house.floors) - 1
+        self.journal.record_floor_added(self.house.floors[-1], copy_of=source)
+        self.status_var.set(f"Duplicated Floor {source} as Floor {self.house.current_floor_index}")
+
     def remove_floor(self):
         if len(self.house.floors) > 1:
+            self.journal.record_floor_removed(self.house.current_floor_index)
             self.house.remove_floor(self.house.current_floor_index)
-            self.house.current_floor_index = min(self.house.current_floor_index, len(self.house.floors) - 1)
-            self.update_floor_list()
-            self.update_floor_view()
-            self.update_3d_preview()
             self.status_var.set("Removed floor")
         else:
             messagebox.showwarning("Cannot Remove", "Must have at least one floor")
 
     def clear_floor(self):
-        floor = self.house.get_current_floor()
-        floor.components.clear()
-        self.update_floor_view()
-        self.update_3d_preview()
+        with self.edit_transaction("Clear Floor") as edit:
+            edit.clear_floor(self.house.get_current_floor())
         self.status_var.set("Cleared floor")
 
     def fill_walls(self):
         floor = self.house.get_current_floor()
         # Fill perimeter with walls
-        for x in range(floor.width):
-            floor.add_component(Component(ComponentType.WALL_PANEL, x, 0))
-            floor.add_component(Component(ComponentType.WALL_PANEL, x, floor.height - 1))
-        for y in range(1, floor.height - 1):
-            floor.add_component(Component(ComponentType.WALL_PANEL, 0, y))
-            floor.add_component(Component(ComponentType.WALL_PANEL, floor.width - 1, y))
-        self.update_floor_view()
-        self.update_3d_preview()
+        with self.edit_transaction("Fill Walls") as edit:
+            edit.fill_rect(floor, 0, 0, floor.width, floor.height, ComponentType.WALL_PANEL, outline=True)
         self.status_var.set("Added perimeter walls")
 
+    @contextmanager
+    def edit_transaction(self, label: str):
+        """Collect bulk edits, then apply them as one undo step with one journal entry per floor and one redraw"""
+        edit = EditTransaction(self.house, write=self.set_cells)
+        yield edit
+        self.history.begin_step(label)
+        with self.house.events.batch():
+            edit.commit()
+        self.history.end_step()
+
+    def set_cells(self, floor: Floor, xs, ys, type_codes, rotation_codes):
+        """Apply a cell edit through the undo history and the autosave journal"""
+        self.history.set_cells(floor, xs, ys, type_codes, rotation_codes)
+        self.journal.record_cells(self.house.floors.index(floor), xs, ys, type_codes, rotation_codes)
+
+    def undo(self):
+        with self.house.events.batch():
+            step = self.history.undo(self.house)
+        if step:
+            self.after_history_step(step, undone=True)
+            self.status_var.set(f"Undid {step.label}")
+
+    def redo(self):
+        with self.house.events.batch():
+            step = self.history.redo(self.house)
+        if step:
+            self.after_history_step(step, undone=False)
+            self.status_var.set(f"Redid {step.label}")
+
+    def after_history_step(self, step: EditStep, undone: bool):
+        """Journal the cells changed by an undo/redo step; the views follow through the change events"""
+        for delta in step.deltas:
+            if not any(floor is delta.floor for floor in self.house.floors):
+                continue
+            xs, ys = delta.cells()
+            self.journal.record_cells(self.house.floors.index(delta.floor), xs, ys,
+                                      *unpack_cells(delta.old if undone else delta.new))
+
     def update_floor_view(self):
-        self.grid_canvas.delete("all")
+        """Redraw the whole floor plan (used when switching floors or loading a project)"""
         floor = self.house.get_current_floor()
 
-        # Draw grid
-        for x in range(floor.width + 1):
+        # Grid lines are kept until the floor size changes
+        if self.grid_lines_size != (floor.width, floor.height):
+            self.grid_canvas.delete("all")
+            self.drawn_chunks.clear()
+            self.grid_lines_size = (floor.width, floor.height)
+            self.grid_canvas.configure(scrollregion=(0, 0, floor.width * self.grid_size,
+                                                     floor.height * self.grid_size))
+        else:
+            # Same size: keep the grid lines, redraw components of the chunks on screen
+            self.grid_canvas.delete("component")
+            for chunk in self.drawn_chunks:
+                self.draw_chunk_components(floor, *chunk)
+
+        self.refresh_viewport()
+
+    def visible_chunks(self, floor: Floor):
+        """Chunks of the current floor that intersect the scrolled viewport"""
+        chunk_px = self.view_chunk_size * self.grid_size
+        total_width = floor.width * self.grid_size
+        total_height = floor.height * self.grid_size
+        left, right = (fraction * total_width for fraction in self.grid_canvas.xview())
+        top, bottom = (fraction * total_height for fraction in self.grid_canvas.yview())
+
+        last_column = (floor.width - 1) // self.view_chunk_size
+        last_row = (floor.height - 1) // self.view_chunk_size
+        columns = range(int(left // chunk_px), min(int(right // chunk_px), last_column) + 1)
+        rows = range(int(top // chunk_px), min(int(bottom // chunk_px), last_row) + 1)
+        return {(chunk_x, chunk_y) for chunk_y in rows for chunk_x in columns}
+
+    def refresh_viewport(self):
+        """Draw chunks that scrolled into view and drop those that scrolled out"""
+        self.viewport_pending = None
+        floor = self.house.get_current_floor()
+        visible = self.visible_chunks(floor)
+
+        for chunk in self.drawn_chunks - visible:
+            self.grid_canvas.delete(self.chunk_tag(*chunk))
+        for chunk in visible - self.drawn_chunks:
+            self.draw_chunk_grid_lines(floor, *chunk)
+            self.draw_chunk_components(floor, *chunk)
+        self.drawn_chunks = visible
+
+    def schedule_viewport_refresh(self, event=None):
+        if self.viewport_pending is None:
+            self.viewport_pending = self.grid_canvas.after_idle(self.refresh_viewport)
+
+    def on_xscroll(self, *args):
+        self.grid_canvas.xview(*args)
+        self.schedule_viewport_refresh()
+
+    def on_yscroll(self, *args):
+        self.grid_canvas.yview(*args)
+        self.schedule_viewport_refresh()
+
+    def chunk_bounds(self, floor: Floor, chunk_x: int, chunk_y: int) -> Tuple[int, int, int, int]:
+        x0 = chunk_x * self.view_chunk_size
+        y0 = chunk_y * self.view_chunk_size
+        return x0, y0, min(x0 + self.view_chunk_size, floor.width), min(y0 + self.view_chunk_size, floor.height)
+
+    def draw_chunk_grid_lines(self, floor: Floor, chunk_x: int, chunk_y: int):
+        x0, y0, x1, y1 = self.chunk_bounds(floor, chunk_x, chunk_y)
+        tags = ("grid_line", self.chunk_tag(chunk_x, chunk_y))
+
+        # Each chunk draws its top/left edges; the last row/column also closes the floor
+        for x in range(x0, x1 + 1 if x1 == floor.width else x1):
             x_pos = x * self.grid_size
-            self.grid_canvas.create_line(x_pos, 0, x_pos, floor.height * self.grid_size, fill='gray', width=1)
+            self.grid_canvas.create_line(x_pos, y0 * self.grid_size, x_pos, y1 * self.grid_size, fill='gray',
+                                         width=1, tags=tags)
 
-        for y in range(floor.height + 1):
+        for y in range(y0, y1 + 1 if y1 == floor.height else y1):
             y_pos = y * self.grid_size
-            self.grid_canvas.create_line(0, y_pos, floor.width * self.grid_size, y_pos, fill='gray', width=1)
-
-        # Draw components
-        for (x, y), component in floor.components.items():
+            self.grid_canvas.create_line(x0 * self.grid_size, y_pos, x1 * self.grid_size, y_pos, fill='gray',
+                                         width=1, tags=tags)
+
+        # Keep the lines underneath any component items
+        self.grid_canvas.tag_lower(f"grid_line&&{self.chunk_tag(chunk_x, chunk_y)}")
+
+    def draw_chunk_components(self, floor: Floor, chunk_x: int, chunk_y: int):
+        self.draw_chunk_wall_runs(floor, chunk_x, chunk_y)
+        for component in floor.iter_components(self.chunk_bounds(floor, chunk_x, chunk_y)):
+            if component.type != ComponentType.WALL_PANEL:
+                self.draw_component(component.x, component.y, component)
+
+    def draw_chunk_wall_runs(self, floor: Floor, chunk_x: int, chunk_y: int):
+        """Draw a chunk's walls as one rectangle per straight run"""
+        xs, ys, type_codes, _ = floor.grid.occupied_in_rect(*self.chunk_bounds(floor, chunk_x, chunk_y))
+        walls = type_codes == TYPE_CODES[ComponentType.WALL_PANEL]
+        runs = find_runs(xs[walls], ys[walls], type_codes[walls])
+        tags = ("component", "wall_run", self.chunk_tag(chunk_x, chunk_y))
+        for x, y, width, depth in zip(runs.xs.tolist(), runs.ys.tolist(), runs.widths().tolist(),
+                                      runs.depths().tolist()):
+            self.grid_canvas.create_rectangle(x * self.grid_size, y * self.grid_size, (x + width) * self.grid_size,
+                                              (y + depth) * self.grid_size,
+                                              fill=COMPONENT_COLORS[ComponentType.WALL_PANEL], outline='black',
+                                              width=2, tags=tags)
+
+    def cell_tag(self, x: int, y: int) -> str:
+        return f"cell_{x}_{y}"
+
+    def chunk_tag(self, chunk_x: int, chunk_y: int) -> str:
+        return f"chunk_{chunk_x}_{chunk_y}"
+
+    def cell_chunk(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.view_chunk_size, y // self.view_chunk_size
+
+    def update_floor_cell(self, x: int, y: int):
+        """Replace the canvas items of a single cell with its current component (walls are drawn as runs)"""
+        self.grid_canvas.delete(self.cell_tag(x, y))
+        if self.cell_chunk(x, y) not in self.drawn_chunks:
+            return  # Drawn when scrolled into view
+        component = self.house.get_current_floor().get_component(x, y)
+        if component and component.type != ComponentType.WALL_PANEL:
             self.draw_component(x, y, component)
 
-        # Update scroll region
-        self.grid_canvas.configure(scrollregion=self.grid_canvas.bbox("all"))
+    def update_floor_cells(self, cells):
+        chunks = set()
+        for x, y in cells:
+            self.update_floor_cell(x, y)
+            chunks.add(self.cell_chunk(x, y))
+        # A changed cell can split, extend or join any wall run in its chunk
+        floor = self.house.get_current_floor()
+        for chunk in chunks & self.drawn_chunks:
+            self.grid_canvas.delete(f"wall_run&&{self.chunk_tag(*chunk)}")
+            self.draw_chunk_wall_runs(floor, *chunk)
+
+    def event_cell(self, event) -> Tuple[int, int]:
+        """Grid cell under a mouse event, accounting for the scroll position"""
+        x = int(self.grid_canvas.canvasx(event.x) // self.grid_size)
+        y = int(self.grid_canvas.canvasy(event.y) // self.grid_size)
+        return x, y
 
     def draw_component(self, x: int, y: int, component: Component):
         x1 = x * self.grid_size
@@ -353,226 +587,455 @@ class HouseBuilderApp:
         y2 = y1 + self.grid_size
 
         color = COMPONENT_COLORS[component.type]
+        tags = ("component", self.cell_tag(x, y), self.chunk_tag(*self.cell_chunk(x, y)))
 
         # Draw base rectangle
-        rect = self.grid_canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline='black', width=2)
+        rect = self.grid_canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline='black', width=2,
+                                                 tags=tags)
 
         # Draw component-specific details
         if component.type == ComponentType.DOOR_PANEL:
             # Draw door swing
-            self.grid_canvas.create_arc(x1, y1, x2, y2, start=0, extent=90, outline='white', width=2, style=tk.ARC)
+            self.grid_canvas.create_arc(x1, y1, x2, y2, start=0, extent=90, outline='white', width=2, style=tk.ARC,
+                                        tags=tags)
         elif component.type == ComponentType.WINDOW_PANEL:
             # Draw window cross
             self.grid_canvas.create_line(x1 + self.grid_size / 2, y1, x1 + self.grid_size / 2, y2, fill='white',
-                                         width=2)
+                                         width=2, tags=tags)
             self.grid_canvas.create_line(x1, y1 + self.grid_size / 2, x2, y1 + self.grid_size / 2, fill='white',
-                                         width=2)
+                                         width=2, tags=tags)
         elif component.type == ComponentType.FLOOR_PANEL:
             # Draw floor tile pattern
             margin = 4
             # Draw diagonal lines for tile pattern
-            self.grid_canvas.create_line(x1 + margin, y1 + margin, x2 - margin, y2 - margin, fill='#8B6914', width=1)
-            self.grid_canvas.create_line(x1 + margin, y2 - margin, x2 - margin, y1 + margin, fill='#8B6914', width=1)
+            self.grid_canvas.create_line(x1 + margin, y1 + margin, x2 - margin, y2 - margin, fill='#8B6914', width=1,
+                                         tags=tags)
+            self.grid_canvas.create_line(x1 + margin, y2 - margin, x2 - margin, y1 + margin, fill='#8B6914', width=1,
+                                         tags=tags)
 
     def on_grid_click(self, event):
-        x = event.x // self.grid_size
-        y = event.y // self.grid_size
+        x, y = self.event_cell(event)
+        tool = self.tool_var.get()
+        if tool == "flood_fill":
+            self.flood_fill(x, y)
+        elif tool == "paste":
+            self.paste_clipboard(x, y)
+        elif tool != "paint":
+            # Rectangle, line and selection tools act on the cells between press and release
+            self.tool_anchor = self.stroke_cell = (x, y)
+            self.draw_tool_outline()
+        else:
+            self.stroke_cell = (x, y)
+            # The whole stroke, until the button is released, is one undo step
+            self.history.begin_step("Paint")
+            self.place_components([(x, y)])
+
+    def on_grid_drag(self, event):
+        if self.tool_anchor is not None:
+            cell = self.event_cell(event)
+            if cell != self.stroke_cell:
+                self.stroke_cell = cell
+                self.draw_tool_outline()
+            return
+        if self.tool_var.get() != "paint":
+            return
+
+        # Allow dragging to place multiple components
+        x, y = self.event_cell(event)
+        if self.stroke_cell == (x, y):
+            return  # Still inside the same cell
+
+        if self.stroke_cell is None:
+            cells = [(x, y)]
+        else:
+            # Fill in cells skipped by fast strokes
+            cells = line_cells(self.stroke_cell[0], self.stroke_cell[1], x, y)[1:]
+        self.stroke_cell = (x, y)
+        self.place_components(cells)
+
+    def on_grid_release(self, event):
+        if self.tool_anchor is not None:
+            self.finish_tool_drag()
+        self.stroke_cell = None
+        self.history.end_step()
+
+    def clamp_cell(self, cell: Tuple[int, int]) -> Tuple[int, int]:
         floor = self.house.get_current_floor()
+        return min(max(cell[0], 0), floor.width - 1), min(max(cell[1], 0), floor.height - 1)
+
+    def tool_rect(self) -> Tuple[int, int, int, int]:
+        """(x0, y0, x1, y1), x1 and y1 exclusive, of the cells between the drag anchor and the current cell"""
+        (ax, ay), (bx, by) = self.clamp_cell(self.tool_anchor), self.clamp_cell(self.stroke_cell)
+        return min(ax, bx), min(ay, by), max(ax, bx) + 1, max(ay, by) + 1
+
+    def draw_tool_outline(self):
+        """Rubber-band outline of the rectangle, line or selection being dragged"""
+        self.grid_canvas.delete("tool_outline")
+        size = self.grid_size
+        if self.tool_var.get() == "line":
+            (ax, ay), (bx, by) = self.clamp_cell(self.tool_anchor), self.clamp_cell(self.stroke_cell)
+            self.grid_canvas.create_line((ax + 0.5) * size, (ay + 0.5) * size, (bx + 0.5) * size, (by + 0.5) * size,
+                                         fill='blue', width=2, dash=(4, 2), tags="tool_outline")
+        else:
+            x0, y0, x1, y1 = self.tool_rect()
+            self.grid_canvas.create_rectangle(x0 * size, y0 * size, x1 * size, y1 * size, outline='blue', width=2,
+                                              dash=(4, 2), tags="tool_outline")
 
+    def finish_tool_drag(self):
+        tool = self.tool_var.get()
+        floor = self.house.get_current_floor()
+        x0, y0, x1, y1 = self.tool_rect()
+        if tool == "select":
+            # The outline stays on screen to show the selection
+            self.selection = (x0, y0, x1, y1)
+            self.status_var.set(f"Selected {x1 - x0}x{y1 - y0} cells at ({x0}, {y0})")
+        else:
+            self.grid_canvas.delete("tool_outline")
+            with self.edit_transaction(tool.title()) as edit:
+                if tool == "line":
+                    edit.draw_line(floor, *self.clamp_cell(self.tool_anchor), *self.clamp_cell(self.stroke_cell),
+                                   self.selected_component_type)
+                else:
+                    edit.fill_rect(floor, x0, y0, x1, y1, self.selected_component_type)
+            self.status_var.set(f"Drew {self.selected_component_type.value} {tool}")
+        self.tool_anchor = None
+
+    def flood_fill(self, x: int, y: int):
+        floor = self.house.get_current_floor()
         if 0 <= x < floor.width and 0 <= y < floor.height:
-            component = Component(self.selected_component_type, x, y)
-            floor.add_component(component)
-            self.update_floor_view()
-            self.update_3d_preview()
-            self.status_var.set(f"Placed {self.selected_component_type.value} at ({x}, {y})")
+            with self.edit_transaction("Flood Fill") as edit:
+                count = edit.flood_fill(floor, x, y, self.selected_component_type)
+            self.status_var.set(f"Filled {count} cells with {self.selected_component_type.value}")
+
+    def copy_selection(self):
+        if self.selection is None:
+            self.status_var.set("Select a region to copy first")
+            return
+        self.clipboard = EditTransaction(self.house).copy_region(self.house.get_current_floor(), *self.selection)
+        self.status_var.set(f"Copied {self.clipboard.width}x{self.clipboard.height} cells")
+
+    def paste_clipboard(self, x: int, y: int):
+        if self.clipboard is None:
+            self.status_var.set("Nothing to paste, copy a selection first")
+            return
+        with self.edit_transaction("Paste") as edit:
+            edit.paste(self.house.get_current_floor(), self.clipboard, x, y)
+        self.status_var.set(f"Pasted {self.clipboard.width}x{self.clipboard.height} cells at ({x}, {y})")
+
+    def copy_floor_to(self):
+        """Copy the current floor over another floor"""
+        target = simpledialog.askinteger("Copy Floor", "Copy this floor to floor number:", minvalue=0,
+                                         maxvalue=len(self.house.floors) - 1)
+        if target is None or target == self.house.current_floor_index:
+            return
+        with self.edit_transaction("Copy Floor") as edit:
+            edit.copy_floor(self.house.get_current_floor(), self.house.floors[target])
+        self.status_var.set(f"Copied floor {self.house.current_floor_index} to floor {target}")
+
+    def place_components(self, cells):
+        floor = self.house.get_current_floor()
+        placed = [(x, y) for x, y in cells if 0 <= x < floor.width and 0 <= y < floor.height]
 
-    def on_grid_drag(self, event):
-        # Allow dragging to place multiple components
-        self.on_grid_click(event)
+        if placed:
+            xs, ys = zip(*placed)
+            self.set_cells(floor, xs, ys, [TYPE_CODES[self.selected_component_type]] * len(placed), [0] * len(placed))
+            x, y = placed[-1]
+            self.status_var.set(f"Placed {self.selected_component_type.value} at ({x}, {y})")
 
     def on_grid_right_click(self, event):
-        x = event.x // self.grid_size
-        y = event.y // self.grid_size
+        x, y = self.event_cell(event)
         floor = self.house.get_current_floor()
 
         if 0 <= x < floor.width and 0 <= y < floor.height:
-            floor.remove_component(x, y)
-            self.update_floor_view()
-            self.update_3d_preview()
+            self.history.begin_step("Remove")
+            self.set_cells(floor, [x], [y], [0], [0])
+            self.history.end_step()
             self.status_var.set(f"Removed component at ({x}, {y})")
 
-    def update_3d_preview(self):
-        self.preview_canvas.delete("all")
-
-        # Isometric projection parameters
-        iso_x = 0.866  # cos(30°)
-        iso_y = 0.5  # sin(30°)
-        scale = 20
-        offset_x = 200
-        offset_y = 400
-        floor_height = 3  # Height of each floor in grid units
-
-        # Draw floors from bottom to top
-        for floor_idx, floor in enumerate(self.house.floors):
-            z_offset = floor_idx * floor_height * scale
-
-            # Draw floor plate
-            if floor_idx == 0:  # Ground floor
-                points = self.iso_project_rect(0, 0, floor.width, floor.height, z_offset, scale, offset_x, offset_y)
-                self.preview_canvas.create_polygon(points, fill='#C0C0C0', outline='black')
-
-            # Draw components
-            for (x, y), component in floor.components.items():
-                if component.type == ComponentType.WALL_PANEL:
-                    # Draw 3D wall
-                    self.draw_iso_wall(x, y, z_offset, scale, offset_x, offset_y,
-                                       floor_idx == self.house.current_floor_index)
-                elif component.type == ComponentType.DOOR_PANEL:
-                    # Draw door (shorter wall)
-                    self.draw_iso_door(x, y, z_offset, scale, offset_x, offset_y,
-                                       floor_idx == self.house.current_floor_index)
-                elif component.type == ComponentType.WINDOW_PANEL:
-                    # Draw window (wall with hole)
-                    self.draw_iso_window(x, y, z_offset, scale, offset_x, offset_y,
-                                         floor_idx == self.house.current_floor_index)
-                elif component.type == ComponentType.FLOOR_PANEL:
-                    # Draw floor tile
-                    self.draw_iso_floor(x, y, z_offset, scale, offset_x, offset_y,
-                                        floor_idx == self.house.current_floor_index)
-
-            # Draw ceiling/next floor
-            if floor_idx < len(self.house.floors) - 1:
-                z_offset_ceiling = (floor_idx + 1) * floor_height * scale
-                points = self.iso_project_rect(0, 0, floor.width, floor.height, z_offset_ceiling, scale, offset_x,
-                                               offset_y)
-                self.preview_canvas.create_polygon(points, fill='#E0E0E0', outline='black', stipple='gray50')
-
-    def iso_project(self, x, y, z, scale, offset_x, offset_y):
-        """Convert 3D coordinates to 2D isometric projection"""
-        iso_x = 0.866
-        iso_y = 0.5
-
-        screen_x = offset_x + (x - y) * iso_x * scale
-        screen_y = offset_y - (x + y) * iso_y * scale - z
-
-        return screen_x, screen_y
-
-    def iso_project_rect(self, x, y, width, height, z, scale, offset_x, offset_y):
-        """Project a rectangle in 3D space"""
-        p1 = self.iso_project(x, y, z, scale, offset_x, offset_y)
-        p2 = self.iso_project(x + width, y, z, scale, offset_x, offset_y)
-        p3 = self.iso_project(x + width, y + height, z, scale, offset_x, offset_y)
-        p4 = self.iso_project(x, y + height, z, scale, offset_x, offset_y)
-        return [p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]]
-
-    def draw_iso_wall(self, x, y, z_base, scale, offset_x, offset_y, is_current_floor):
-        wall_height = 3 * scale
-        color = '#8B4513' if is_current_floor else '#A0826D'
-
-        # Wall faces
-        # Front face
-        p1 = self.iso_project(x, y, z_base, scale, offset_x, offset_y)
-        p2 = self.iso_project(x + 1, y, z_base, scale, offset_x, offset_y)
-        p3 = self.iso_project(x + 1, y, z_base + wall_height, scale, offset_x, offset_y)
-        p4 = self.iso_project(x, y, z_base + wall_height, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]],
-                                           fill=color, outline='black')
-
-        # Right face
-        p5 = self.iso_project(x + 1, y + 1, z_base, scale, offset_x, offset_y)
-        p6 = self.iso_project(x + 1, y + 1, z_base + wall_height, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p2[0], p2[1], p5[0], p5[1], p6[0], p6[1], p3[0], p3[1]],
-                                           fill=color, outline='black')
-
-        # Top face
-        p7 = self.iso_project(x, y + 1, z_base + wall_height, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p4[0], p4[1], p3[0], p3[1], p6[0], p6[1], p7[0], p7[1]],
-                                           fill='#6B3410', outline='black')
-
-    def draw_iso_door(self, x, y, z_base, scale, offset_x, offset_y, is_current_floor):
-        door_height = 2.5 * scale
-        color = '#654321' if is_current_floor else '#806040'
-
-        # Similar to wall but shorter
-        p1 = self.iso_project(x, y, z_base, scale, offset_x, offset_y)
-        p2 = self.iso_project(x + 1, y, z_base, scale, offset_x, offset_y)
-        p3 = self.iso_project(x + 1, y, z_base + door_height, scale, offset_x, offset_y)
-        p4 = self.iso_project(x, y, z_base + door_height, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]],
-                                           fill=color, outline='black')
-
-    def draw_iso_window(self, x, y, z_base, scale, offset_x, offset_y, is_current_floor):
-        wall_height = 3 * scale
-        window_bottom = 1 * scale
-        window_top = 2.5 * scale
-        color = '#8B4513' if is_current_floor else '#A0826D'
-
-        # Draw wall with window hole
-        p1 = self.iso_project(x, y, z_base, scale, offset_x, offset_y)
-        p2 = self.iso_project(x + 1, y, z_base, scale, offset_x, offset_y)
-        p3 = self.iso_project(x + 1, y, z_base + wall_height, scale, offset_x, offset_y)
-        p4 = self.iso_project(x, y, z_base + wall_height, scale, offset_x, offset_y)
-
-        # Bottom part
-        p5 = self.iso_project(x, y, z_base + window_bottom, scale, offset_x, offset_y)
-        p6 = self.iso_project(x + 1, y, z_base + window_bottom, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p1[0], p1[1], p2[0], p2[1], p6[0], p6[1], p5[0], p5[1]],
-                                           fill=color, outline='black')
-
-        # Top part
-        p7 = self.iso_project(x, y, z_base + window_top, scale, offset_x, offset_y)
-        p8 = self.iso_project(x + 1, y, z_base + window_top, scale, offset_x, offset_y)
-        self.preview_canvas.create_polygon([p7[0], p7[1], p8[0], p8[1], p3[0], p3[1], p4[0], p4[1]],
-                                           fill=color, outline='black')
-
-        # Window glass
-        self.preview_canvas.create_polygon([p5[0], p5[1], p6[0], p6[1], p8[0], p8[1], p7[0], p7[1]],
-                                           fill='#87CEEB', outline='black', stipple='gray25')
-
-    def draw_iso_floor(self, x, y, z_base, scale, offset_x, offset_y, is_current_floor):
-        """Draw floor panel in 3D view"""
-        floor_thickness = 0.2 * scale
-        color = '#D2691E' if is_current_floor else '#C8B88B'
-
-        # Top surface of floor panel
-        p1 = self.iso_project(x, y, z_base + floor_thickness, scale, offset_x, offset_y)
-        p2 = self.iso_project(x + 1, y, z_base + floor_thickness, scale, offset_x, offset_y)
-        p3 = self.iso_project(x + 1, y + 1, z_base + floor_thickness, scale, offset_x, offset_y)
-        p4 = self.iso_project(x, y + 1, z_base + floor_thickness, scale, offset_x, offset_y)
-
-        # Draw top surface
-        self.preview_canvas.create_polygon([p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]],
-                                           fill=color, outline='black', width=1)
-
-        # Draw tile pattern
-        mid_x = (p1[0] + p3[0]) / 2
-        mid_y = (p1[1] + p3[1]) / 2
-        self.preview_canvas.create_line(p1[0], p1[1], p3[0], p3[1], fill='#8B6914', width=1)
-        self.preview_canvas.create_line(p2[0], p2[1], p4[0], p4[1], fill='#8B6914', width=1)
+    def component_count(self) -> int:
+        return self.floor_summaries.component_total()
+
+    def update_3d_preview(self, dirty_cells: Optional[Dict[Floor, set]] = None):
+        """Bring the isometric preview in line with the house.
+
+        Large houses are rasterized into a single image; smaller ones are drawn
+        as canvas items, updated cell by cell.
+        """
+        if self.component_count() > self.raster_preview_threshold:
+            self.update_raster_preview()
+        else:
+            self.update_canvas_preview(dirty_cells)
+
+    def update_raster_preview(self):
+        """Render the whole preview offscreen and show it as one image"""
+        if self.preview_floors:
+            # Switching from canvas items: drop them and their caches
+            self.preview_canvas.delete("iso")
+            self.preview_floors, self.preview_details, self.iso_items, self.iso_row_markers = [], [], [], []
+            self.preview_highlight = None
+
+        width = self.preview_canvas.winfo_width()
+        height = self.preview_canvas.winfo_height()
+        if width <= 1 or height <= 1:  # Not mapped yet
+            width, height = int(self.preview_canvas['width']), int(self.preview_canvas['height'])
+        pixels = render_house(self.iso_view, self.house.floors, self.house.current_floor_index, width, height,
+                              self.preview_lod_var.get())
+        if self.raster_image is None or (self.raster_image.width(), self.raster_image.height()) != (width, height):
+            self.preview_canvas.delete("iso_raster")
+            self.raster_image = tk.PhotoImage(width=width, height=height)
+            self.preview_canvas.create_image(0, 0, image=self.raster_image, anchor=tk.NW, tags="iso_raster")
+        self.raster_image.configure(data=to_ppm(pixels), format='PPM')
+
+    def update_canvas_preview(self, dirty_cells: Optional[Dict[Floor, set]] = None):
+        """Draw the preview as canvas items.
+
+        Levels already on the canvas are kept: only the cells in dirty_cells are
+        re-projected, and switching floors just recolours two levels (plus the
+        few whose level of detail changes).
+        """
+        if self.raster_image is not None:
+            self.preview_canvas.delete("iso_raster")
+            self.raster_image = None
+        floors = self.house.floors
+
+        # Keep the levels below the first floor that was added, removed, replaced or resized
+        kept = 0
+        while (kept < min(len(floors), len(self.preview_floors))
+               and self.preview_floors[kept] == (floors[kept], floors[kept].width, floors[kept].height)):
+            kept += 1
+        restructured = kept < len(self.preview_floors) or kept < len(floors)
+        if restructured:
+            if kept:
+                # Whether the top kept level has a ceiling depends on the levels above it
+                self.preview_canvas.delete(f"iso_ceiling_{kept - 1}")
+            for floor_idx in range(kept, len(self.preview_floors)):
+                self.preview_canvas.delete(f"iso_floor_{floor_idx}", f"iso_ceiling_{floor_idx}")
+            del self.preview_floors[kept:], self.preview_details[kept:]
+            del self.iso_items[kept:], self.iso_row_markers[kept:]
+            if kept and kept < len(floors):
+                self.draw_iso_ceiling(kept - 1)
+            for floor_idx in range(kept, len(floors)):
+                self.draw_iso_level(floor_idx)
+
+        # Kept levels whose level of detail changed are redrawn whole, in their place
+        redrawn = set()
+        for floor_idx in range(kept):
+            if self.preview_details[floor_idx] != self.level_detail(floor_idx):
+                self.redraw_iso_level(floor_idx)
+                redrawn.add(floor_idx)
+
+        # Levels just drawn already have the right colours; move the highlight between kept ones
+        if self.preview_highlight != self.house.current_floor_index:
+            if self.preview_highlight is not None and self.preview_highlight < kept:
+                self.color_iso_level(self.preview_highlight, is_current_floor=False)
+            if self.house.current_floor_index < kept:
+                self.color_iso_level(self.house.current_floor_index, is_current_floor=True)
+            self.preview_highlight = self.house.current_floor_index
+
+        # Re-project dirty cells, plus the neighbours whose hidden faces they may change
+        updates = {}
+        for floor, cells in (dirty_cells or {}).items():
+            floor_idx = next((i for i in range(len(floors)) if floors[i] is floor), None)
+            if floor_idx is None or not cells:
+                continue
+            if floor_idx < kept and self.iso_items[floor_idx] is None and floor_idx not in redrawn:
+                # Reduced levels are not tracked per cell
+                self.redraw_iso_level(floor_idx)
+                redrawn.add(floor_idx)
+            xs, ys = np.array(list(cells), dtype=np.int64).T
+            for affected_idx, (affected_xs, affected_ys) in affected_cells(self.iso_view, len(floors), floor_idx,
+                                                                            xs, ys).items():
+                updates.setdefault(affected_idx, []).append((affected_xs, affected_ys))
+        for floor_idx, batches in updates.items():
+            if floor_idx < kept and self.iso_items[floor_idx] is not None and floor_idx not in redrawn:
+                self.update_iso_cells(floor_idx, np.concatenate([batch[0] for batch in batches]),
+                                      np.concatenate([batch[1] for batch in batches]))
+
+        if restructured:
+            # Floors above changed, so walls hiding cells of the kept levels may have come or gone
+            for floor_idx in range(kept):
+                if self.iso_items[floor_idx] is None or floor_idx in redrawn:
+                    continue
+                xs, ys, _, _ = floors[floor_idx].grid.occupied()
+                sides = visible_sides(self.iso_view, floors, floor_idx, xs, ys)
+                changed = sides != self.iso_items[floor_idx].drawn_sides(xs, ys)
+                if changed.any():
+                    self.update_iso_cells(floor_idx, xs[changed], ys[changed])
+
+    def level_detail(self, floor_idx: int) -> str:
+        return floor_detail(self.preview_lod_var.get(), floor_idx, self.house.current_floor_index)
+
+    def on_preview_lod_changed(self, event=None):
+        self.update_3d_preview()
+
+    def draw_iso_level(self, floor_idx: int):
+        """Project and draw one floor of the preview, with its ceiling plate"""
+        floor = self.house.floors[floor_idx]
+        detail = self.level_detail(floor_idx)
+        items, markers = self.draw_iso_level_items(floor_idx, detail)
+        self.preview_floors.append((floor, floor.width, floor.height))
+        self.preview_details.append(detail)
+        self.iso_items.append(items)
+        self.iso_row_markers.append(markers)
+
+        # Draw ceiling/next floor
+        if floor_idx < len(self.house.floors) - 1:
+            self.draw_iso_ceiling(floor_idx)
+
+    def redraw_iso_level(self, floor_idx: int):
+        """Replace a drawn level, keeping its place between the levels below and above"""
+        self.preview_canvas.delete(f"iso_floor_{floor_idx}")
+        detail = self.level_detail(floor_idx)
+        self.iso_items[floor_idx], self.iso_row_markers[floor_idx] = self.draw_iso_level_items(floor_idx, detail)
+        self.preview_details[floor_idx] = detail
+        if floor_idx < len(self.preview_floors) - 1:
+            self.preview_canvas.tag_lower(f"iso_floor_{floor_idx}", f"iso_ceiling_{floor_idx}")
+
+    def draw_iso_level_items(self, floor_idx: int, detail: str) -> Tuple[Optional[LevelItems], List[int]]:
+        """Draw the items of one level; full-detail levels also get their per-row items and row markers"""
+        floor = self.house.floors[floor_idx]
+        floor_tag = f"iso_floor_{floor_idx}"
+        is_current_floor = floor_idx == self.house.current_floor_index
+
+        # Draw floor plate
+        if floor_idx == 0:  # Ground floor
+            points = self.iso_view.project_rect(0, 0, floor.width, floor.height, self.iso_view.floor_z(floor_idx))
+            self.preview_canvas.create_polygon(points, fill=GROUND_COLOR, outline='black', tags=("iso", floor_tag))
+
+        styles = self.iso_face_styles(floor_idx, is_current_floor)
+        if detail != DETAIL_FULL:
+            faces = reduced_faces(self.iso_view, floor, floor_idx, detail)
+            for style, coords in zip(faces.styles, faces.coords):
+                create, options = styles[style]
+                create(coords, **options)
+            return None, []
+
+        # Draw components back to front a row at a time, closing each row with a
+        # hidden marker so rows redrawn later can be put back in their place
+        xs, ys, type_codes, _ = floor.grid.occupied()
+        items = LevelItems()
+        markers = [0] * floor.height
+        rows = self.draw_iso_rows(floor_idx, xs, ys, type_codes, styles)
+        for y in range(floor.height - 1, -1, -1):
+            if y in rows:
+                items.replace(y, *rows[y])
+            markers[y] = self.preview_canvas.create_line(0, 0, 0, 0, state='hidden', tags=("iso", floor_tag))
+        return items, markers
+
+    def draw_iso_rows(self, floor_idx: int, xs, ys, type_codes, styles) -> Dict[int, Tuple]:
+        """Draw whole rows of cells, back to front, with each run as one piece.
+
+        Returns (item ids, xs ascending, visible sides) per row drawn.
+        """
+        order = row_order(xs, ys)
+        xs, ys, type_codes = xs[order].astype(np.int64), ys[order].astype(np.int64), type_codes[order]
+        sides = visible_sides(self.iso_view, self.house.floors, floor_idx, xs, ys)
+        faces = run_faces(self.iso_view, floor_idx, xs, ys, type_codes, sides)
+        row_starts = np.flatnonzero(np.diff(ys, prepend=-1)).tolist() + [len(ys)]
+        # Faces are in cell order, so each row's faces are one contiguous slice
+        face_starts = np.searchsorted(faces.cells, row_starts).tolist()
+        rows = {}
+        for start, end, face_start, face_end in zip(row_starts, row_starts[1:], face_starts, face_starts[1:]):
+            item_ids = []
+            for j in range(face_start, face_end):
+                create, options = styles[faces.styles[j]]
+                item_ids.append(create(faces.coords[j], **options))
+            rows[int(ys[start])] = (item_ids, xs[start:end][::-1], sides[start:end][::-1])
+        return rows
+
+    def draw_iso_ceiling(self, floor_idx: int):
+        floor = self.house.floors[floor_idx]
+        points = self.iso_view.project_rect(0, 0, floor.width, floor.height, self.iso_view.floor_z(floor_idx + 1))
+        self.preview_canvas.create_polygon(points, fill=CEILING_COLOR, outline='black', stipple='gray50',
+                                           tags=("iso", f"iso_ceiling_{floor_idx}"))
+
+    def iso_face_styles(self, floor_idx: int, is_current_floor: bool) -> Dict[Tuple[str, str], Tuple]:
+        """(create method, options) for each (kind, role) of face on a level"""
+        styles = {}
+        for role, colors in FACE_COLORS.items():
+            color = colors[0 if is_current_floor else 1]
+            tags = ("iso", f"iso_floor_{floor_idx}", f"iso_role_{role}")
+            styles[('line', role)] = (self.preview_canvas.create_line, dict(fill=color, width=1, tags=tags))
+            styles[('polygon', role)] = (self.preview_canvas.create_polygon,
+                                         dict(fill=color, outline='black', stipple=FACE_STIPPLES.get(role, ''),
+                                              tags=tags))
+        return styles
+
+    def color_iso_level(self, floor_idx: int, is_current_floor: bool):
+        """Switch a drawn level between the current-floor and other-floor colours"""
+        for role, colors in FACE_COLORS.items():
+            if colors[0] != colors[1]:
+                self.preview_canvas.itemconfigure(f"iso_floor_{floor_idx}&&iso_role_{role}",
+                                                  fill=colors[0 if is_current_floor else 1])
+
+    def update_iso_cells(self, floor_idx: int, xs, ys):
+        """Redraw the rows of a drawn level that hold the given cells"""
+        floor = self.house.floors[floor_idx]
+        items = self.iso_items[floor_idx]
+        markers = self.iso_row_markers[floor_idx]
+        is_current_floor = floor_idx == self.preview_highlight
+        inside = (xs >= 0) & (xs < floor.width) & (ys >= 0) & (ys < floor.height)
+        changed_rows = np.unique(ys[inside]).tolist()
+        if not changed_rows:
+            return
+
+        # A cell's faces may be merged with the rest of its run, so whole rows are redrawn
+        cells = [floor.grid.occupied_in_rect(0, y, floor.width, y + 1) for y in changed_rows]
+        row_xs, row_ys, type_codes = (np.concatenate([row[column] for row in cells]) for column in range(3))
+        rows = self.draw_iso_rows(floor_idx, row_xs, row_ys, type_codes,
+                                  self.iso_face_styles(floor_idx, is_current_floor))
+        empty_row = ([], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8))
+        for y in changed_rows:
+            new_items, drawn_xs, drawn_sides = rows.get(y, empty_row)
+            for item in new_items:
+                self.preview_canvas.tag_lower(item, markers[y])
+            for item in items.replace(y, new_items, drawn_xs, drawn_sides):
+                self.preview_canvas.delete(item)
 
     def save_project(self):
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Binary projects", "*.hbp"), ("All files", "*.*")]
         )
         if filename:
-            with open(filename, 'w') as f:
-                json.dump(self.house.to_dict(), f, indent=2)
+            project_io.save_project(self.house, filename)
+            # The saved file is the new baseline for crash recovery
+            self.journal.close()
+            self.journal.discard()
+            self.journal = ProjectJournal(filename)
+            self.journal.start(self.house)
             self.status_var.set(f"Saved project to {filename}")
 
     def load_project(self):
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Project files", "*.json *.hbp"), ("All files", "*.*")]
         )
         if filename:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-            self.house = House.from_dict(data)
-            self.update_floor_list()
-            self.update_floor_view()
-            self.update_3d_preview()
+            # The edits of the session being left were not saved, so they are not offered for recovery later
+            self.journal.close()
+            self.journal.discard()
+            self.journal = ProjectJournal(filename)
+            self.open_journal()
+            self.history.clear()
             self.status_var.set(f"Loaded project from {filename}")
 
+    def open_journal(self):
+        """Start autosave journaling, offering to recover edits a previous session did not save"""
+        if self.journal.has_unsaved_changes() and messagebox.askyesno(
+                "Recover Unsaved Changes",
+                "The previous session ended with unsaved changes.\n\nRecover them?"):
+            self.replace_house(self.journal.recover())
+            self.journal.start(self.house, resume=True)
+            return
+
+        if self.journal.project_path:
+            self.replace_house(project_io.load_project(self.journal.project_path))
+        self.journal.start(self.house)
+
+    def on_close(self):
+        self.journal.close()
+        self.root.destroy()
+
     def export_to_manufacturing(self):
         """Export house design to manufacturing specifications"""
         filename = filedialog.asksaveasfilename(
@@ -580,96 +1043,25 @@ class HouseBuilderApp:
             filetypes=[("Manufacturing files", "*.mfg"), ("All files", "*.*")]
         )
         if filename:
-            # Generate manufacturing data
-            mfg_data = {
-                'version': '1.0',
-                'project': 'House Builder Project',
-                'panel_size': self.panel_size,
-                'components': []
-            }
-
-            # Count components
-            component_counts = {}
-            for floor in self.house.floors:
-                for component in floor.components.values():
-                    key = component.type.value
-                    component_counts[key] = component_counts.get(key, 0) + 1
-
-            # Generate component list with specifications
-            for comp_type, count in component_counts.items():
-                mfg_data['components'].append({
-                    'type': comp_type,
-                    'quantity': count,
-                    'dimensions': f"{self.panel_size}x{self.panel_size}",
-                    'material': 'standard_panel',
-                    'operations': ['cut', 'drill_mounting_holes', 'edge_finish']
-                })
-
-            # Add assembly information
-            mfg_data['assembly'] = {
-                'floors': len(self.house.floors),
-                'total_components': sum(component_counts.values()),
-                'floor_area': self.house.floors[0].width * self.house.floors[
-                    0].height * self.panel_size * self.panel_size
-            }
-
-            # Save manufacturing data
-            with open(filename, 'w') as f:
-                json.dump(mfg_data, f, indent=2)
-
-            # Also generate a simple G-code template
-            gcode_filename = filename.replace('.mfg', '.gcode')
-            self.generate_sample_gcode(gcode_filename, mfg_data)
+            outcomes = self.export_pipeline.run(self.house, os.path.splitext(filename)[0], self.panel_size,
+                                                self.floor_summaries, subprograms=self.gcode_subprograms_var.get())
+            nesting = outcomes['mfg'].result['nesting']
+            toolpath_report = outcomes['gcode'].result
 
             self.status_var.set(f"Exported manufacturing specs to {filename}")
             messagebox.showinfo("Export Complete",
-                                f"Manufacturing specifications exported to:\n{filename}\n\n"
-                                f"Sample G-code template generated at:\n{gcode_filename}")
-
-    def generate_sample_gcode(self, filename, mfg_data):
-        """Generate a sample G-code template for panel cutting"""
-        with open(filename, 'w') as f:
-            f.write("; House Builder 3D - G-code Template\n")
-            f.write("; Generated for panel cutting operations\n")
-            f.write(f"; Panel size: {self.panel_size}x{self.panel_size} units\n\n")
-
-            f.write("; Initialize\n")
-            f.write("G21 ; Set units to millimeters\n")
-            f.write("G90 ; Absolute positioning\n")
-            f.write("G0 Z5.0 ; Lift Z\n")
-            f.write("M3 S12000 ; Start spindle\n\n")
-
-            # Generate cutting operations for each component type
-            panel_size_mm = self.panel_size * 100  # Convert to mm (assuming 1 unit = 100mm)
-
-            for component in mfg_data['components']:
-                f.write(f"; Cutting {component['quantity']} x {component['type']}\n")
-                f.write(f"; Panel dimensions: {panel_size_mm}x{panel_size_mm}mm\n")
-
-                # Simple rectangular cut
-                f.write("G0 X0 Y0 ; Move to start\n")
-                f.write("G0 Z1.0 ; Lower to cutting height\n")
-                f.write(f"G1 X{panel_size_mm} Y0 F1000 ; Cut edge 1\n")
-                f.write(f"G1 X{panel_size_mm} Y{panel_size_mm} F1000 ; Cut edge 2\n")
-                f.write(f"G1 X0 Y{panel_size_mm} F1000 ; Cut edge 3\n")
-                f.write("G1 X0 Y0 F1000 ; Cut edge 4\n")
-                f.write("G0 Z5.0 ; Lift Z\n\n")
-
-                # Add component-specific operations
-                if component['type'] == 'door_panel':
-                    f.write("; Door cutout\n")
-                    f.write("G0 X100 Y100 ; Move to door cutout start\n")
-                    f.write("; ... door cutout operations ...\n\n")
-                elif component['type'] == 'window_panel':
-                    f.write("; Window cutout\n")
-                    f.write("G0 X200 Y300 ; Move to window cutout start\n")
-                    f.write("; ... window cutout operations ...\n\n")
-
-            f.write("; Finish\n")
-            f.write("M5 ; Stop spindle\n")
-            f.write("G0 Z50 ; Lift Z to safe height\n")
-            f.write("G0 X0 Y0 ; Return to home\n")
-            f.write("M30 ; End program\n")
+                                "Exported:\n"
+                                + "\n".join(f"{outcome.path}{'' if outcome.ran else ' (unchanged)'}"
+                                            for outcome in outcomes.values())
+                                + f"\n\nStock sheets: {nesting['sheet_count']} ({nesting['utilization']:.0%} used)\n"
+                                + "\n".join(format_report(toolpath_report) + self.gcode_size_lines(toolpath_report)))
+
+    def gcode_size_lines(self, report: dict) -> List[str]:
+        if 'gcode_size_reduction' not in report:
+            return [f"G-code size: {report['gcode_bytes'] / 1024:.0f} KB"]
+        return [f"G-code size: {report['gcode_bytes'] / 1024:.0f} KB, "
+                f"{report['gcode_size_reduction']:.0%} smaller than inline "
+                f"({report['gcode_bytes_inline'] / 1024:.0f} KB)"]
 
 
 if __name__ == "__main__":
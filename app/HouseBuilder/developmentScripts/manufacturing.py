@@ -0,0 +1,325 @@
+"""Manufacturing specification and G-code generation for a House.
+
+Has no GUI dependencies; used by the House Builder app and by the headless
+batch exporter.
+"""
+import hashlib
+import json
+import os
+from typing import IO, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cell_runs import find_runs
+from house_model import CODE_TYPES, ComponentType, Floor, House
+from nesting import max_piece_cells, nest_cut_list, stock_sheets
+from toolpath import FEED_RATE, ToolpathPlan, format_report, plan_toolpaths
+
+SUBPROGRAM_BASE = 1000  # Program number of the first panel subprogram
+
+
+class FloorSummary:
+    """Cells, component counts and cut panels of one floor, each computed the first time it is asked for"""
+    def __init__(self, floor: Floor):
+        self.floor = floor
+        self._cells: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._component_counts: Optional[Dict[ComponentType, int]] = None
+        self._panels: Optional[Dict[Tuple[int, int], int]] = None
+        self._content_hash: Optional[str] = None
+
+    @property
+    def cells(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(xs, ys, type_codes, rotation_codes) of the occupied cells, row by row"""
+        if self._cells is None:
+            self._cells = self.floor.grid.occupied()
+        return self._cells
+
+    @property
+    def content_hash(self) -> str:
+        """Hex digest of the floor size and cells, the same across sessions, storage and copies"""
+        if self._content_hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.array([self.floor.width, self.floor.height], dtype='<i8').tobytes())
+            xs, ys, type_codes, rotation_codes = self.cells
+            for column, dtype in ((xs, '<i8'), (ys, '<i8'), (type_codes, 'u1'), (rotation_codes, 'u1')):
+                digest.update(np.ascontiguousarray(column, dtype=dtype).tobytes())
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    @property
+    def component_counts(self) -> Dict[ComponentType, int]:
+        if self._component_counts is None:
+            self._component_counts = self.floor.component_counts()
+        return self._component_counts
+
+    @property
+    def panels(self) -> Dict[Tuple[int, int], int]:
+        """(type code, length) -> number of straight runs of that type and length"""
+        if self._panels is None:
+            self._panels = _floor_panels(*self.cells[:3])
+        return self._panels
+
+    @panels.setter
+    def panels(self, panels: Dict[Tuple[int, int], int]):
+        """Reuse panels counted earlier for a floor with the same content_hash"""
+        self._panels = panels
+
+    @property
+    def has_panels(self) -> bool:
+        return self._panels is not None
+
+
+class FloorSummaries:
+    """Floor summaries by floor revision: only edited floors are recounted, and floors sharing cells count once"""
+    def __init__(self, house: House):
+        self.house = house
+        self.cache: Dict[object, FloorSummary] = {}  # Floor.revision -> summary
+        house.events.subscribe(self.on_house_changed)
+
+    def on_house_changed(self, events):
+        # Forget revisions no floor has any more (floors not loaded yet have no summary)
+        live = {floor.revision for floor in self.house.floors if floor.is_loaded}
+        for key in [key for key in self.cache if key not in live]:
+            del self.cache[key]
+
+    def summary(self, floor: Floor) -> FloorSummary:
+        summary = self.cache.get(floor.revision)
+        if summary is None:
+            summary = self.cache[floor.revision] = FloorSummary(floor)
+        # Any floor with this revision has the same cells; the first one may have been edited since
+        summary.floor = floor
+        return summary
+
+    def component_total(self) -> int:
+        return sum(sum(self.summary(floor).component_counts.values()) for floor in self.house.floors)
+
+
+def build_manufacturing_data(house: House, panel_size: int, summaries: Optional[FloorSummaries] = None) -> dict:
+    """Panel counts and assembly information for a house; pass the app's summaries to reuse unchanged floors"""
+    summaries = summaries or OneShotSummaries(house)
+    floors = [summaries.summary(floor) for floor in house.floors]
+    return manufacturing_data(floors, panel_size, build_cut_list(house, panel_size, summaries),
+                              (house.floors[0].width, house.floors[0].height))
+
+
+def manufacturing_data(floors: Sequence[FloorSummary], panel_size: int, cut_list: List[dict],
+                       footprint: Tuple[int, int]) -> dict:
+    """Manufacturing data from floor summaries and their cut list, without reading the house"""
+    mfg_data = {
+        'version': '1.0',
+        'project': 'House Builder Project',
+        'panel_size': panel_size,
+        'components': []
+    }
+
+    # Count components
+    component_counts = {}
+    for summary in floors:
+        for comp_type, count in summary.component_counts.items():
+            key = comp_type.value
+            component_counts[key] = component_counts.get(key, 0) + count
+
+    # Generate component list with specifications
+    for comp_type, count in component_counts.items():
+        mfg_data['components'].append({
+            'type': comp_type,
+            'quantity': count,
+            'dimensions': f"{panel_size}x{panel_size}",
+            'material': 'standard_panel',
+            'operations': ['cut', 'drill_mounting_holes', 'edge_finish']
+        })
+
+    # Straight runs of the same type are cut as one long panel
+    mfg_data['cut_list'] = cut_list
+    # Which stock sheets to cut them from
+    mfg_data['nesting'] = nest_cut_list(mfg_data['cut_list'], panel_size)
+
+    # Add assembly information
+    mfg_data['assembly'] = {
+        'floors': len(floors),
+        # Same key as the export cache, so floors with equal cells count once however they were edited
+        'distinct_floors': len({summary.content_hash for summary in floors}),
+        'total_components': sum(component_counts.values()),
+        'total_panels': sum(panel['quantity'] for panel in mfg_data['cut_list']),
+        'floor_area': footprint[0] * footprint[1] * panel_size * panel_size
+    }
+    return mfg_data
+
+
+class OneShotSummaries(FloorSummaries):
+    """Summaries for a single export outside the app, not kept current"""
+    def __init__(self, house: House):
+        self.house = house
+        self.cache = {}
+
+
+def _floor_panels(xs: np.ndarray, ys: np.ndarray, type_codes: np.ndarray) -> Dict[Tuple[int, int], int]:
+    runs = find_runs(xs, ys, type_codes)
+    if not len(runs.lengths):
+        return {}
+    panels, counts = np.unique(np.column_stack([runs.type_codes, runs.lengths]), axis=0, return_counts=True)
+    return {(type_code, length): count for (type_code, length), count in zip(panels.tolist(), counts.tolist())}
+
+
+def split_panels(panels: Dict[Tuple[int, int], int], max_cells: int) -> Dict[Tuple[int, int], int]:
+    """Panel counts with runs longer than max_cells cut into pieces of max_cells and one shorter rest"""
+    pieces = {}
+    for (type_code, length), count in panels.items():
+        whole, rest = divmod(length, max_cells)
+        for piece, quantity in (((type_code, max_cells), count * whole), ((type_code, rest), count)):
+            if quantity and piece[1]:
+                pieces[piece] = pieces.get(piece, 0) + quantity
+    return pieces
+
+
+def build_cut_list(house: House, panel_size: int, summaries: Optional[FloorSummaries] = None) -> List[dict]:
+    """Panels to cut, one per straight run of same-type cells, grouped by type and length.
+
+    Runs longer than the largest stock sheet are cut as several panels, so the
+    cut list, the nesting plan and the G-code all cut the same pieces, and the
+    G-code cuts them where the nesting plan placed them.
+    """
+    summaries = summaries or OneShotSummaries(house)
+    quantities = {}
+    for floor in house.floors:
+        for panel, count in summaries.summary(floor).panels.items():
+            quantities[panel] = quantities.get(panel, 0) + count
+    quantities = split_panels(quantities, max_piece_cells(panel_size, stock_sheets()))
+
+    return [{
+        'type': CODE_TYPES[type_code].value,
+        'length': length,
+        'quantity': quantity,
+        'dimensions': f"{length * panel_size}x{panel_size}"
+    } for (type_code, length), quantity in sorted(quantities.items())]
+
+
+def write_manufacturing_data(filename: str, mfg_data: dict):
+    with open(filename, 'w') as f:
+        json.dump(mfg_data, f, indent=2)
+
+
+def _format_mm(value: float) -> str:
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+
+class _GcodeBuffer:
+    """Collects G-code text and writes it to f in large blocks; with no file it only counts the size"""
+    def __init__(self, f: Optional[IO[str]] = None, block_size: int = 1 << 16):
+        self.f = f
+        self.block_size = block_size
+        self.parts: List[str] = []
+        self.pending = 0
+        self.size = 0  # Characters written so far; G-code is ASCII, so also bytes
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.pending += len(text)
+        self.size += len(text)
+        if self.pending >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.f is not None:
+            self.f.write(''.join(self.parts))
+        self.parts = []
+        self.pending = 0
+
+
+def _write_contours(out: _GcodeBuffer, contours, origin=(0.0, 0.0)):
+    """Cut contours, with coordinates relative to origin"""
+    for contour in contours:
+        points = contour.points - origin
+        x, y = (_format_mm(value) for value in points[0])
+        out.write(f"G0 X{x} Y{y} ; Move to {'cutout' if contour.cutout else 'outline'} start\n"
+                  "G0 Z1.0 ; Lower to cutting height\n")
+        out.write(''.join(f"G1 X{_format_mm(x)} Y{_format_mm(y)} F{FEED_RATE:.0f}\n"
+                          for x, y in [*points[1:], points[0]]))
+        out.write("G0 Z5.0 ; Lift Z\n")
+
+
+def _write_program(out: _GcodeBuffer, plan: ToolpathPlan, panel_size: int, subprograms: bool):
+    out.write("; House Builder 3D - G-code Template\n"
+              "; Generated for panel cutting operations\n"
+              f"; Panel size: {panel_size}x{panel_size} units\n"
+              f"; Bed loads: {plan.report['bed_loads']}\n")
+    out.write(''.join(f"; {line}\n" for line in format_report(plan.report)))
+    out.write("\n; Initialize\n"
+              "G21 ; Set units to millimeters\n"
+              "G90 ; Absolute positioning\n"
+              "G0 Z5.0 ; Lift Z\n"
+              "M3 S12000 ; Start spindle\n\n")
+
+    programs = {}  # (type, length) -> (program number, panel cut by it)
+    load = 0
+    for panel in plan.panels:
+        if panel.load != load:
+            load = panel.load
+            if subprograms:
+                out.write("G52 X0 Y0 ; Cancel origin shift\n")
+            out.write(f"; Bed load {load + 1} of {plan.report['bed_loads']}\n"
+                      "M5 ; Stop spindle\n"
+                      "G0 Z50 ; Lift Z to safe height\n"
+                      "G0 X0 Y0 ; Return to home\n"
+                      "M0 ; Pause to load the next sheet\n"
+                      "M3 S12000 ; Start spindle\n\n")
+        out.write(f"; {panel.type}, {panel.length} cells long\n")
+        if not subprograms:
+            _write_contours(out, panel.contours)
+        else:
+            # Same type, length and direction means the same contours relative to the panel corner
+            key = (panel.type, panel.length, panel.rotated)
+            if key not in programs:
+                programs[key] = (SUBPROGRAM_BASE + len(programs), panel)
+            x, y = (_format_mm(value) for value in panel.start)
+            out.write(f"G52 X{x} Y{y} ; Shift origin to the panel corner\n"
+                      f"M98 P{programs[key][0]}\n")
+        out.write("\n")
+
+    out.write("; Finish\n")
+    if subprograms:
+        out.write("G52 X0 Y0 ; Cancel origin shift\n")
+    out.write("M5 ; Stop spindle\n"
+              "G0 Z50 ; Lift Z to safe height\n"
+              "G0 X0 Y0 ; Return to home\n"
+              "M30 ; End program\n")
+
+    for number, panel in programs.values():
+        out.write(f"\nO{number} ; {panel.type}, {panel.length} cells long\n")
+        _write_contours(out, panel.contours, panel.start)
+        out.write("M99\n")
+
+
+def write_sample_gcode(filename: str, mfg_data: dict, panel_size: int, time_budget: float = 1.0,
+                       subprograms: bool = False) -> dict:
+    """Write G-code cutting every panel of the nesting plan in an optimized order; returns the plan's report.
+
+    Each nested sheet is one bed load, with a pause to load the next sheet
+    between them. Without a nesting plan in mfg_data the cut list is nested
+    first. With subprograms, each distinct panel is written once after the main
+    program (O1000, O1001, ...) and called at each panel's corner with G52
+    and M98; the report then compares the size with the inline program.
+    """
+    nesting = mfg_data['nesting'] if 'nesting' in mfg_data else nest_cut_list(mfg_data['cut_list'], panel_size)
+    plan = plan_toolpaths(nesting, panel_size, time_budget)
+    report = dict(plan.report)
+    with open(filename, 'w') as f:
+        out = _GcodeBuffer(f)
+        _write_program(out, plan, panel_size, subprograms)
+        out.flush()
+    report['gcode_bytes'] = out.size
+    if subprograms:
+        inline = _GcodeBuffer()
+        _write_program(inline, plan, panel_size, subprograms=False)
+        report['gcode_bytes_inline'] = inline.size
+        report['gcode_size_reduction'] = round(1 - out.size / inline.size, 4)
+    return report
+
+
+def export_manufacturing(house: House, filename: str, panel_size: int, subprograms: bool = False) -> Tuple[str, str]:
+    """Write the .mfg specification and its companion .gcode file; returns both paths"""
+    mfg_data = build_manufacturing_data(house, panel_size)
+    write_manufacturing_data(filename, mfg_data)
+    gcode_filename = os.path.splitext(filename)[0] + '.gcode'
+    write_sample_gcode(gcode_filename, mfg_data, panel_size, subprograms=subprograms)
+    return filename, gcode_filename
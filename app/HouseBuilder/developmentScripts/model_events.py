@@ -0,0 +1,109 @@
+"""Change notifications for House and Floor.
+
+Every mutation of a house or one of its floors emits a typed event on the
+house's ChangeBus. Subscribers are called with a list of events. Inside
+``with bus.batch():`` delivery waits until the outermost batch ends, and the
+cell events of each floor are merged, so a bulk edit reaches subscribers as
+one CellsChanged per floor.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, List
+
+import numpy as np
+
+
+@dataclass
+class CellsChanged:
+    floor: Any  # house_model.Floor
+    xs: np.ndarray
+    ys: np.ndarray
+
+
+@dataclass
+class FloorAdded:
+    floor: Any
+    index: int
+
+
+@dataclass
+class FloorRemoved:
+    floor: Any
+    index: int
+
+
+@dataclass
+class FloorsRenumbered:
+    """Floors above a removed one moved down; floor_number matches the list index again"""
+
+
+@dataclass
+class FloorsReplaced:
+    """The whole floor list was replaced, e.g. by loading a project"""
+
+
+ChangeEvent = Any  # One of the event classes above
+Subscriber = Callable[[List[ChangeEvent]], None]
+
+
+class ChangeBus:
+    def __init__(self):
+        self.subscribers: List[Subscriber] = []
+        self.queued: List[ChangeEvent] = []
+        self.depth = 0
+
+    def subscribe(self, callback: Subscriber) -> Subscriber:
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Subscriber):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    @contextmanager
+    def batch(self):
+        """Hold back delivery until the outermost batch ends"""
+        self.depth += 1
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.flush()
+
+    def emit(self, event: ChangeEvent):
+        self.queued.append(event)
+        if self.depth == 0:
+            self.flush()
+
+    def flush(self):
+        events, self.queued = _coalesce(self.queued), []
+        if not events:
+            return
+        for callback in list(self.subscribers):
+            callback(events)
+
+
+def _coalesce(events: List[ChangeEvent]) -> List[ChangeEvent]:
+    """Merge the cell events of each floor into the first one; a floor list replacement supersedes earlier events"""
+    for index in range(len(events) - 1, -1, -1):
+        if isinstance(events[index], FloorsReplaced):
+            events = events[index:]
+            break
+
+    merged = []
+    cells = {}  # id(floor) -> (position in merged, [(xs, ys), ...])
+    for event in events:
+        if isinstance(event, CellsChanged):
+            if id(event.floor) not in cells:
+                cells[id(event.floor)] = (len(merged), [])
+                merged.append(event)
+            cells[id(event.floor)][1].append((event.xs, event.ys))
+        elif not (isinstance(event, FloorsRenumbered) and merged and isinstance(merged[-1], FloorsRenumbered)):
+            merged.append(event)
+
+    for position, parts in cells.values():
+        if len(parts) > 1:
+            merged[position] = CellsChanged(merged[position].floor, np.concatenate([part[0] for part in parts]),
+                                            np.concatenate([part[1] for part in parts]))
+    return merged
@@ -0,0 +1,272 @@
+"""Nesting the panels of a cut list onto stock sheets.
+
+Panels longer than the largest sheet are split into pieces that fit. The
+pieces are packed with a guillotine heuristic: each goes into the free
+rectangle of an open sheet it fits most tightly (best short side), turned if
+that fits better, and the rest of that rectangle is split in two. A new
+sheet is opened only when no free rectangle takes it, of the first stock
+size in the pass's preference order that the piece fits. The first passes
+pack the largest pieces first, once preferring each stock size; further
+passes jitter the order, the preference and the split rule from a seeded
+generator, and the plan using the least stock wins. Runs of equal pieces
+share a heap of the open sheets' best fits, and a sheet with no room left
+for the smallest remaining piece is no longer searched. The same seed and
+pass count give the same plan; the time budget only cuts the search short,
+abandoning a pass that is still running, but the first pass always finishes.
+"""
+import heapq
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from component_specs import ComponentSpec, load_component_specs
+from toolpath import CUTOUTS
+
+FOOT_MM = 304.8
+KERF_MM = 5.0  # Saw or router kerf left between pieces
+MIN_OFFCUT_MM = 300.0  # Offcuts smaller than this on either side are scrap
+
+
+class Stock(NamedTuple):
+    sku: str
+    width: float  # mm
+    height: float
+
+    @classmethod
+    def from_spec(cls, spec: ComponentSpec) -> 'Stock':
+        return cls(spec.sku, spec.width * FOOT_MM, spec.height * FOOT_MM)
+
+    @property
+    def area(self) -> float:
+        return self.width * self.height
+
+
+class Piece(NamedTuple):
+    """One part to cut: a whole panel or a section of a panel too long for any sheet"""
+    type: str
+    cells: int
+    width: float  # mm, along the run
+    height: float
+    cutout_area: float  # Door and window openings dropped out of the piece
+
+
+class Placement(NamedTuple):
+    piece: Piece
+    x: float
+    y: float
+    rotated: bool  # Width runs along the sheet's height
+
+
+class _Sheet:
+    def __init__(self, stock: Stock):
+        self.stock = stock
+        # Free rectangles (x, y, width, height), with room for the kerf past the sheet edge
+        self.free: List[Tuple[float, float, float, float]] = [(0.0, 0.0, stock.width + KERF_MM,
+                                                                stock.height + KERF_MM)]
+        self.leftover: List[Tuple[float, float, float, float]] = []  # Free rectangles too small for any piece
+        self.placements: List[Placement] = []
+
+
+def stock_sheets(specs: Optional[Sequence[ComponentSpec]] = None) -> List[Stock]:
+    """Stock sizes from the component catalog, smallest first"""
+    specs = load_component_specs() if specs is None else specs
+    return sorted((Stock.from_spec(spec) for spec in specs), key=lambda stock: stock.area)
+
+
+def max_piece_cells(panel_size: int, stocks: Sequence[Stock]) -> int:
+    """Most cells of a run that fit on the largest sheet; longer runs are cut in pieces this long"""
+    cell_mm = panel_size * 100  # 1 unit = 100mm
+    longest = max(max(stock.width, stock.height) for stock in stocks)
+    shortest_fit = max(min(stock.width, stock.height) for stock in stocks)
+    if cell_mm > shortest_fit:
+        raise ValueError(f"A {cell_mm:.0f}mm panel does not fit on any stock sheet")
+    return max(int((longest + KERF_MM) // (cell_mm + KERF_MM)), 1)
+
+
+def cut_pieces(cut_list: Sequence[dict], panel_size: int, stocks: Sequence[Stock]) -> List[Piece]:
+    """Every piece to cut for a cut list, splitting runs longer than the largest sheet"""
+    cell_mm = panel_size * 100  # 1 unit = 100mm
+    max_cells = max_piece_cells(panel_size, stocks)
+
+    pieces = []
+    for entry in cut_list:
+        fx0, fy0, fx1, fy1 = CUTOUTS.get(entry['type'], (0, 0, 0, 0))
+        opening = (fx1 - fx0) * (fy1 - fy0) * cell_mm * cell_mm
+        sections = [max_cells] * (entry['length'] // max_cells)
+        if entry['length'] % max_cells:
+            sections.append(entry['length'] % max_cells)
+        for _ in range(entry['quantity']):
+            pieces.extend(Piece(entry['type'], cells, cells * cell_mm, cell_mm, cells * opening)
+                          for cells in sections)
+    return pieces
+
+
+def _fits_any(sheet: _Sheet, short_side: float, long_side: float) -> bool:
+    return any(min(w, h) >= short_side and max(w, h) >= long_side for _, _, w, h in sheet.free)
+
+
+def _best_fit(sheet: _Sheet, width: float, height: float) -> Optional[Tuple[float, float, int, bool]]:
+    """(short side leftover, long side leftover, free index, rotated) of the tightest free rectangle, or None"""
+    best = None
+    for index, (_, _, free_width, free_height) in enumerate(sheet.free):
+        for rotated, (w, h) in ((False, (width, height)), (True, (height, width))):
+            if w <= free_width and h <= free_height:
+                leftover = tuple(sorted((free_width - w, free_height - h)))
+                if best is None or leftover < best[:2]:
+                    best = (leftover[0], leftover[1], index, rotated)
+    return best
+
+
+def _pack(pieces: Sequence[Piece], stocks: Sequence[Stock], split_shorter: bool,
+          deadline: Optional[float] = None) -> Optional[List[_Sheet]]:
+    """One guillotine packing; new sheets are the first of stocks the piece fits. None once past the deadline"""
+    sheets: List[_Sheet] = []
+    open_sheets: Dict[int, _Sheet] = {}  # Sheet index -> sheet with room for some remaining piece
+    # Free rectangles narrower than every piece are set aside rather than searched again
+    narrowest = min((min(piece.width, piece.height) for piece in pieces), default=0) + KERF_MM
+    # Shortest short and long sides of the pieces from each index on
+    smallest = [(0.0, 0.0)] * len(pieces)
+    for index in range(len(pieces) - 1, -1, -1):
+        short_side, long_side = sorted((pieces[index].width + KERF_MM, pieces[index].height + KERF_MM))
+        if index + 1 < len(pieces):
+            short_side, long_side = min(short_side, smallest[index + 1][0]), min(long_side, smallest[index + 1][1])
+        smallest[index] = (short_side, long_side)
+
+    size = None
+    fits = []  # Heap of (best fit, sheet index) over the open sheets for pieces of this size
+    for piece_index, piece in enumerate(pieces):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        width, height = piece.width + KERF_MM, piece.height + KERF_MM
+        if (width, height) != size:
+            if piece_index and smallest[piece_index] != smallest[piece_index - 1]:
+                # The smallest remaining piece grew: retire the sheets that cannot take it
+                open_sheets = {sheet_index: sheet for sheet_index, sheet in open_sheets.items()
+                               if _fits_any(sheet, *smallest[piece_index])}
+            # Runs of equal pieces (most of a cut list) share one heap, so a piece does not search every sheet
+            size = (width, height)
+            fits = [(fit[0], fit[1], sheet_index, fit[2], fit[3]) for sheet_index, fit in
+                    ((sheet_index, _best_fit(sheet, width, height)) for sheet_index, sheet in open_sheets.items())
+                    if fit is not None]
+            heapq.heapify(fits)
+
+        if fits:
+            _, _, sheet_index, index, rotated = heapq.heappop(fits)
+            sheet = sheets[sheet_index]
+        else:
+            stock = next((stock for stock in stocks if max(width, height) <= max(stock.width, stock.height) + KERF_MM
+                          and min(width, height) <= min(stock.width, stock.height) + KERF_MM), None)
+            if stock is None:
+                raise ValueError(f"A {piece.width:.0f}x{piece.height:.0f}mm piece does not fit on any stock sheet")
+            sheet = _Sheet(stock)
+            sheet_index = len(sheets)
+            sheets.append(sheet)
+            open_sheets[sheet_index] = sheet
+            index, rotated = 0, not (width <= stock.width + KERF_MM and height <= stock.height + KERF_MM)
+
+        x, y, free_width, free_height = sheet.free.pop(index)
+        w, h = (height, width) if rotated else (width, height)
+        sheet.placements.append(Placement(piece, x, y, rotated))
+        # Split the rest of the free rectangle along the shorter (or longer) leftover side
+        if (free_width - w < free_height - h) == split_shorter:
+            right, top = (x + w, y, free_width - w, h), (x, y + h, free_width, free_height - h)
+        else:
+            right, top = (x + w, y, free_width - w, free_height), (x, y + h, w, free_height - h)
+        for rect in (right, top):
+            if min(rect[2], rect[3]) >= narrowest:
+                sheet.free.append(rect)
+            elif rect[2] > 0 and rect[3] > 0:
+                sheet.leftover.append(rect)
+
+        if piece_index + 1 < len(pieces) and not _fits_any(sheet, *smallest[piece_index + 1]):
+            del open_sheets[sheet_index]
+            continue
+        fit = _best_fit(sheet, width, height)
+        if fit is not None:
+            heapq.heappush(fits, (fit[0], fit[1], sheet_index, fit[2], fit[3]))
+    return sheets
+
+
+def _stock_area(sheets: List[_Sheet]) -> Tuple[float, int]:
+    return sum(sheet.stock.area for sheet in sheets), len(sheets)
+
+
+def nest_pieces(pieces: Sequence[Piece], stocks: Sequence[Stock], seed: int = 0, passes: int = 50,
+                time_budget: float = 1.0) -> List[_Sheet]:
+    """Pack pieces onto as little stock as the search finds"""
+    deadline = time.perf_counter() + time_budget
+    order = sorted(pieces, key=lambda piece: (-piece.width * piece.height, -piece.width))
+    best = None
+    for preferred in stocks:
+        # The first pass always finishes so there is a plan; the rest stop at the deadline
+        sheets = _pack(order, [preferred] + [stock for stock in stocks if stock is not preferred], True,
+                       deadline if best is not None else None)
+        if sheets is None:
+            return best
+        if best is None or _stock_area(sheets) < _stock_area(best):
+            best = sheets
+
+    generator = random.Random(seed)
+    for _ in range(passes):
+        if time.perf_counter() > deadline:
+            break
+        # Largest first, but with pieces of similar size in random order
+        keys = [-piece.width * piece.height * generator.uniform(0.8, 1.2) for piece in pieces]
+        order = [pieces[index] for index in sorted(range(len(pieces)), key=keys.__getitem__)]
+        preference = generator.sample(list(stocks), len(stocks))
+        sheets = _pack(order, preference, generator.random() < 0.5, deadline)
+        if sheets is None:
+            break
+        if _stock_area(sheets) < _stock_area(best):
+            best = sheets
+    return best
+
+
+def nest_cut_list(cut_list: Sequence[dict], panel_size: int, specs: Optional[Sequence[ComponentSpec]] = None,
+                  seed: int = 0, passes: int = 50, time_budget: float = 1.0) -> dict:
+    """Sheet plan for a cut list: sheets used, utilization per sheet and reusable offcuts"""
+    stocks = stock_sheets(specs)
+    pieces = cut_pieces(cut_list, panel_size, stocks)
+    sheets = nest_pieces(pieces, stocks, seed, passes, time_budget)
+
+    plan_sheets = []
+    offcuts = []
+    for sheet_index, sheet in enumerate(sheets):
+        used = sum(p.piece.width * p.piece.height - p.piece.cutout_area for p in sheet.placements)
+        plan_sheets.append({
+            'sku': sheet.stock.sku,
+            'dimensions': f"{sheet.stock.width:.0f}x{sheet.stock.height:.0f}",
+            'utilization': round(used / sheet.stock.area, 4),
+            'parts': [{
+                'type': p.piece.type,
+                'cells': p.piece.cells,
+                'x': round(p.x, 1),
+                'y': round(p.y, 1),
+                'width': round(p.piece.width, 1),
+                'height': round(p.piece.height, 1),
+                'rotated': p.rotated
+            } for p in sheet.placements]
+        })
+        for x, y, width, height in sheet.free + sheet.leftover:
+            # Trim the kerf allowance back off at the sheet edges
+            width, height = min(width, sheet.stock.width - x), min(height, sheet.stock.height - y)
+            if min(width, height) >= MIN_OFFCUT_MM:
+                offcuts.append({'sheet': sheet_index, 'x': round(x, 1), 'y': round(y, 1),
+                                'width': round(width, 1), 'height': round(height, 1)})
+
+    stock_area = sum(sheet.stock.area for sheet in sheets)
+    used_area = sum(p.piece.width * p.piece.height - p.piece.cutout_area
+                    for sheet in sheets for p in sheet.placements)
+    counts = {}
+    for sheet in sheets:
+        counts[sheet.stock.sku] = counts.get(sheet.stock.sku, 0) + 1
+    return {
+        'seed': seed,
+        'sheet_count': len(sheets),
+        'sheets_by_sku': counts,
+        'utilization': round(used_area / stock_area, 4) if stock_area else 0.0,
+        'sheets': plan_sheets,
+        'offcuts': offcuts,
+        'offcut_area_m2': round(sum(o['width'] * o['height'] for o in offcuts) / 1e6, 3),
+        'cutout_area_m2': round(sum(p.piece.cutout_area for sheet in sheets for p in sheet.placements) / 1e6, 3)
+    }
@@ -0,0 +1,365 @@
+"""Reading and writing House Builder project files.
+
+Two formats are supported:
+
+* JSON (``.json``): the interchange format, one object per component. It is
+  written and read as a stream, floor by floor, without building the whole
+  document as a dict or string first.
+* Binary (``.hbp``): a small JSON header followed by each floor's packed
+  type/rotation planes, optionally zlib-compressed. Loading memory-maps the
+  file and only decodes a floor the first time its grid is used. Floors that
+  share their cells (see Floor.copy) are stored once and share them again
+  when loaded.
+
+``load_project`` detects the format from the file contents.
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections import Counter
+from typing import IO, List, Optional, Tuple
+
+from floor_grid import pack_grid, unpack_grid
+from house_model import CODE_TYPES, TYPE_CODES, ComponentType, Floor, House
+
+BINARY_MAGIC = b"HBPROJ"
+BINARY_VERSION = 1
+BINARY_EXTENSION = ".hbp"
+# magic, format version, header length
+_PREAMBLE = struct.Struct('<6sHI')
+# Components formatted per write when streaming JSON
+_JSON_BATCH_SIZE = 4096
+
+
+def save_project(house: House, filename: str):
+    """Save as binary when the filename ends in .hbp, JSON otherwise"""
+    if filename.lower().endswith(BINARY_EXTENSION):
+        save_binary(house, filename)
+        return
+    with open(filename, 'w') as f:
+        write_json_stream(house, f)
+
+
+def load_project(filename: str) -> House:
+    with open(filename, 'rb') as f:
+        is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if is_binary:
+        return load_binary(filename)
+    with open(filename, 'r') as f:
+        return read_json_stream(f)
+
+
+def save_binary(house: House, filename: str, compress: bool = True, metadata: Optional[dict] = None):
+    # Encode every floor before touching the file, so saving over a project
+    # that is still memory-mapped never truncates data not yet decoded
+    header, blobs = pack_house(house, metadata)
+    write_packed(filename, header, blobs, compress)
+
+
+def pack_house(house: House, metadata: Optional[dict] = None) -> Tuple[dict, List[bytes]]:
+    """Copy every floor's cells into uncompressed blobs, plus the header describing them.
+
+    This is the only step that reads the house, so the (slower) write_packed can
+    run on another thread while editing continues. A floor with the same cells
+    as an earlier one gets no blob of its own; its header entry names the
+    earlier floor in 'same_as'.
+    """
+    floors = []
+    blobs = []
+    first_with_revision = {}
+    for index, floor in enumerate(house.floors):
+        floor_info = {
+            'floor_number': floor.floor_number,
+            'width': floor.width,
+            'height': floor.height
+        }
+        source = first_with_revision.setdefault(floor.revision, index)
+        if source != index:
+            floor_info['same_as'] = source
+        else:
+            floor_info['encoding'], data = pack_grid(floor.grid)
+            blobs.append(data)
+        floors.append(floor_info)
+
+    header = {
+        'current_floor_index': house.current_floor_index,
+        'floors': floors
+    }
+    if metadata:
+        header['metadata'] = metadata
+    return header, blobs
+
+
+def write_packed(filename: str, header: dict, blobs: List[bytes], compress: bool = True):
+    """Write pack_house output as a binary project, atomically replacing filename"""
+    floors = []
+    offset = 0
+    if compress:
+        blobs = [zlib.compress(data) for data in blobs]
+    unwritten = iter(blobs)
+    for floor_info in header['floors']:
+        if 'same_as' in floor_info:
+            # Point at the earlier floor's blob, so readers that ignore same_as still load the cells
+            source = floors[floor_info['same_as']]
+            floors.append(dict(source, **floor_info))
+            continue
+        data = next(unwritten)
+        floors.append(dict(floor_info, compression='zlib' if compress else 'none', offset=offset,
+                           length=len(data)))
+        offset += len(data)
+    header_bytes = json.dumps(dict(header, floors=floors)).encode('utf-8')
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(_PREAMBLE.pack(BINARY_MAGIC, BINARY_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for data in blobs:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filename, filename)
+
+
+def read_binary_header(filename: str) -> dict:
+    """The JSON header of a binary project (floor layout and any saved metadata)"""
+    with open(filename, 'rb') as f:
+        magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{filename} is not a House Builder binary project")
+        return json.loads(f.read(header_length))
+
+
+class _MappedProject:
+    """Keeps a binary project mapped until every floor has been decoded"""
+
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self.map)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{filename} is not a House Builder binary project")
+        if version > BINARY_VERSION:
+            raise ValueError(f"{filename} uses binary format version {version}, "
+                             f"newer than the supported version {BINARY_VERSION}")
+        header_start = _PREAMBLE.size
+        self.header = json.loads(self.map[header_start:header_start + header_length])
+        self.data_start = header_start + header_length
+        # Floors stored once for several floors are decoded once, and each of them gets a share of the grid
+        self.users = Counter(floor_info['offset'] for floor_info in self.header['floors'])
+        self.shared = {}  # offset -> decoded grid the floors at that offset share
+        self.pending = len(self.users)
+
+    def loader(self, floor_info: dict):
+        def load():
+            offset = floor_info['offset']
+            if offset in self.shared:
+                return self.shared[offset].share()
+            start = self.data_start + offset
+            with memoryview(self.map)[start:start + floor_info['length']] as data:
+                if floor_info['compression'] == 'zlib':
+                    data = zlib.decompress(data)
+                grid = unpack_grid(floor_info['encoding'], floor_info['width'], floor_info['height'], data)
+            self.pending -= 1
+            if self.pending == 0:
+                self.map.close()
+            if self.users[offset] == 1:
+                return grid
+            self.shared[offset] = grid
+            return grid.share()
+        return load
+
+
+def load_binary(filename: str) -> House:
+    project = _MappedProject(filename)
+    house = House()
+    house.floors = [
+        Floor(info['floor_number'], info['width'], info['height'], grid_loader=project.loader(info))
+        for info in project.header['floors']
+    ]
+    house.current_floor_index = project.header['current_floor_index']
+    if not house.floors:
+        project.map.close()
+    return house
+
+
+def write_json_stream(house: House, f: IO[str]):
+    """Write the House.to_dict() document one floor and one batch of components at a time"""
+    type_names = {code: comp_type.value for code, comp_type in CODE_TYPES.items()}
+    f.write('{\n  "floors": [')
+    for floor_index, floor in enumerate(house.floors):
+        f.write(',\n    {\n' if floor_index else '\n    {\n')
+        f.write(f'      "floor_number": {floor.floor_number},\n'
+                f'      "width": {floor.width},\n'
+                f'      "height": {floor.height},\n'
+                f'      "components": [')
+
+        xs, ys, type_codes, rotation_codes = floor.grid.occupied()
+        for start in range(0, len(xs), _JSON_BATCH_SIZE):
+            end = start + _JSON_BATCH_SIZE
+            rows = zip(xs[start:end].tolist(), ys[start:end].tolist(), type_codes[start:end].tolist(),
+                       rotation_codes[start:end].tolist())
+            f.write(',' if start else '')
+            f.write(','.join(f'\n        {{"type": "{type_names[type_code]}", "x": {x}, "y": {y}, '
+                             f'"rotation": {rotation_code * 90}}}'
+                             for x, y, type_code, rotation_code in rows))
+        f.write('\n      ]\n    }' if len(xs) else ']\n    }')
+    f.write(f'\n  ],\n  "current_floor_index": {house.current_floor_index}\n}}\n')
+
+
+class _JsonStreamReader:
+    """Pull parser over a text stream that decodes one small JSON value at a time"""
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at end of input)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in project JSON, found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def accept(self, char: str) -> bool:
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number or literal at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def object_keys(self):
+        """Iterate over the keys of the object at the cursor; the caller consumes each value"""
+        self.expect('{')
+        if self.accept('}'):
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.accept('}'):
+                return
+            self.expect(',')
+
+    def array_items(self):
+        """Iterate once per element of the array at the cursor; the caller consumes each element"""
+        self.expect('[')
+        if self.accept(']'):
+            return
+        while True:
+            yield
+            if self.accept(']'):
+                return
+            self.expect(',')
+
+    def object_batches(self):
+        """Iterate over an array of flat objects, yielding lists of as many as the buffer holds"""
+        self.expect('[')
+        while not self.accept(']'):
+            limit = self.buffer.find(']', self.pos)
+            end = self.buffer.rfind('}', self.pos, len(self.buffer) if limit < 0 else limit)
+            if end < 0 and limit < 0 and not self.eof:
+                self.fill()
+                continue
+
+            batch = None
+            if end >= 0:
+                try:
+                    batch = json.loads('[' + self.buffer[self.pos:end + 1] + ']')
+                    self.pos = end + 1
+                except json.JSONDecodeError:
+                    pass
+            if batch is None:
+                # Not a clean run of flat objects, fall back to one element at a time
+                batch = [self.value()]
+            yield batch
+            if not self.accept(','):
+                self.expect(']')
+                return
+
+
+def read_json_stream(f: IO[str]) -> House:
+    """Build a House from a project JSON stream, filling each floor while it is parsed"""
+    reader = _JsonStreamReader(f)
+    house = House()
+    current_floor_index = 0
+    for key in reader.object_keys():
+        if key == 'floors':
+            house.floors = [_read_floor(reader) for _ in reader.array_items()]
+        elif key == 'current_floor_index':
+            current_floor_index = reader.value()
+        else:
+            reader.value()
+    house.current_floor_index = current_floor_index
+    return house
+
+
+def _read_floor(reader: _JsonStreamReader) -> Floor:
+    info = {}
+    floor: Optional[Floor] = None
+    pending = []  # Component batches seen before the floor size was known
+    for key in reader.object_keys():
+        if key == 'components':
+            for batch in reader.object_batches():
+                if floor is None and {'floor_number', 'width', 'height'} <= info.keys():
+                    floor = Floor(info['floor_number'], info['width'], info['height'])
+                if floor is None:
+                    pending.append(batch)
+                else:
+                    _add_component_batch(floor, batch)
+        else:
+            info[key] = reader.value()
+
+    if floor is None:
+        floor = Floor(info['floor_number'], info['width'], info['height'])
+    for batch in pending:
+        _add_component_batch(floor, batch)
+    return floor
+
+
+def _add_component_batch(floor: Floor, batch: list):
+    """Apply a list of component dicts (as in Component.to_dict) to a floor in one vectorized write.
+
+    Components outside the floor are skipped with a warning.
+    """
+    floor.load_cells([comp['x'] for comp in batch],
+                     [comp['y'] for comp in batch],
+                     [TYPE_CODES[ComponentType(comp['type'])] for comp in batch],
+                     [comp.get('rotation', 0) // 90 % 4 for comp in batch])
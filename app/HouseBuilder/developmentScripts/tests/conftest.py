@@ -0,0 +1,5 @@
+"""The development scripts are flat modules run from their own directory; make them importable here."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
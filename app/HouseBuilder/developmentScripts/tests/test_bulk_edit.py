@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from bulk_edit import EditTransaction
+from house_model import ComponentType, Floor, House
+
+
+def _house(storage=None):
+    house = House()
+    house.floors = [Floor(0, 12, 8, storage=storage)]
+    return house
+
+
+def _cells(floor):
+    return [column.tolist() for column in floor.grid.occupied()]
+
+
+def test_commit_writes_once_per_floor_with_last_value():
+    house = _house()
+    house.add_floor()
+    calls = []
+
+    def write(floor, xs, ys, type_codes, rotation_codes):
+        calls.append(floor)
+        floor.set_cells(xs, ys, type_codes, rotation_codes)
+
+    with EditTransaction(house, write) as edit:
+        edit.fill_rect(house.floors[0], 0, 0, 4, 2, ComponentType.WALL_PANEL)
+        edit.set_cells(house.floors[0], [1], [1], 2, 1)
+        edit.set_cells(house.floors[1], [5], [5], 3)
+        # Reads inside the transaction see its pending edits
+        assert edit.get_cells(house.floors[0], [1, 2], [1, 1])[0].tolist() == [2, 1]
+        assert house.floors[0].component_counts() == {}
+
+    assert calls == house.floors
+    assert house.floors[0].get_cells([1, 2], [1, 1])[0].tolist() == [2, 1]
+    assert house.floors[0].get_cells([1], [1])[1].tolist() == [1]
+    assert sum(house.floors[0].component_counts().values()) == 8
+    assert house.floors[1].get_cells([5], [5])[0].tolist() == [3]
+
+
+def test_exception_rolls_back():
+    house = _house()
+    house.floors[0].set_cells([3], [3], [1], [0])
+    before = _cells(house.floors[0])
+    with pytest.raises(RuntimeError):
+        with EditTransaction(house) as edit:
+            edit.fill_rect(house.floors[0], 0, 0, 12, 8, ComponentType.FLOOR_PANEL)
+            edit.clear_floor(house.floors[0])
+            raise RuntimeError("abandon")
+    assert _cells(house.floors[0]) == before
+    assert not edit.pending and not edit.merged
+
+
+def test_rollback_drops_pending_edits():
+    house = _house()
+    edit = EditTransaction(house)
+    edit.fill_rect(house.floors[0], 0, 0, 3, 3, ComponentType.WALL_PANEL)
+    edit.rollback()
+    assert edit.commit() == {}
+    assert house.floors[0].component_counts() == {}
+
+
+def test_rejects_cells_outside_or_foreign_floors():
+    house = _house()
+    with EditTransaction(house) as edit:
+        with pytest.raises(IndexError):
+            edit.set_cells(house.floors[0], [12], [0], 1)
+        with pytest.raises(ValueError):
+            edit.set_cells(Floor(5, 12, 8), [0], [0], 1)
+    assert house.floors[0].component_counts() == {}
+
+
+@pytest.mark.parametrize('storage', ['dense', 'chunked'])
+def test_flood_fill_stops_at_other_types(storage):
+    house = _house(storage)
+    floor = house.floors[0]
+    with EditTransaction(house) as edit:
+        edit.fill_rect(floor, 2, 1, 8, 6, ComponentType.WALL_PANEL, outline=True)
+    with EditTransaction(house) as edit:
+        filled = edit.flood_fill(floor, 4, 3, ComponentType.FLOOR_PANEL)
+        # A second fill in the same transaction sees the first
+        assert edit.flood_fill(floor, 4, 3, ComponentType.FLOOR_PANEL) == 0
+    assert filled == 4 * 3
+    types, _ = floor.get_cells(*np.mgrid[0:12, 0:8].reshape(2, -1))
+    assert np.count_nonzero(types == 4) == 12 and np.count_nonzero(types == 1) == 6 * 2 + 3 * 2
@@ -0,0 +1,91 @@
+import numpy as np
+
+from history import EditHistory
+from house_model import Floor, House
+
+
+def _house(width=20, height=10):
+    house = House()
+    house.floors = [Floor(0, width, height)]
+    return house
+
+
+def _cells(floor):
+    return [column.tolist() for column in floor.grid.occupied()]
+
+
+def test_undo_redo_round_trip():
+    house = _house()
+    floor = house.floors[0]
+    history = EditHistory()
+    snapshots = [_cells(floor)]
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        xs, ys = rng.integers(0, 20, 8), rng.integers(0, 10, 8)
+        history.set_cells(floor, xs, ys, rng.integers(0, 5, 8), rng.integers(0, 4, 8))
+        snapshots.append(_cells(floor))
+
+    for expected in reversed(snapshots[:-1]):
+        assert history.undo(house) is not None
+        assert _cells(floor) == expected
+    assert history.undo(house) is None
+    for expected in snapshots[1:]:
+        assert history.redo(house) is not None
+        assert _cells(floor) == expected
+    assert not history.can_redo()
+
+
+def test_grouped_step_keeps_first_old_and_last_new_value():
+    house = _house()
+    floor = house.floors[0]
+    history = EditHistory()
+    history.begin_step("Stroke")
+    history.set_cells(floor, [1, 2], [1, 1], [1, 1], [0, 0])
+    history.set_cells(floor, [2, 3], [1, 1], [2, 2], [1, 1])
+    history.set_cells(floor, [1], [1], [0], [0])  # Back to empty: no change left for this cell
+    history.end_step()
+
+    assert len(history.undo_steps) == 1
+    step = history.undo_steps[0]
+    assert step.label == "Stroke" and sorted(step.deltas[0].indices.tolist()) == [22, 23]
+    history.undo(house)
+    assert _cells(floor) == [[], [], [], []]
+    history.redo(house)
+    assert _cells(floor) == [[2, 3], [1, 1], [2, 2], [1, 1]]
+
+
+def test_new_edit_drops_redo_steps():
+    house = _house()
+    floor = house.floors[0]
+    history = EditHistory()
+    history.set_cells(floor, [0], [0], [1], [0])
+    history.undo(house)
+    history.set_cells(floor, [5], [5], [3], [0])
+    assert not history.can_redo()
+    assert history.nbytes == sum(step.nbytes for step in history.undo_steps)
+
+
+def test_memory_cap_evicts_oldest_steps():
+    house = _house(100, 100)
+    floor = house.floors[0]
+    history = EditHistory(max_bytes=4000)
+    for row in range(30):
+        history.set_cells(floor, np.arange(100), np.full(100, row), np.ones(100), np.zeros(100))
+
+    assert history.nbytes <= history.max_bytes
+    assert history.nbytes == sum(step.nbytes for step in history.undo_steps)
+    kept = len(history.undo_steps)
+    assert 0 < kept < 30
+    while history.undo(house):
+        pass
+    # Only the evicted rows are left; every step still held was undone
+    assert sorted(set(floor.grid.occupied()[1].tolist())) == list(range(30 - kept))
+
+
+def test_memory_cap_keeps_newest_step():
+    house = _house(100, 100)
+    history = EditHistory(max_bytes=10)
+    history.set_cells(house.floors[0], np.arange(100), np.zeros(100), np.ones(100), np.zeros(100))
+    assert len(history.undo_steps) == 1
+    history.undo(house)
+    assert house.floors[0].component_counts() == {}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import house_diff
+from house_model import Floor, House
+
+
+def _planes(floor, width, height):
+    types = np.zeros((height, width), dtype=np.uint8)
+    rotations = np.zeros_like(types)
+    if floor is not None:
+        xs, ys, type_codes, rotation_codes = floor.grid.occupied()
+        types[ys, xs], rotations[ys, xs] = type_codes, rotation_codes
+    return types, rotations
+
+
+def _brute_force(old, new):
+    width = max(floor.width for floor in (old, new) if floor is not None)
+    height = max(floor.height for floor in (old, new) if floor is not None)
+    (old_types, old_rotations), (new_types, new_rotations) = _planes(old, width, height), _planes(new, width, height)
+    ys, xs = np.nonzero((old_types != new_types) | (old_rotations != new_rotations))
+    return [(x, y, old_types[y, x], old_rotations[y, x], new_types[y, x], new_rotations[y, x])
+            for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def _as_rows(diff):
+    return list(zip(diff.xs.tolist(), diff.ys.tolist(), diff.old_types.tolist(), diff.old_rotations.tolist(),
+                    diff.new_types.tolist(), diff.new_rotations.tolist()))
+
+
+def _scatter(floor, rng, count):
+    xs, ys = rng.integers(0, floor.width, count), rng.integers(0, floor.height, count)
+    floor.set_cells(xs, ys, rng.integers(0, 5, count), rng.integers(0, 4, count))
+
+
+@pytest.mark.parametrize('old_storage, new_storage', [('dense', 'dense'), ('chunked', 'chunked'),
+                                                      ('dense', 'chunked'), ('chunked', 'dense')])
+@pytest.mark.parametrize('seed', range(3))
+def test_tile_diff_matches_cell_by_cell(old_storage, new_storage, seed):
+    rng = np.random.default_rng(seed)
+    old = Floor(0, 150, 140, storage=old_storage)
+    _scatter(old, rng, 600)
+    new = Floor(0, 150, 140, storage=new_storage)
+    xs, ys, type_codes, rotation_codes = old.grid.occupied()
+    new.set_cells(xs, ys, type_codes, rotation_codes)
+    _scatter(new, rng, 40)
+    diff = house_diff.diff_floors(old, new, 0)
+    assert _as_rows(diff) == _brute_force(old, new)
+    assert diff.tiles_compared <= diff.tiles
+
+
+@pytest.mark.parametrize('storage', ['dense', 'chunked'])
+def test_copies_compare_only_edited_tiles(storage):
+    rng = np.random.default_rng(7)
+    old = Floor(0, 300, 300, storage=storage)
+    _scatter(old, rng, 2000)
+    new = old.copy(0)
+    assert len(house_diff.diff_floors(old, new, 0).xs) == 0
+    new.set_cells([5, 250], [5, 250], [1, 2], [0, 1])
+    diff = house_diff.diff_floors(old, new, 0)
+    assert _as_rows(diff) == _brute_force(old, new)
+    assert diff.tiles_compared <= 2
+
+
+def test_floors_of_different_sizes_and_missing_floors():
+    rng = np.random.default_rng(2)
+    old, new = Floor(0, 70, 90), Floor(0, 130, 40, storage='chunked')
+    _scatter(old, rng, 300)
+    _scatter(new, rng, 300)
+    assert _as_rows(house_diff.diff_floors(old, new, 0)) == _brute_force(old, new)
+    assert _as_rows(house_diff.diff_floors(None, new, 0)) == _brute_force(None, new)
+    assert _as_rows(house_diff.diff_floors(old, None, 0)) == _brute_force(old, None)
+
+
+def test_resize_with_equal_cells_is_a_difference():
+    old, new = House(), House()
+    old.floors, new.floors = [Floor(0, 10, 10)], [Floor(0, 20, 20)]
+    for house in (old, new):
+        house.floors[0].set_cells([1], [1], [1], [0])
+    diff = house_diff.diff_houses(old, new)
+    assert not diff.identical and diff.resized == {0: ((10, 10), (20, 20))}
+    assert house_diff.diff_houses(old, old).identical
@@ -0,0 +1,67 @@
+import itertools
+
+import pytest
+
+import nesting
+from nesting import KERF_MM, Piece, Stock
+
+
+def _check_sheets(sheets, pieces):
+    placed = []
+    for sheet in sheets:
+        rects = []
+        for placement in sheet.placements:
+            width, height = placement.piece.width, placement.piece.height
+            if placement.rotated:
+                width, height = height, width
+            assert placement.x >= 0 and placement.y >= 0
+            assert placement.x + width <= sheet.stock.width + 1e-6
+            assert placement.y + height <= sheet.stock.height + 1e-6
+            rects.append((placement.x, placement.y, placement.x + width, placement.y + height))
+            placed.append(placement.piece)
+        for a, b in itertools.combinations(rects, 2):
+            # Pieces are at least a kerf apart
+            assert (a[2] + KERF_MM <= b[0] + 1e-6 or b[2] + KERF_MM <= a[0] + 1e-6
+                    or a[3] + KERF_MM <= b[1] + 1e-6 or b[3] + KERF_MM <= a[1] + 1e-6), (a, b)
+    assert sorted(placed) == sorted(pieces)
+
+
+STOCKS = [Stock('4x4', 1219.2, 1219.2), Stock('4x8', 1219.2, 2438.4)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_placements_stay_on_their_sheet_without_overlap(seed):
+    cut_list = [{'type': 'wall_panel', 'length': 3, 'quantity': 7 + seed},
+                {'type': 'door_panel', 'length': 1, 'quantity': 5},
+                {'type': 'window_panel', 'length': 2, 'quantity': 4 + 2 * seed},
+                {'type': 'floor_panel', 'length': 1, 'quantity': 3}]
+    pieces = nesting.cut_pieces(cut_list, 4, STOCKS)
+    sheets = nesting.nest_pieces(pieces, STOCKS, seed=seed, passes=10, time_budget=5.0)
+    _check_sheets(sheets, pieces)
+
+
+def test_long_runs_are_split_to_fit_the_largest_sheet():
+    cut_list = [{'type': 'wall_panel', 'length': 17, 'quantity': 2}]
+    pieces = nesting.cut_pieces(cut_list, 4, STOCKS)
+    assert sum(piece.cells for piece in pieces) == 34
+    assert max(piece.width for piece in pieces) <= 2438.4
+    _check_sheets(nesting.nest_pieces(pieces, STOCKS, passes=5), pieces)
+
+
+def test_time_budget_still_returns_a_complete_plan():
+    pieces = [Piece('wall_panel', 1, 400.0, 400.0, 0.0)] * 3000
+    sheets = nesting.nest_pieces(pieces, STOCKS, time_budget=0.0)
+    _check_sheets(sheets, pieces)
+
+
+def test_nest_cut_list_parts_match_the_sheets():
+    cut_list = [{'type': 'wall_panel', 'length': 2, 'quantity': 6}, {'type': 'door_panel', 'length': 1, 'quantity': 2}]
+    plan = nesting.nest_cut_list(cut_list, 4, time_budget=1.0)
+    assert plan['sheet_count'] == len(plan['sheets'])
+    assert sum(len(sheet['parts']) for sheet in plan['sheets']) == 8
+    assert plan == nesting.nest_cut_list(cut_list, 4, time_budget=1.0)  # Same seed, same plan
+
+
+def test_piece_too_large_for_any_sheet():
+    with pytest.raises(ValueError):
+        nesting.nest_pieces([Piece('wall_panel', 1, 1500.0, 1500.0, 0.0)], STOCKS)
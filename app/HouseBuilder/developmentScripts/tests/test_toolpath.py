@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import toolpath
+
+
+def _is_tour(tour, count):
+    return tour[0] == tour[-1] == 0 and sorted(tour[1:-1].tolist()) == list(range(1, count))
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('count', [2, 3, 5, 40, 150])
+def test_optimized_tour_never_longer_than_nearest_neighbour(seed, count):
+    rng = np.random.default_rng(seed)
+    points = np.vstack([[0, 0], rng.random((count - 1, 2)) * 2440])
+    nearest = toolpath.nearest_neighbour_tour(points)
+    tour = toolpath.optimize_tour(points, 0.5, nearest)
+    assert _is_tour(nearest, count) and _is_tour(tour, count)
+    assert toolpath._tour_length(points, tour) <= toolpath._tour_length(points, nearest) + 1e-6
+
+
+def test_optimize_tour_on_a_grid_of_panel_corners():
+    # Many equal distances, as on a bed of identical panels
+    xs, ys = np.meshgrid(np.arange(8) * 300.0, np.arange(6) * 150.0)
+    points = np.column_stack([xs.ravel(), ys.ravel()])
+    nearest = toolpath.nearest_neighbour_tour(points)
+    tour = toolpath.optimize_tour(points, 0.5)
+    assert _is_tour(tour, len(points))
+    assert toolpath._tour_length(points, tour) <= toolpath._tour_length(points, nearest) + 1e-6
+
+
+def test_zero_budget_keeps_the_given_tour():
+    points = np.random.default_rng(3).random((30, 2))
+    nearest = toolpath.nearest_neighbour_tour(points)
+    assert toolpath.optimize_tour(points, 0.0, nearest).tolist() == nearest.tolist()
+
+
+def test_plan_report_after_is_not_worse_than_nearest_neighbour():
+    nesting = {'sheets': [{'sku': 'S', 'dimensions': '1219x2438', 'parts': [
+        {'type': 'door_panel' if i % 3 == 0 else 'wall_panel', 'cells': 1, 'x': (i % 3) * 405.0,
+         'y': (i // 3) * 405.0, 'rotated': False} for i in range(18)]}] * 2}
+    plan = toolpath.plan_toolpaths(nesting, 4, time_budget=0.5)
+    report = plan.report
+    assert report['panels'] == len(plan.panels) == 36 and report['bed_loads'] == 2
+    assert report['rapid_mm_after'] <= report['rapid_mm_nearest_neighbour'] <= report['rapid_mm_before']
+    assert [panel.load for panel in plan.panels] == [0] * 18 + [1] * 18